@@ -3,6 +3,10 @@ ASGI config for aid_alert project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve the project through this entry point (e.g. ``uvicorn aid_alert.asgi:application``)
+for the responder incident feed at /api/incidents/stream/ - Server-Sent Events
+need a long-lived async response, which WSGI workers can't hold open.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
 """
@@ -3,3 +3,8 @@ from django.apps import AppConfig
 
 class AidAppConfig(AppConfig):
     name = 'aid_app'
+
+    def ready(self):
+        # Register the responder index, incident feed, catalog cache, image rendition, alert delivery and
+        # SQLite tuning signal handlers
+        from . import catalog, delivery, dispatch, feed, sqlite_tuning, thumbnails  # noqa: F401
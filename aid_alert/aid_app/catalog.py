@@ -0,0 +1,162 @@
+"""
+Marketplace catalog.
+
+The buy-products page shows active products newest first, one page at a
+time, cut with a (created_at, id) cursor (see pagination.py), so page 500
+costs the same as page 1 and a product added meanwhile doesn't shift the next
+page. Alongside the page come category and condition facets: how many
+products each choice would leave, given the search and the other facet.
+
+A page costs one query and the facets one grouped query each. Results are
+cached per (search, filters, cursor) under a catalog version. Saving or
+deleting a Product, or checkout taking stock, moves the version on, so the
+next request misses and old entries just expire.
+
+The version is a CacheVersion row, read once per request, so a change made
+in one worker process reaches all of them. The entries themselves live in
+the default cache: with the per-process LocMemCache each worker builds its
+own copy; configure a shared backend (CACHES, e.g. Redis) to build each
+page once for all of them.
+"""
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import CacheVersion, Product
+from .pagination import InvalidCursor, decode_cursor, paginate
+
+PAGE_SIZE = getattr(settings, 'CATALOG_PAGE_SIZE', 24)
+CACHE_TIMEOUT = getattr(settings, 'CATALOG_CACHE_TIMEOUT', 300)
+# CacheVersion row
+VERSION_NAME = 'catalog'
+
+# Longer queries are cut here rather than rejected
+MAX_SEARCH_TERMS = 5
+
+# Material icon shown on each category facet
+CATEGORY_ICONS = {
+    'medical_supplies': 'healing',
+    'emergency_equipment': 'emergency',
+    'first_aid_kits': 'medical_services',
+    'diagnostic_tools': 'monitor_heart',
+    'protective_equipment': 'health_and_safety',
+    'other': 'category',
+}
+
+
+def catalog_version():
+    version = CacheVersion.objects.filter(name=VERSION_NAME).values_list('version', flat=True).first()
+    if version is None:
+        # Clock-based, so a new database doesn't pick up entries a shared cache kept from an old one
+        version = CacheVersion.objects.get_or_create(name=VERSION_NAME, defaults={'version': time.time_ns()})[0].version
+    return version
+
+
+def invalidate_catalog():
+    """Makes every cached catalog page and facet stale, in every process."""
+    if not CacheVersion.objects.filter(name=VERSION_NAME).update(version=F('version') + 1):
+        catalog_version()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def product_changed(sender, **kwargs):
+    transaction.on_commit(invalidate_catalog)
+
+
+def search_filter(search):
+    """Every word must appear in the name or the description."""
+    q = Q()
+    for term in search.split()[:MAX_SEARCH_TERMS]:
+        q &= Q(name__icontains=term) | Q(description__icontains=term)
+    return q
+
+
+def _cache_key(version, kind, **params):
+    digest = hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()
+    return f'catalog:{version}:{kind}:{digest}'
+
+
+def _cached(version, kind, params, build):
+    key = _cache_key(version, kind, **params)
+    result = cache.get(key)
+    if result is None:
+        result = build(**params)
+        cache.set(key, result, CACHE_TIMEOUT)
+    return result
+
+
+def _page(search, category, condition, cursor, page_size):
+    products = Product.objects.filter(search_filter(search), status='active')
+    if category:
+        products = products.filter(category=category)
+    if condition:
+        products = products.filter(condition=condition)
+    page = paginate(
+        products.values('id', 'name', 'description', 'category', 'condition', 'price', 'stock_quantity', 'image',
+                        'image_digest', 'created_at'),
+        cursor, page_size,
+    )
+    return {
+        'products': page.object_list,
+        'next_cursor': page.next_cursor,
+        'previous_cursor': page.previous_cursor,
+    }
+
+
+def _facet_counts(products, field):
+    return dict(products.order_by().values_list(field).annotate(n=Count('id')))
+
+
+def _choices(counts, choices):
+    return [{'value': value, 'label': label, 'count': counts.get(value, 0)} for value, label in choices]
+
+
+def _facets(search, category, condition):
+    products = Product.objects.filter(search_filter(search), status='active')
+    # Each facet counts what its choices would show with the *other* filter applied
+    by_category = _facet_counts(products.filter(condition=condition) if condition else products, 'category')
+    by_condition = _facet_counts(products.filter(category=category) if category else products, 'condition')
+    return {
+        # Includes products whose category is no longer one of the choices
+        'total': sum(by_category.values()),
+        'categories': _choices(by_category, Product.CATEGORY_CHOICES),
+        'conditions': _choices(by_condition, Product.CONDITION_CHOICES),
+    }
+
+
+def catalog_page(search='', category='', condition='', cursor=None, page_size=PAGE_SIZE):
+    """
+    One page of active products plus facet counts, served from the cache when
+    the catalog hasn't changed. Unknown category/condition values are ignored;
+    a malformed cursor raises InvalidCursor.
+    """
+    search = ' '.join(search.split())
+    if category not in dict(Product.CATEGORY_CHOICES):
+        category = ''
+    if condition not in dict(Product.CONDITION_CHOICES):
+        condition = ''
+    if cursor:
+        # Rejected before it becomes part of a cache key
+        decode_cursor(cursor, Product, ['created_at', 'id'])
+
+    version = catalog_version()
+    page = _cached(version, 'page', {
+        'search': search, 'category': category, 'condition': condition,
+        'cursor': cursor, 'page_size': page_size,
+    }, _page)
+    facets = _cached(version, 'facets', {'search': search, 'category': category, 'condition': condition}, _facets)
+    return {
+        **page,
+        'facets': facets,
+        'search': search,
+        'category': category,
+        'condition': condition,
+    }
@@ -0,0 +1,103 @@
+"""
+Stock reservation for marketplace checkout.
+
+A cart is reserved all-or-nothing inside one transaction. Each line is a
+conditional decrement
+(UPDATE ... SET stock_quantity = stock_quantity - n WHERE stock_quantity >= n),
+which takes the row (or, on SQLite, database) write lock straight away, so
+two buyers can never take the same last unit. Lines are reserved in product
+id order so concurrent carts lock rows in the same order. The products are
+then read once for names and prices and the orders are written with one bulk
+INSERT. A cart that can't be filled changes nothing; one that is filled
+makes the cached catalog (which shows stock) stale once it commits.
+"""
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .catalog import invalidate_catalog
+from .models import Order, Product
+
+
+class CheckoutError(Exception):
+    """The cart could not be reserved; `failures` has one entry per problem line."""
+
+    def __init__(self, failures):
+        self.failures = failures
+        super().__init__(failures[0]['message'] if failures else 'Checkout failed')
+
+
+def _cart_lines(cart):
+    """Merges the cart into {product_id: quantity}, collecting lines that are malformed."""
+    lines = {}
+    failures = []
+    for item in cart:
+        product_id = item.get('id')
+        try:
+            product_id = int(product_id)
+            quantity = int(item.get('quantity', 0))
+        except (TypeError, ValueError):
+            failures.append({'id': product_id, 'reason': 'invalid', 'message': 'Invalid cart item'})
+            continue
+        if quantity <= 0:
+            failures.append({'id': product_id, 'reason': 'invalid', 'message': 'Quantity must be at least 1'})
+            continue
+        lines[product_id] = lines.get(product_id, 0) + quantity
+    return lines, failures
+
+
+def _insufficient(product, requested, available):
+    return {
+        'id': product.id,
+        'name': product.name,
+        'requested': requested,
+        'available': available,
+        'reason': 'insufficient_stock',
+        'message': f'Insufficient stock for {product.name}. Available: {available}',
+    }
+
+
+@transaction.atomic
+def place_orders(customer, cart, status='processing'):
+    """
+    Reserves stock for every cart line and creates one Order per product.
+    Returns the created orders, or raises CheckoutError (nothing is saved).
+    """
+    lines, failures = _cart_lines(cart)
+    if failures:
+        raise CheckoutError(failures)
+
+    # Write first: reading before writing would make SQLite fail the lock upgrade
+    # under contention instead of waiting for it
+    short = []
+    for product_id in sorted(lines):
+        reserved = Product.objects.filter(pk=product_id, stock_quantity__gte=lines[product_id]).update(
+            stock_quantity=F('stock_quantity') - lines[product_id], updated_at=timezone.now()
+        )
+        if not reserved:
+            short.append(product_id)
+
+    products = Product.objects.in_bulk(list(lines))
+
+    for product_id in short:
+        product = products.get(product_id)
+        if product is None:
+            failures.append({'id': product_id, 'reason': 'not_found', 'message': 'One or more products not found'})
+        else:
+            failures.append(_insufficient(product, lines[product_id], product.stock_quantity))
+    if failures:
+        # Raising rolls back the decrements that did succeed
+        raise CheckoutError(failures)
+    # update() skips the Product save signal that normally does this
+    transaction.on_commit(invalidate_catalog)
+
+    return Order.objects.bulk_create([
+        Order(
+            customer=customer,
+            product=products[product_id],
+            quantity=quantity,
+            total_price=products[product_id].price * quantity,
+            status=status,
+        )
+        for product_id, quantity in lines.items()
+    ])
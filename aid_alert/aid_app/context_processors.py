@@ -1,29 +1,26 @@
-from .models import UserProfile
+from django.utils.functional import SimpleLazyObject
+
+from .models import NotificationCounter
+from .roles import resolve_role
 
 def user_profile_context(request):
     """
     Context processor to make user profile data available in all templates.
+    Reuses the profile RoleMiddleware put on the request; it never writes.
+    unread_notifications ({type: count, 'total': count}) is read from the
+    counters only when a template uses it.
     """
     if request.user.is_authenticated:
-        try:
-            profile = request.user.profile
-            return {
-                'user_profile': profile,
-                'user_role': profile.role,
-                'user_gender': profile.gender,
-                'user_full_name': request.user.get_full_name() or request.user.username,
-                'profile_icon': get_profile_icon(profile.gender, profile.role),
-            }
-        except UserProfile.DoesNotExist:
-            # Create a profile if it doesn't exist
-            profile = UserProfile.objects.create(user=request.user)
-            return {
-                'user_profile': profile,
-                'user_role': profile.role,
-                'user_gender': profile.gender,
-                'user_full_name': request.user.get_full_name() or request.user.username,
-                'profile_icon': get_profile_icon(profile.gender, profile.role),
-            }
+        resolve_role(request)
+        profile = request.profile
+        return {
+            'user_profile': profile,
+            'user_role': request.role,
+            'user_gender': profile.gender if profile else None,
+            'user_full_name': request.user.get_full_name() or request.user.username,
+            'profile_icon': get_profile_icon(profile.gender if profile else None, request.role),
+            'unread_notifications': SimpleLazyObject(lambda: NotificationCounter.unread_counts(request.user)),
+        }
     else:
         return {
             'user_profile': None,
@@ -31,6 +28,7 @@ def user_profile_context(request):
             'user_gender': None,
             'user_full_name': None,
             'profile_icon': 'person',
+            'unread_notifications': None,
         }
 
 def get_profile_icon(gender, role):
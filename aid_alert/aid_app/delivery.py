@@ -0,0 +1,258 @@
+"""
+Multi-channel alert delivery.
+
+Critical notifications are also pushed out of the database: every new
+notification of an ALERT_DELIVERY_TYPES type gets one AlertDelivery row per
+configured channel, queued in the transaction that created it. The
+delivery worker (`manage.py run_alert_worker`, or a thread of the web process
+with ALERT_DELIVERY_IN_PROCESS on) claims due rows the same way the
+notification outbox does and sends them from a bounded thread pool, so
+alerts go out in parallel and never on a request thread.
+
+Channels are configured in ALERT_DELIVERY_CHANNELS, name -> options:
+
+    ALERT_DELIVERY_CHANNELS = {
+        'email': {'BACKEND': 'aid_app.delivery.EmailChannel', 'RATE': 10},
+        'sms': {'BACKEND': 'aid_app.delivery.HttpChannel', 'URL': 'https://sms.example/send',
+                'HEADERS': {'Authorization': 'Bearer ...'}, 'ADDRESS': 'phone', 'RATE': 5},
+    }
+
+BACKEND is any class with address(user) and send(destination, notification);
+RATE caps sends per second per channel (per worker process). A failed send is
+retried with exponential backoff until ALERT_DELIVERY_MAX_ATTEMPTS. Alerts
+folded into an existing notification by coalescing are not sent again.
+"""
+import json
+import random
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.mail import send_mail
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import AlertDelivery, Notification
+from .workers import InProcessWorker
+
+CHANNELS = getattr(settings, 'ALERT_DELIVERY_CHANNELS', {
+    'email': {'BACKEND': 'aid_app.delivery.EmailChannel', 'RATE': 10},
+})
+# Notification types that are pushed out, not just stored
+DELIVERY_TYPES = getattr(settings, 'ALERT_DELIVERY_TYPES', ('critical',))
+# Sends running at once
+POOL_SIZE = getattr(settings, 'ALERT_DELIVERY_WORKERS', 8)
+MAX_ATTEMPTS = getattr(settings, 'ALERT_DELIVERY_MAX_ATTEMPTS', 5)
+# Retry n waits BACKOFF_BASE * 2**(n-1) seconds (with jitter), at most BACKOFF_MAX
+BACKOFF_BASE = getattr(settings, 'ALERT_DELIVERY_BACKOFF_BASE', 30)
+BACKOFF_MAX = getattr(settings, 'ALERT_DELIVERY_BACKOFF_MAX', 3600)
+# A delivery stuck in 'processing' this long (crashed worker) is picked up again
+CLAIM_TIMEOUT = getattr(settings, 'ALERT_DELIVERY_CLAIM_TIMEOUT', 600)
+# Send from a background thread of the web process
+IN_PROCESS = getattr(settings, 'ALERT_DELIVERY_IN_PROCESS', True)
+
+
+class EmailChannel:
+    """Sends through Django's email backend (EMAIL_BACKEND)."""
+
+    def __init__(self, **options):
+        self.from_email = options.get('FROM_EMAIL')
+
+    def address(self, user):
+        return user.email or None
+
+    def send(self, destination, notification):
+        send_mail(notification.title, notification.message, self.from_email, [destination], fail_silently=False)
+
+
+class HttpChannel:
+    """
+    POSTs {"to", "title", "message", "type", "incident"} as JSON to an SMS or
+    push gateway at URL. Any non-2xx answer counts as a failure.
+    """
+
+    def __init__(self, **options):
+        self.url = options['URL']
+        self.headers = {'Content-Type': 'application/json', **options.get('HEADERS', {})}
+        self.timeout = options.get('TIMEOUT', 10)
+        # Profile (or User) field holding the destination
+        self.address_field = options.get('ADDRESS', 'phone')
+
+    def address(self, user):
+        profile = getattr(user, 'profile', None)
+        return getattr(profile, self.address_field, None) or getattr(user, self.address_field, None) or None
+
+    def send(self, destination, notification):
+        body = json.dumps({
+            'to': destination,
+            'title': notification.title,
+            'message': notification.message,
+            'type': notification.notification_type,
+            'incident': notification.related_incident_id,
+        }).encode()
+        request = urllib.request.Request(self.url, data=body, headers=self.headers, method='POST')
+        # urlopen raises HTTPError for 4xx/5xx
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+class RateLimiter:
+    """Token bucket: at most `rate` acquisitions per second, bursts up to `rate`."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+_channels = {}
+_channels_lock = threading.Lock()
+
+
+def get_channel(name):
+    """(adapter, rate limiter or None) of a configured channel, built once per process."""
+    with _channels_lock:
+        if name not in _channels:
+            options = dict(CHANNELS[name])
+            backend = import_string(options.pop('BACKEND'))
+            rate = options.pop('RATE', None)
+            _channels[name] = (backend(**options), RateLimiter(rate) if rate else None)
+        return _channels[name]
+
+
+def queue_deliveries(notifications):
+    """Queues a delivery per channel for the saved notifications that are pushed out. Returns how many."""
+    notifications = [n for n in notifications if n.notification_type in DELIVERY_TYPES]
+    if not notifications or not CHANNELS:
+        return 0
+    users = User.objects.select_related('profile').in_bulk({n.recipient_id for n in notifications})
+    deliveries = []
+    for name in CHANNELS:
+        channel, _ = get_channel(name)
+        for notification in notifications:
+            user = users.get(notification.recipient_id)
+            destination = channel.address(user) if user is not None else None
+            if destination:
+                deliveries.append(AlertDelivery(notification=notification, channel=name, destination=destination))
+    AlertDelivery.objects.bulk_create(deliveries, batch_size=500, ignore_conflicts=True)
+    if deliveries:
+        transaction.on_commit(wake_worker)
+    return len(deliveries)
+
+
+@receiver(post_save, sender=Notification)
+def queue_notification_deliveries(sender, instance, created, **kwargs):
+    # bulk_create_notifications queues its batches itself
+    if created:
+        queue_deliveries([instance])
+
+
+def backoff(attempts):
+    """Seconds before retry number `attempts`: exponential, capped, with jitter so retries don't bunch up."""
+    delay = min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+    return delay * random.uniform(0.5, 1)
+
+
+def claim_due(limit):
+    """Claims up to `limit` due deliveries with conditional UPDATEs, so parallel workers never share one."""
+    now = timezone.now()
+    stale = now - timedelta(seconds=CLAIM_TIMEOUT)
+    candidates = AlertDelivery.objects.filter(
+        Q(status='pending', next_attempt_at__lte=now) | Q(status='processing', claimed_at__lt=stale)
+    ).order_by('next_attempt_at').values_list('pk', 'status')[:limit]
+
+    claimed = []
+    for pk, status in candidates:
+        if AlertDelivery.objects.filter(pk=pk, status=status).update(
+            status='processing', claimed_at=timezone.now(), attempts=F('attempts') + 1
+        ):
+            claimed.append(pk)
+    return list(AlertDelivery.objects.filter(pk__in=claimed).select_related('notification'))
+
+
+def send_delivery(delivery):
+    """Sends one claimed delivery and records the outcome. Returns True if it went out."""
+    try:
+        channel, limiter = get_channel(delivery.channel)
+        if limiter:
+            limiter.acquire()
+        channel.send(delivery.destination, delivery.notification)
+    except Exception as e:
+        if delivery.attempts >= MAX_ATTEMPTS or delivery.channel not in CHANNELS:
+            changes = {'status': 'failed'}
+        else:
+            changes = {'status': 'pending', 'next_attempt_at': timezone.now() + timedelta(seconds=backoff(delivery.attempts))}
+        AlertDelivery.objects.filter(pk=delivery.pk).update(last_error=f'{type(e).__name__}: {e}', **changes)
+        return False
+    else:
+        AlertDelivery.objects.filter(pk=delivery.pk).update(status='done', sent_at=timezone.now(), last_error='')
+        return True
+    finally:
+        # Pool threads are long-lived; don't leave a connection open between sends
+        connection.close()
+
+
+_pool = None
+_pool_size = POOL_SIZE
+_pool_lock = threading.Lock()
+
+
+def get_pool(size=None):
+    """The process's delivery thread pool; `size` only counts when it is first created."""
+    global _pool, _pool_size
+    with _pool_lock:
+        if _pool is None:
+            _pool_size = size or POOL_SIZE
+            _pool = ThreadPoolExecutor(max_workers=_pool_size, thread_name_prefix='alert-delivery')
+        return _pool
+
+
+def drain_deliveries(limit=None, pool_size=None):
+    """
+    Sends due deliveries from the thread pool until none are due (or `limit`
+    were tried). Returns (sent, failed); failed ones may be retried later.
+    """
+    pool = get_pool(pool_size)
+    # Enough claimed to keep every thread busy, few enough that a crash strands little
+    batch_size = 2 * _pool_size
+    sent = failed = 0
+    while limit is None or sent + failed < limit:
+        size = batch_size if limit is None else min(batch_size, limit - sent - failed)
+        deliveries = claim_due(size)
+        if not deliveries:
+            break
+        for ok in pool.map(send_delivery, deliveries):
+            if ok:
+                sent += 1
+            else:
+                failed += 1
+    return sent, failed
+
+
+_in_process_worker = InProcessWorker('alert-delivery', drain_deliveries)
+
+
+def wake_worker():
+    if IN_PROCESS:
+        _in_process_worker.wake()
@@ -0,0 +1,234 @@
+"""
+Nearest-available responder dispatch.
+
+Keeps an in-process grid index of available responders that have coordinates,
+so dispatch only looks at the cells around an incident instead of ranking every
+Responder row. The index is kept current from the Responder save/delete signals
+and rebuilt from the database when it gets older than DISPATCH_INDEX_MAX_AGE
+(other worker processes may have changed responders in the meantime).
+"""
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Responder, Incident, IncidentStatusHistory, IncidentDailyStats
+from .feed import publish_incident_event
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.32
+
+# Grid cell size in degrees (~5.5 km of latitude)
+CELL_SIZE_DEG = getattr(settings, 'DISPATCH_CELL_SIZE_DEG', 0.05)
+# Don't look further than this for a responder
+MAX_SEARCH_RADIUS_KM = getattr(settings, 'DISPATCH_MAX_RADIUS_KM', 200)
+# Rebuild the index from the database after this many seconds
+INDEX_MAX_AGE = getattr(settings, 'DISPATCH_INDEX_MAX_AGE', 300)
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance between two points in kilometres."""
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def has_coordinates(obj):
+    return obj.latitude is not None and obj.longitude is not None
+
+
+class ResponderIndex:
+    """Uniform lat/lng grid of available responders (pk -> coordinates)."""
+
+    def __init__(self, cell_size=CELL_SIZE_DEG):
+        self.cell_size = cell_size
+        self._cells = {}
+        self._points = {}
+        self._lock = threading.RLock()
+        self._built_at = None
+
+    def _cell(self, lat, lng):
+        return (math.floor(lat / self.cell_size), math.floor(lng / self.cell_size))
+
+    def clear(self):
+        with self._lock:
+            self._cells = {}
+            self._points = {}
+            self._built_at = None
+
+    def rebuild(self):
+        """Reload every available responder that has coordinates."""
+        rows = Responder.objects.filter(
+            status='available', latitude__isnull=False, longitude__isnull=False
+        ).values_list('pk', 'latitude', 'longitude')
+
+        with self._lock:
+            self._cells = {}
+            self._points = {}
+            for pk, lat, lng in rows:
+                self._insert(pk, lat, lng)
+            self._built_at = time.monotonic()
+
+    def _ensure_fresh(self):
+        if self._built_at is None or time.monotonic() - self._built_at > INDEX_MAX_AGE:
+            self.rebuild()
+
+    def _insert(self, pk, lat, lng):
+        self._points[pk] = (lat, lng)
+        self._cells.setdefault(self._cell(lat, lng), set()).add(pk)
+
+    def remove(self, pk):
+        with self._lock:
+            point = self._points.pop(pk, None)
+            if point is None:
+                return
+            cell = self._cell(*point)
+            members = self._cells.get(cell)
+            if members:
+                members.discard(pk)
+                if not members:
+                    del self._cells[cell]
+
+    def update(self, responder):
+        """Add, move or drop a responder depending on its status and coordinates."""
+        with self._lock:
+            if self._built_at is None:
+                # Not built yet - the first query will load it from the database
+                return
+            self.remove(responder.pk)
+            if responder.status == 'available' and has_coordinates(responder):
+                self._insert(responder.pk, responder.latitude, responder.longitude)
+
+    def nearest(self, lat, lng, k, max_radius_km=MAX_SEARCH_RADIUS_KM):
+        """
+        Returns up to k (distance_km, pk) pairs ordered by distance.
+        Scans rings of cells outwards and stops as soon as no unvisited cell
+        can hold anything closer than the k-th best match.
+        """
+        with self._lock:
+            self._ensure_fresh()
+            if not self._points:
+                return []
+
+            center_row, center_col = self._cell(lat, lng)
+            # Width of one cell in km, using the narrower (longitude) side
+            cell_km = self.cell_size * KM_PER_DEGREE * max(math.cos(math.radians(lat)), 0.1)
+            max_ring = max(1, int(math.ceil(max_radius_km / cell_km)))
+
+            matches = []
+            for ring in range(max_ring + 1):
+                for row in range(center_row - ring, center_row + ring + 1):
+                    for col in range(center_col - ring, center_col + ring + 1):
+                        # Only the border of the ring, inner cells are done already
+                        if ring and abs(row - center_row) != ring and abs(col - center_col) != ring:
+                            continue
+                        for pk in self._cells.get((row, col), ()):
+                            p_lat, p_lng = self._points[pk]
+                            distance = haversine_km(lat, lng, p_lat, p_lng)
+                            if distance <= max_radius_km:
+                                matches.append((distance, pk))
+
+                if len(matches) >= k:
+                    matches.sort()
+                    # Anything outside this ring is at least ring * cell_km away
+                    if matches[k - 1][0] <= ring * cell_km:
+                        break
+
+            matches.sort()
+            return matches[:k]
+
+    def __len__(self):
+        return len(self._points)
+
+
+responder_index = ResponderIndex()
+
+
+def nearest_responders(incident, k=5):
+    """
+    Returns up to k available responders closest to the incident, nearest first.
+    Each responder gets a `distance_km` attribute. Incidents without coordinates
+    fall back to any available responders.
+    """
+    if not has_coordinates(incident):
+        responders = list(Responder.objects.filter(status='available').select_related('user')[:k])
+        for responder in responders:
+            responder.distance_km = None
+        return responders
+
+    matches = responder_index.nearest(incident.latitude, incident.longitude, k)
+    if not matches:
+        return []
+
+    by_pk = Responder.objects.select_related('user').in_bulk([pk for _, pk in matches])
+
+    responders = []
+    for distance, pk in matches:
+        responder = by_pk.get(pk)
+        # The index may lag behind other processes, the database has the final say
+        if responder is None or responder.status != 'available':
+            responder_index.remove(pk)
+            continue
+        responder.distance_km = round(distance, 2)
+        responders.append(responder)
+    return responders
+
+
+def claim_incident(incident_pk, responder):
+    """
+    Atomically assigns an open, unassigned incident to the responder.
+
+    A single conditional UPDATE decides the winner, so concurrent claims can't
+    both succeed. Returns True if this responder got the incident.
+    """
+    with transaction.atomic():
+        claimed = Incident.objects.filter(
+            pk=incident_pk, assigned_responder__isnull=True, status='open'
+        ).update(assigned_responder=responder, status='en_route', updated_at=timezone.now())
+
+        if claimed:
+            # update() skips the post_save signal, so log the transition here
+            IncidentStatusHistory.objects.create(
+                incident_id=incident_pk,
+                status='en_route',
+                notes='Responder is en route',
+            )
+            incident = Incident.objects.only('incident_type', 'severity', 'status', 'created_at', 'resolved_at').get(pk=incident_pk)
+            new_stats = IncidentDailyStats.snapshot(incident)
+            old_stats = (new_stats[0], 'open', new_stats[2])
+            IncidentDailyStats.apply_change(old_stats, new_stats)
+            publish_incident_event('incident.claimed', {
+                'id': incident_pk,
+                'incident_id': f'INC-{incident_pk:03d}',
+                'status': 'en_route',
+                'assigned_responder_id': responder.pk,
+            })
+    return bool(claimed)
+
+
+def parse_coordinates(latitude, longitude):
+    """Validates a lat/lng pair from a request, returns (None, None) if unusable."""
+    try:
+        lat = float(latitude)
+        lng = float(longitude)
+    except (TypeError, ValueError):
+        return None, None
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return None, None
+    return lat, lng
+
+
+@receiver(post_save, sender=Responder)
+def update_responder_index(sender, instance, **kwargs):
+    responder_index.update(instance)
+
+
+@receiver(post_delete, sender=Responder)
+def remove_from_responder_index(sender, instance, **kwargs):
+    responder_index.remove(instance.pk)
@@ -0,0 +1,174 @@
+"""
+Streaming incident exports.
+
+Rows are read from the database in chunks and written to the response as they
+are produced, so an export of any size runs in bounded memory and the first
+bytes reach the client straight away.
+
+Two formats: CSV (`export=csv`) and gzip-compressed newline-delimited JSON
+(`export=ndjson`).
+
+Under ASGI a sync iterator would be read to the end before the first byte is
+sent, so there the chunks are handed over as an async iterator, produced a
+batch at a time in the request's sync thread.
+
+The *_json functions give the JSON shape of a row; the ?format=json mode of
+the paginated list pages uses them too.
+"""
+import csv
+import json
+import zlib
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+
+# Incidents fetched per database round trip
+EXPORT_CHUNK_SIZE = 2000
+# Rows written per gzip chunk yielded to the client
+NDJSON_ROWS_PER_CHUNK = 500
+# CSV rows sent per chunk under ASGI (each chunk is one hop to the sync thread)
+CSV_ROWS_PER_CHUNK = 500
+
+CSV_HEADER = ['Incident ID', 'Type', 'Severity', 'Location', 'Status', 'Reported At', 'Resolved At', 'Responder']
+
+
+class Echo:
+    """File-like object that hands back whatever csv.writer writes to it."""
+
+    def write(self, value):
+        return value
+
+
+def export_queryset(incidents):
+    """The incidents with the responder's user joined, streamed from the database in chunks."""
+    return incidents.select_related('assigned_responder__user').iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def responder_name(incident):
+    if incident.assigned_responder:
+        return incident.assigned_responder.user.get_full_name()
+    return 'Unassigned'
+
+
+def incident_json(inc):
+    return {
+        'incident_id': inc.incident_id,
+        'incident_type': inc.incident_type,
+        'severity': inc.severity,
+        'status': inc.status,
+        'location': inc.location,
+        'latitude': inc.latitude,
+        'longitude': inc.longitude,
+        'created_at': inc.created_at.isoformat(),
+        'resolved_at': inc.resolved_at.isoformat() if inc.resolved_at else None,
+        'responder': responder_name(inc) if inc.assigned_responder else None,
+    }
+
+
+def order_json(order):
+    return {
+        'order_id': order.order_id,
+        'product': order.product.name,
+        'customer': order.customer.username,
+        'quantity': order.quantity,
+        'total_price': str(order.total_price),
+        'status': order.status,
+        'created_at': order.created_at.isoformat(),
+    }
+
+
+def product_json(product):
+    return {
+        'id': product.id,
+        'name': product.name,
+        'seller': product.seller.username,
+        'category': product.category,
+        'price': str(product.price),
+        'stock_quantity': product.stock_quantity,
+        'status': product.status,
+        'created_at': product.created_at.isoformat(),
+    }
+
+
+def feedback_json(feedback):
+    return {
+        'id': feedback.id,
+        'user': feedback.user.username,
+        'rating': feedback.rating,
+        'message': feedback.message,
+        'status': feedback.status,
+        'reply': feedback.reply,
+        'created_at': feedback.created_at.isoformat(),
+    }
+
+
+def incident_csv_rows(incidents):
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_HEADER)
+    for inc in export_queryset(incidents):
+        yield writer.writerow([
+            inc.incident_id,
+            inc.get_incident_type_display(),
+            inc.get_severity_display(),
+            inc.location,
+            inc.get_status_display(),
+            inc.created_at.strftime('%Y-%m-%d %H:%M'),
+            inc.resolved_at.strftime('%Y-%m-%d %H:%M') if inc.resolved_at else '-',
+            responder_name(inc)
+        ])
+
+
+def incident_ndjson_gzip(incidents):
+    """Yields gzip member chunks of one JSON object per line."""
+    # wbits=31 writes a gzip header and trailer rather than a bare zlib stream
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    lines = []
+    for inc in export_queryset(incidents):
+        lines.append(json.dumps(incident_json(inc)))
+        if len(lines) >= NDJSON_ROWS_PER_CHUNK:
+            chunk = compressor.compress(('\n'.join(lines) + '\n').encode())
+            lines = []
+            if chunk:
+                yield chunk
+    if lines:
+        yield compressor.compress(('\n'.join(lines) + '\n').encode())
+    yield compressor.flush()
+
+
+async def async_chunks(chunks, per_chunk=1):
+    """
+    Async iterator over a sync iterator that reads the database: joins every
+    `per_chunk` of its chunks into one, produced in the request's sync thread.
+    """
+    take = sync_to_async(lambda: list(islice(chunks, per_chunk)))
+    try:
+        while batch := await take():
+            # str for CSV, bytes for gzip
+            yield batch[0][:0].join(batch)
+    finally:
+        # Client gone: release the database cursor
+        await sync_to_async(chunks.close)()
+
+
+def stream_incident_export(incidents, export_format, filename, request=None):
+    """StreamingHttpResponse for an incident export, or None for an unknown format."""
+    asynchronous = isinstance(request, ASGIRequest)
+    if export_format == 'csv':
+        rows = incident_csv_rows(incidents)
+        if asynchronous:
+            rows = async_chunks(rows, CSV_ROWS_PER_CHUNK)
+        response = StreamingHttpResponse(rows, content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+    elif export_format == 'ndjson':
+        chunks = incident_ndjson_gzip(incidents)
+        if asynchronous:
+            chunks = async_chunks(chunks)
+        response = StreamingHttpResponse(chunks, content_type='application/gzip')
+        response['Content-Disposition'] = f'attachment; filename="{filename}.ndjson.gz"'
+    else:
+        return None
+    # Let nginx pass chunks through as they are produced
+    response['X-Accel-Buffering'] = 'no'
+    return response
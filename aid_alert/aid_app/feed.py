@@ -0,0 +1,155 @@
+"""
+Server-push incident feed for responders (Server-Sent Events).
+
+The Incident post_save hook and claim_incident() publish small deltas
+(new, claimed and status-changed incidents) into an in-process broker.
+Each connected responder holds an asyncio queue on the ASGI event loop and
+receives those deltas as they happen instead of reloading the page.
+
+Streaming needs the ASGI entry point (aid_alert/asgi.py). A recent backlog
+is kept so a reconnecting EventSource can replay what it missed using the
+Last-Event-ID header.
+
+The broker is per process: a stream only hears about incidents saved by the
+process serving it, and event ids (so Last-Event-ID replay) are only
+meaningful there. Serve the feed from a single ASGI process. Changes made
+elsewhere (another worker process, a management command) reach responders on
+their next page load instead.
+"""
+import asyncio
+import itertools
+import json
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import Incident
+
+# Number of recent events kept for Last-Event-ID replay
+FEED_BACKLOG = getattr(settings, 'INCIDENT_FEED_BACKLOG', 500)
+# A client this far behind gets disconnected and replays on reconnect
+FEED_MAX_PENDING = getattr(settings, 'INCIDENT_FEED_MAX_PENDING', 200)
+# Seconds between keep-alive comments so proxies don't close idle streams
+FEED_KEEPALIVE = getattr(settings, 'INCIDENT_FEED_KEEPALIVE', 15)
+
+_DISCONNECT = object()
+
+
+class IncidentFeed:
+    """Fan-out of incident events to every subscribed stream in this process."""
+
+    def __init__(self, backlog=FEED_BACKLOG, max_pending=FEED_MAX_PENDING):
+        self.max_pending = max_pending
+        self._subscribers = set()
+        self._recent = deque(maxlen=backlog)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def publish(self, event_type, payload):
+        """Thread-safe: called from sync views/signals, delivered on each subscriber's loop."""
+        with self._lock:
+            event = (next(self._ids), event_type, payload)
+            self._recent.append(event)
+            subscribers = list(self._subscribers)
+
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._deliver, queue, event)
+            except RuntimeError:
+                # Loop already closed, the stream is going away
+                pass
+
+    def _deliver(self, queue, event):
+        if queue.qsize() >= self.max_pending:
+            queue.put_nowait(_DISCONNECT)
+        else:
+            queue.put_nowait(event)
+
+    def subscribe(self, last_event_id=None):
+        """Registers a queue on the running loop, returns it with any events to replay."""
+        queue = asyncio.Queue()
+        subscriber = (asyncio.get_running_loop(), queue)
+
+        with self._lock:
+            self._subscribers.add(subscriber)
+            missed = []
+            if last_event_id is not None:
+                missed = [event for event in self._recent if event[0] > last_event_id]
+        return subscriber, missed
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    async def stream(self, last_event_id=None):
+        """Async generator of SSE-formatted chunks for StreamingHttpResponse."""
+        subscriber, missed = self.subscribe(last_event_id)
+        queue = subscriber[1]
+        try:
+            # Tell EventSource how long to wait before reconnecting
+            yield 'retry: 3000\n\n'
+            for event in missed:
+                yield format_event(*event)
+
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=FEED_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ': keepalive\n\n'
+                    continue
+                if event is _DISCONNECT:
+                    break
+                yield format_event(*event)
+        finally:
+            self.unsubscribe(subscriber)
+
+    def __len__(self):
+        return len(self._subscribers)
+
+
+incident_feed = IncidentFeed()
+
+
+def format_event(event_id, event_type, payload):
+    return f'id: {event_id}\nevent: {event_type}\ndata: {json.dumps(payload)}\n\n'
+
+
+def incident_payload(incident):
+    return {
+        'id': incident.id,
+        'incident_id': incident.incident_id,
+        'incident_type': incident.incident_type,
+        'incident_type_display': incident.get_incident_type_display(),
+        'severity': incident.severity,
+        'severity_display': incident.get_severity_display(),
+        'status': incident.status,
+        'location': incident.location,
+        'latitude': incident.latitude,
+        'longitude': incident.longitude,
+        'assigned_responder_id': incident.assigned_responder_id,
+        'created_at': incident.created_at.isoformat() if incident.created_at else None,
+    }
+
+
+def publish_incident_event(event_type, payload):
+    """Publishes once the surrounding transaction commits, so clients never see rolled back rows."""
+    transaction.on_commit(lambda: incident_feed.publish(event_type, payload))
+
+
+def parse_last_event_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+@receiver(post_save, sender=Incident)
+def publish_incident_change(sender, instance, created, **kwargs):
+    if created:
+        publish_incident_event('incident.created', incident_payload(instance))
+    elif getattr(instance, '_old_status', None) != instance.status:
+        publish_incident_event('incident.status', incident_payload(instance))
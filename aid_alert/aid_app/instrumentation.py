@@ -0,0 +1,362 @@
+"""
+Per-request query and latency instrumentation.
+
+RequestMetricsMiddleware wraps every database cursor for the length of a
+request (connection.execute_wrapper, so it works with DEBUG off) and records:
+
+* number of queries and total SQL time
+* duplicate queries: the same SQL shape run more than once, the usual N+1 sign
+* template render time (SQL run lazily from a template is counted in both)
+* total time until the view returned its response
+
+Results are folded into per-URL-name histograms kept in this process and
+served as JSON to staff at /admin-panel/request-metrics/. With
+REQUEST_METRICS_LOG on, each request also writes one JSON line to the
+'aid_app.requests' logger.
+
+Views can declare how many queries they may run with @query_budget(n). A
+request over budget is counted (and logged); with QUERY_BUDGET_STRICT on,
+as in a test run, it raises QueryBudgetExceeded instead. Views whose
+response outlives the request (the incident stream) opt out with
+@no_request_metrics.
+"""
+import functools
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+METRICS_ENABLED = getattr(settings, 'REQUEST_METRICS_ENABLED', True)
+# Write one JSON line per request to the 'aid_app.requests' logger
+METRICS_LOG = getattr(settings, 'REQUEST_METRICS_LOG', False)
+# Raise instead of just counting when a view runs more queries than it declared
+QUERY_BUDGET_STRICT = getattr(settings, 'QUERY_BUDGET_STRICT', False)
+
+# Upper bounds of the histogram buckets (the last bucket is everything above)
+LATENCY_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+QUERY_BUCKETS = [1, 2, 5, 10, 20, 50, 100, 200]
+# Duplicate SQL shapes kept per view, most repeated first
+TOP_DUPLICATES = 5
+
+logger = logging.getLogger('aid_app.requests')
+
+_current_profile = ContextVar('request_profile', default=None)
+
+# Collapses "IN (%s, %s, %s)" and VALUES lists so batches of any size share a signature
+_PLACEHOLDER_RUN = re.compile(r'%s(?:\s*,\s*%s)+')
+_VALUES_RUN = re.compile(r'\(%s\.\.\.\)(?:\s*,\s*\(%s\.\.\.\))+')
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def query_signature(sql):
+    """The SQL with parameter lists collapsed, so repeats of one query compare equal."""
+    sql = _PLACEHOLDER_RUN.sub('%s...', sql)
+    return _VALUES_RUN.sub('(%s...)...', sql)
+
+
+def query_budget(max_queries):
+    """Declares the most queries a view may run per request."""
+    def decorator(view_func):
+        view_func.query_budget = max_queries
+        return view_func
+    return decorator
+
+
+def no_request_metrics(view_func):
+    """Leaves a view's requests out of the metrics, e.g. a stream that has no meaningful response time."""
+    view_func.request_metrics = False
+    return view_func
+
+
+class RequestProfile:
+    """What one request did on the database and in templates."""
+
+    def __init__(self, view_name, budget=None):
+        self.view_name = view_name
+        self.budget = budget
+        self.query_count = 0
+        self.sql_time = 0.0
+        self.render_time = 0.0
+        self.total_time = 0.0
+        self.signatures = Counter()
+        self._rendering = False
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper hook
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - started
+            self.query_count += 1
+            self.signatures[query_signature(sql)] += 1
+
+    @property
+    def duplicates(self):
+        """{signature: times run} for SQL run more than once."""
+        return {sql: count for sql, count in self.signatures.items() if count > 1}
+
+    @property
+    def over_budget(self):
+        return self.budget is not None and self.query_count > self.budget
+
+    def as_dict(self):
+        return {
+            'view': self.view_name,
+            'queries': self.query_count,
+            'duplicate_queries': sum(count - 1 for count in self.duplicates.values()),
+            'sql_ms': round(self.sql_time * 1000, 2),
+            'render_ms': round(self.render_time * 1000, 2),
+            'total_ms': round(self.total_time * 1000, 2),
+            'query_budget': self.budget,
+        }
+
+
+def _histogram(bounds):
+    return [0] * (len(bounds) + 1)
+
+
+def _bucket(bounds, value):
+    for i, bound in enumerate(bounds):
+        if value <= bound:
+            return i
+    return len(bounds)
+
+
+class ViewStats:
+    """Running totals and histograms for one URL name."""
+
+    def __init__(self):
+        self.requests = 0
+        self.over_budget = 0
+        self.budget = None
+        self.queries_total = 0
+        self.queries_max = 0
+        self.sql_ms_total = 0.0
+        self.render_ms_total = 0.0
+        self.total_ms_total = 0.0
+        self.total_ms_max = 0.0
+        self.latency_histogram = _histogram(LATENCY_BUCKETS_MS)
+        self.query_histogram = _histogram(QUERY_BUCKETS)
+        self.duplicates = Counter()
+
+    def add(self, profile):
+        total_ms = profile.total_time * 1000
+        self.requests += 1
+        self.over_budget += profile.over_budget
+        self.budget = profile.budget
+        self.queries_total += profile.query_count
+        self.queries_max = max(self.queries_max, profile.query_count)
+        self.sql_ms_total += profile.sql_time * 1000
+        self.render_ms_total += profile.render_time * 1000
+        self.total_ms_total += total_ms
+        self.total_ms_max = max(self.total_ms_max, total_ms)
+        self.latency_histogram[_bucket(LATENCY_BUCKETS_MS, total_ms)] += 1
+        self.query_histogram[_bucket(QUERY_BUCKETS, profile.query_count)] += 1
+        for sql, count in profile.duplicates.items():
+            self.duplicates[sql] += count - 1
+        # Keep the memory per view bounded
+        if len(self.duplicates) > TOP_DUPLICATES * 4:
+            self.duplicates = Counter(dict(self.duplicates.most_common(TOP_DUPLICATES)))
+
+    def as_dict(self):
+        n = self.requests
+        return {
+            'requests': n,
+            'query_budget': self.budget,
+            'over_budget': self.over_budget,
+            'avg_queries': round(self.queries_total / n, 2),
+            'max_queries': self.queries_max,
+            'avg_sql_ms': round(self.sql_ms_total / n, 2),
+            'avg_render_ms': round(self.render_ms_total / n, 2),
+            'avg_total_ms': round(self.total_ms_total / n, 2),
+            'max_total_ms': round(self.total_ms_max, 2),
+            'latency_ms_histogram': dict(zip([str(b) for b in LATENCY_BUCKETS_MS] + ['inf'], self.latency_histogram)),
+            'queries_histogram': dict(zip([str(b) for b in QUERY_BUCKETS] + ['inf'], self.query_histogram)),
+            'top_duplicate_queries': [
+                {'sql': sql[:300], 'extra_runs': count}
+                for sql, count in self.duplicates.most_common(TOP_DUPLICATES)
+            ],
+        }
+
+
+class MetricsRegistry:
+    """Per-process aggregate of every instrumented request, keyed by URL name."""
+
+    def __init__(self):
+        self._views = {}
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+
+    def record(self, profile):
+        with self._lock:
+            stats = self._views.get(profile.view_name)
+            if stats is None:
+                stats = self._views[profile.view_name] = ViewStats()
+            stats.add(profile)
+
+    def snapshot(self):
+        with self._lock:
+            views = {name: stats.as_dict() for name, stats in self._views.items()}
+        return {
+            'since': self.started_at,
+            'latency_buckets_ms': LATENCY_BUCKETS_MS,
+            'query_buckets': QUERY_BUCKETS,
+            # Slowest on average first
+            'views': dict(sorted(views.items(), key=lambda item: -item[1]['avg_total_ms'])),
+        }
+
+    def reset(self):
+        with self._lock:
+            self._views = {}
+            self.started_at = time.time()
+
+
+request_metrics = MetricsRegistry()
+
+
+def _install_render_timer():
+    """Times Django template rendering against the request being profiled (once per process)."""
+    from django.template.backends.django import Template
+
+    if getattr(Template.render, 'timed', False):
+        return
+    original_render = Template.render
+
+    @functools.wraps(original_render)
+    def render(self, context=None, request=None):
+        profile = _current_profile.get()
+        # Included templates are part of the outer render, don't count them twice
+        if profile is None or profile._rendering:
+            return original_render(self, context, request)
+        profile._rendering = True
+        started = time.perf_counter()
+        try:
+            return original_render(self, context, request)
+        finally:
+            profile.render_time += time.perf_counter() - started
+            profile._rendering = False
+
+    render.timed = True
+    Template.render = render
+
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return '<unresolved>'
+    return match.view_name or match._func_path
+
+
+class RequestMetricsMiddleware:
+    """
+    Records the queries and timings of every request, under WSGI or ASGI.
+    Database connections are per thread: under ASGI the cursors are wrapped
+    in the request's sync thread, where its sync views and ORM calls run.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        if METRICS_ENABLED:
+            _install_render_timer()
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not METRICS_ENABLED:
+            return self.get_response(request)
+        with self.profiling() as profile, ExitStack() as wrappers:
+            self.wrap_connections(wrappers, profile)
+            response = self.get_response(request)
+        return self.record(request, response, profile)
+
+    async def __acall__(self, request):
+        if not METRICS_ENABLED:
+            return await self.get_response(request)
+        with self.profiling() as profile:
+            wrappers = ExitStack()
+            await sync_to_async(self.wrap_connections)(wrappers, profile)
+            try:
+                response = await self.get_response(request)
+            finally:
+                await sync_to_async(wrappers.close)()
+        return self.record(request, response, profile)
+
+    @staticmethod
+    @contextmanager
+    def profiling():
+        profile = RequestProfile('<unresolved>')
+        token = _current_profile.set(profile)
+        started = time.perf_counter()
+        try:
+            yield profile
+        finally:
+            _current_profile.reset(token)
+            profile.total_time = time.perf_counter() - started
+
+    @staticmethod
+    def wrap_connections(stack, profile):
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(profile))
+
+    @staticmethod
+    def record(request, response, profile):
+        profile.view_name = _view_name(request)
+        match = getattr(request, 'resolver_match', None)
+        if match is not None:
+            if not getattr(match.func, 'request_metrics', True):
+                return response
+            profile.budget = getattr(match.func, 'query_budget', None)
+
+        request_metrics.record(profile)
+        # Lets tests inspect the profile next to the response
+        response.query_profile = profile
+
+        if METRICS_LOG:
+            logger.info(json.dumps(dict(profile.as_dict(), method=request.method, status=response.status_code)))
+        if profile.over_budget:
+            message = budget_message(profile)
+            if QUERY_BUDGET_STRICT:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+
+def budget_message(profile, budget=None):
+    budget = profile.budget if budget is None else budget
+    lines = [f'{profile.view_name} ran {profile.query_count} queries, budget is {budget}.']
+    for sql, count in sorted(profile.duplicates.items(), key=lambda item: -item[1])[:TOP_DUPLICATES]:
+        lines.append(f'  {count}x {sql[:200]}')
+    return '\n'.join(lines)
+
+
+def assert_query_budget(response, budget=None):
+    """
+    Test helper: fails when the request behind `response` ran more queries than
+    `budget` (default: the budget its view declared with @query_budget).
+    """
+    profile = getattr(response, 'query_profile', None)
+    if profile is None:
+        raise AssertionError('Response was not profiled; is RequestMetricsMiddleware installed and enabled?')
+    budget = profile.budget if budget is None else budget
+    if budget is None:
+        raise AssertionError(f'{profile.view_name} declares no query budget.')
+    if profile.query_count > budget:
+        raise QueryBudgetExceeded(budget_message(profile, budget))
+    return profile
@@ -0,0 +1,75 @@
+import gzip
+import json
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from aid_app.models import Notification
+from aid_app.notifications import ARCHIVE_BATCH_SIZE, RETENTION_DAYS, archive_batch, archive_to_table
+
+
+class Command(BaseCommand):
+    help = ('Move read notifications older than --days out of the Notification table, in small batches. '
+            'Meant to run daily from cron.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=RETENTION_DAYS,
+                            help=f'Archive read notifications older than this (default {RETENTION_DAYS})')
+        parser.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE, help='Notifications per transaction')
+        parser.add_argument('--pause', type=float, default=0.0,
+                            help='Seconds to sleep between batches, to leave room for live traffic')
+        parser.add_argument('--to-file', metavar='PATH',
+                            help='Append them to this gzipped JSON-lines file instead of the archive table')
+        parser.add_argument('--dry-run', action='store_true', help='Only count what would be archived')
+
+    def handle(self, *args, **options):
+        if options['days'] < 1:
+            raise CommandError('--days must be at least 1.')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1.')
+        cutoff = timezone.now() - timedelta(days=options['days'])
+
+        if options['dry_run']:
+            count = Notification.objects.filter(is_read=True, created_at__lt=cutoff).count()
+            self.stdout.write(f'{count} read notifications are older than {options["days"]} days.')
+            return
+
+        archive_file = gzip.open(options['to_file'], 'at', encoding='utf-8') if options['to_file'] else None
+        write = self.file_writer(archive_file) if archive_file else archive_to_table
+
+        started = time.perf_counter()
+        total = batches = 0
+        last_pk = 0
+        try:
+            while True:
+                count, last_pk = archive_batch(cutoff, last_pk, options['batch_size'], write)
+                if not count:
+                    break
+                total += count
+                batches += 1
+                if options['verbosity'] >= 2:
+                    elapsed = time.perf_counter() - started
+                    self.stdout.write(f'  batch {batches}: {total} archived, {total / elapsed:.0f}/s')
+                if options['pause']:
+                    time.sleep(options['pause'])
+        finally:
+            if archive_file:
+                archive_file.close()
+
+        elapsed = time.perf_counter() - started
+        target = options['to_file'] or 'the archive table'
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {total} notifications to {target} in {batches} batches, '
+            f'{elapsed:.1f}s ({total / elapsed if elapsed else 0:.0f}/s).'
+        ))
+
+    @staticmethod
+    def file_writer(archive_file):
+        def write(rows):
+            for row in rows:
+                archive_file.write(json.dumps(row, cls=DjangoJSONEncoder) + '\n')
+            # Written out before the rows are deleted
+            archive_file.flush()
+        return write
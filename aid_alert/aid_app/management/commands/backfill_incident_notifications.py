@@ -0,0 +1,99 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import F
+from aid_app.models import Incident, Notification, NotificationArchive
+from aid_app.notifications import FANOUT_BATCH_SIZE, audience_recipients, bulk_create_notifications
+
+# Same incidents the post_save signal alerts facility managers about
+ALERT_SEVERITIES = ['critical', 'high']
+
+
+class Command(BaseCommand):
+    help = ('Create the missing "new incident" notifications of facility managers for every critical/high '
+            'incident, with one anti-join per window of incidents')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--window', type=int, default=1000, help='Incidents checked per anti-join query')
+        parser.add_argument('--batch-size', type=int, default=FANOUT_BATCH_SIZE, help='Notification rows per INSERT')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the missing notifications')
+
+    def handle(self, *args, **options):
+        recipients = audience_recipients('facility')
+        if not recipients.exists():
+            # Like the old populate_notifications script: someone should see the alerts
+            recipients = User.objects.filter(is_active=True, is_superuser=True).values_list('id', flat=True)
+        incidents = Incident.objects.filter(severity__in=ALERT_SEVERITIES)
+        total_incidents = incidents.count()
+
+        severities = dict(Incident.SEVERITY_CHOICES)
+        types = dict(Incident.INCIDENT_TYPE_CHOICES)
+        started = time.perf_counter()
+        scanned = missing = created = 0
+        last_pk = 0
+        while True:
+            window = list(incidents.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:options['window']])
+            if not window:
+                break
+            last_pk = window[-1]
+            scanned += len(window)
+
+            pairs = self.missing_pairs(recipients, incidents.filter(pk__gte=window[0], pk__lte=last_pk))
+            missing += len(pairs)
+            if not options['dry_run']:
+                created += bulk_create_notifications((
+                    Notification(
+                        recipient_id=recipient_id,
+                        title=f"New {severities.get(severity, severity)} Incident",
+                        message=f"Type: {types.get(incident_type, incident_type)}. Location: {location}",
+                        notification_type=severity,
+                        category='incident',
+                        related_incident_id=incident_id,
+                    )
+                    for recipient_id, incident_id, severity, incident_type, location in pairs
+                ), options['batch_size'], deliver=False)
+            self.stdout.write(f'  incidents: {scanned:,}/{total_incidents:,}, missing notifications: {missing:,}',
+                              ending='\r')
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write('')
+        if options['dry_run']:
+            self.stdout.write(f'{missing} notifications are missing for {scanned} incidents (dry run, nothing written).')
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {created} notifications for {scanned} incidents in {elapsed:.1f}s '
+            f'({created / elapsed if elapsed else 0:.0f}/s).'
+        ))
+
+    @staticmethod
+    def missing_pairs(recipients, incidents):
+        """
+        (recipient id, incident id, severity, incident type, location) for every
+        recipient x incident pair without a notification about that incident,
+        live or archived: one CROSS JOIN ... WHERE NOT EXISTS query instead of
+        one lookup per pair.
+        """
+        recipients_sql, recipients_params = recipients.values(recipient=F('pk')).query.sql_with_params()
+        incidents_sql, incidents_params = incidents.order_by().values(
+            'severity', 'incident_type', 'location', incident=F('pk'),
+        ).query.sql_with_params()
+        qn = connection.ops.quote_name
+        notifications = Notification._meta
+        archive = NotificationArchive._meta
+        sql = (
+            f'SELECT r.recipient, i.incident, i.severity, i.incident_type, i.location '
+            f'FROM ({recipients_sql}) r CROSS JOIN ({incidents_sql}) i '
+            f'WHERE NOT EXISTS (SELECT 1 FROM {qn(notifications.db_table)} n '
+            f'WHERE n.{qn(notifications.get_field("recipient").column)} = r.recipient '
+            f'AND n.{qn(notifications.get_field("related_incident").column)} = i.incident) '
+            # Read and archived is still notified: don't recreate it
+            f'AND NOT EXISTS (SELECT 1 FROM {qn(archive.db_table)} a '
+            f'WHERE a.{qn(archive.get_field("recipient").column)} = r.recipient '
+            f'AND a.{qn(archive.get_field("related_incident_id").column)} = i.incident) '
+            f'ORDER BY i.incident, r.recipient'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, recipients_params + incidents_params)
+            return cursor.fetchall()
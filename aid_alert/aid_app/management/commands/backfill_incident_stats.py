@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from aid_app.models import Incident, IncidentDailyStats
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the IncidentDailyStats rollup from the Incident table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000, help='Incidents read per chunk')
+
+    def handle(self, *args, **options):
+        rows = {}
+        incidents = Incident.objects.order_by().only(
+            'incident_type', 'severity', 'status', 'created_at', 'resolved_at'
+        ).iterator(chunk_size=options['batch_size'])
+
+        scanned = 0
+        for incident in incidents:
+            snap = IncidentDailyStats.snapshot(incident)
+            if snap is None:
+                continue
+            scanned += 1
+            (date, incident_type, severity), status, minutes = snap
+            stats = rows.get((date, incident_type, severity))
+            if stats is None:
+                stats = rows[(date, incident_type, severity)] = IncidentDailyStats(
+                    date=date, incident_type=incident_type, severity=severity
+                )
+            stats.total += 1
+            if f'{status}_count' in IncidentDailyStats.COUNTER_FIELDS:
+                setattr(stats, f'{status}_count', getattr(stats, f'{status}_count') + 1)
+            if minutes is not None:
+                stats.response_minutes_total += minutes
+                stats.response_count += 1
+
+        # Swap the whole rollup in one transaction so dashboards never see it half built
+        with transaction.atomic():
+            IncidentDailyStats.objects.all().delete()
+            IncidentDailyStats.objects.bulk_create(rows.values(), batch_size=500)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {len(rows)} daily stats rows from {scanned} incidents.'
+        ))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from aid_app.models import Notification, NotificationCounter
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the NotificationCounter unread counts from the Notification table'
+
+    def handle(self, *args, **options):
+        counts = Notification.objects.filter(is_read=False).order_by().values_list(
+            'recipient_id', 'notification_type'
+        ).annotate(n=Count('id'))
+
+        # Swap all counters in one transaction so badges never see them half built
+        with transaction.atomic():
+            rows = [
+                NotificationCounter(user_id=user_id, notification_type=notification_type, unread_count=n)
+                for user_id, notification_type, n in counts
+            ]
+            NotificationCounter.objects.all().delete()
+            NotificationCounter.objects.bulk_create(rows, batch_size=500)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {len(rows)} counters from {sum(row.unread_count for row in rows)} unread notifications.'
+        ))
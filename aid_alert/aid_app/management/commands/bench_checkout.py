@@ -0,0 +1,88 @@
+from concurrent.futures import ThreadPoolExecutor
+import random
+import threading
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+from django.db import connection, OperationalError
+from django.db.models import Sum
+from aid_app.models import Order, Product
+from aid_app.checkout import place_orders, CheckoutError
+
+
+class Command(BaseCommand):
+    help = 'Run many concurrent checkouts against limited stock and check nothing is oversold'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--buyers', type=int, default=300, help='Concurrent checkouts')
+        parser.add_argument('--products', type=int, default=3, help='Products competed for')
+        parser.add_argument('--stock', type=int, default=50, help='Starting stock per product')
+        parser.add_argument('--max-quantity', type=int, default=3, help='Largest quantity per cart line')
+        parser.add_argument('--workers', type=int, default=32, help='Thread pool size')
+
+    def handle(self, *args, **options):
+        stock = options['stock']
+        seller = User.objects.create(username=f'bench-checkout-{int(time.time())}')
+        prefix = f'{seller.username}-b'
+        User.objects.bulk_create([User(username=f'{prefix}{i}') for i in range(options['buyers'])])
+        buyers = list(User.objects.filter(username__startswith=prefix))
+        Product.objects.bulk_create([
+            Product(seller=seller, name=f'Bench Item {i}', description='Benchmark', price=Decimal('5.00'),
+                    stock_quantity=stock, category='other', condition='new')
+            for i in range(options['products'])
+        ])
+        product_ids = list(Product.objects.filter(seller=seller).values_list('id', flat=True))
+
+        rng = random.Random(7)
+        carts = [
+            [{'id': pid, 'quantity': rng.randint(1, options['max_quantity'])}
+             for pid in rng.sample(product_ids, rng.randint(1, len(product_ids)))]
+            for _ in buyers
+        ]
+
+        start = threading.Event()
+        outcome = {'placed': 0, 'rejected': 0, 'lock_errors': 0}
+        outcome_lock = threading.Lock()
+
+        def checkout(buyer, cart):
+            try:
+                start.wait()
+                place_orders(buyer, cart)
+                result = 'placed'
+            except CheckoutError:
+                result = 'rejected'
+            except OperationalError:
+                result = 'lock_errors'
+            finally:
+                connection.close()
+            with outcome_lock:
+                outcome[result] += 1
+
+        try:
+            with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+                futures = [pool.submit(checkout, buyer, cart) for buyer, cart in zip(buyers, carts)]
+                started = time.perf_counter()
+                start.set()
+                for future in futures:
+                    future.result()
+            elapsed = time.perf_counter() - started
+
+            oversold = []
+            for product in Product.objects.filter(pk__in=product_ids):
+                sold = Order.objects.filter(product=product).aggregate(total=Sum('quantity'))['total'] or 0
+                if sold + product.stock_quantity != stock:
+                    oversold.append(f'{product.name}: sold {sold}, left {product.stock_quantity}')
+
+            self.stdout.write(
+                f"{len(buyers)} checkouts in {elapsed * 1000:.1f} ms: {outcome['placed']} placed, "
+                f"{outcome['rejected']} rejected for stock, {outcome['lock_errors']} lock error(s)"
+            )
+        finally:
+            User.objects.filter(username__startswith=prefix).delete()
+            seller.delete()
+
+        if oversold:
+            raise CommandError('Stock and orders disagree: ' + '; '.join(oversold))
+        self.stdout.write(self.style.SUCCESS('No product was oversold.'))
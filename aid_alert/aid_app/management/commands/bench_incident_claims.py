@@ -0,0 +1,82 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+from django.db import connection, OperationalError
+from aid_app.models import Incident, Responder
+from aid_app.dispatch import claim_incident
+
+
+class Command(BaseCommand):
+    help = 'Fire many parallel claims at the same incidents and check exactly one claim wins each time'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--claimers', type=int, default=200, help='Parallel claims per incident')
+        parser.add_argument('--rounds', type=int, default=5, help='Number of incidents to fight over')
+        parser.add_argument('--workers', type=int, default=32, help='Thread pool size')
+
+    def handle(self, *args, **options):
+        claimers = options['claimers']
+        rounds = options['rounds']
+        workers = options['workers']
+
+        # Throwaway responders and reporter, removed again at the end
+        User.objects.bulk_create([
+            User(username=f'bench-claim-{i}') for i in range(claimers)
+        ])
+        users = list(User.objects.filter(username__startswith='bench-claim-'))
+        reporter = users[0]
+        # Creating through save() keeps the availability history signals happy
+        responders = [
+            Responder.objects.create(user=u, responder_id=f'BENCH-{u.id}', phone='000', status='available')
+            for u in users
+        ]
+
+        failures = 0
+        try:
+            for round_no in range(1, rounds + 1):
+                incident = Incident.objects.create(
+                    user=reporter, incident_type='medical', severity='critical',
+                    location='Benchmark', description='Claim benchmark', contact_phone='000',
+                )
+
+                start = threading.Event()
+                lock_errors = []
+
+                def claim(responder):
+                    try:
+                        # Hold every worker until all claims are queued
+                        start.wait()
+                        return claim_incident(incident.pk, responder)
+                    except OperationalError as e:
+                        lock_errors.append(str(e))
+                        return False
+                    finally:
+                        connection.close()
+
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    futures = [pool.submit(claim, responder) for responder in responders]
+                    started = time.perf_counter()
+                    start.set()
+                    results = [future.result() for future in futures]
+                elapsed = time.perf_counter() - started
+
+                winners = sum(results)
+                incident.refresh_from_db()
+                history_rows = incident.status_history.filter(status='en_route').count()
+                ok = winners == 1 and incident.assigned_responder_id is not None and history_rows == 1
+                if not ok:
+                    failures += 1
+
+                line = (f'Round {round_no}: {claimers} claims in {elapsed * 1000:.1f} ms, '
+                        f'{winners} winner(s), {len(lock_errors)} lock error(s)')
+                self.stdout.write(self.style.SUCCESS(line) if ok else self.style.ERROR(line))
+        finally:
+            Incident.objects.filter(user=reporter).delete()
+            User.objects.filter(username__startswith='bench-claim-').delete()
+
+        if failures:
+            raise CommandError(f'{failures} of {rounds} rounds did not have exactly one winner.')
+        self.stdout.write(self.style.SUCCESS('Exactly one claim won in every round.'))
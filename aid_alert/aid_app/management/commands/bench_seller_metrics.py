@@ -0,0 +1,141 @@
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import Sum, Min
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from aid_app.models import Order, Product
+from aid_app.seller_metrics import seller_metrics
+
+
+def legacy_metrics(seller, start_date, end_date):
+    """The per-period metrics the seller report used to compute, kept as the benchmark baseline."""
+    orders = Order.objects.filter(
+        product__seller=seller, created_at__range=(start_date, end_date)
+    ).exclude(status='cancelled')
+
+    total_revenue = orders.aggregate(total=Sum('total_price'))['total'] or 0
+    total_orders = orders.count()
+    unique_customer_ids = list(orders.values_list('customer_id', flat=True).distinct())
+    customer_first_orders = Order.objects.filter(
+        customer_id__in=unique_customer_ids, product__seller=seller
+    ).values('customer_id').annotate(first_seen=Min('created_at'))
+    returning = sum(1 for c in customer_first_orders if c['first_seen'] < start_date)
+
+    customer_spends = orders.values('customer').annotate(spent=Sum('total_price')).order_by('-spent')
+    top_customers = []
+    for item in customer_spends[:3]:
+        u = User.objects.get(id=item['customer'])
+        top_customers.append({'name': u.get_full_name() or u.username, 'total_spent': item['spent']})
+
+    products = list(orders.values('product__name', 'product__id').annotate(
+        units_sold=Sum('quantity'), revenue=Sum('total_price')
+    ).order_by('-revenue')[:5])
+
+    return {
+        'revenue': total_revenue,
+        'orders': total_orders,
+        # The old distinct() kept Order.Meta.ordering, so the list repeats customers
+        'customers': len(set(unique_customer_ids)),
+        'returning': returning,
+        'top_customers': top_customers,
+        'products': [p['product__id'] for p in products],
+    }
+
+
+class Command(BaseCommand):
+    help = 'Compare query count and latency of the seller sales metrics against the old per-period queries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=100000, help='Orders to generate for the seller')
+        parser.add_argument('--customers', type=int, default=2000, help='Distinct customers')
+        parser.add_argument('--products', type=int, default=50, help='Products listed by the seller')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per implementation')
+        parser.add_argument('--keep', action='store_true', help='Keep the generated data')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        seller = User.objects.create(username=f'bench-seller-{int(time.time())}')
+        prefix = f'{seller.username}-c'
+
+        self.stdout.write(f'Generating {options["orders"]} orders...')
+        User.objects.bulk_create([
+            User(username=f'{prefix}{i}', first_name=f'Customer{i}') for i in range(options['customers'])
+        ], batch_size=1000)
+        customer_ids = list(User.objects.filter(username__startswith=prefix).values_list('id', flat=True))
+        Product.objects.bulk_create([
+            Product(seller=seller, name=f'Bench Product {i}', description='Benchmark', price=Decimal('10.00'),
+                    stock_quantity=1000, category='Benchmark')
+            for i in range(options['products'])
+        ])
+        product_ids = list(Product.objects.filter(seller=seller).values_list('id', flat=True))
+
+        rng = random.Random(42)
+        batch = []
+        for _ in range(options['orders']):
+            quantity = rng.randint(1, 5)
+            batch.append(Order(
+                customer_id=rng.choice(customer_ids),
+                product_id=rng.choice(product_ids),
+                quantity=quantity,
+                total_price=Decimal('10.00') * quantity,
+                status=rng.choice(['pending', 'processing', 'shipped', 'delivered', 'cancelled']),
+            ))
+            if len(batch) == 5000:
+                Order.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            Order.objects.bulk_create(batch)
+        # auto_now_add ignores explicit values, so spread the orders over two years afterwards
+        orders = [
+            Order(id=order_id, created_at=now - timedelta(minutes=rng.randint(0, 730 * 24 * 60)))
+            for order_id in Order.objects.filter(product__seller=seller).values_list('id', flat=True)
+        ]
+        Order.objects.bulk_update(orders, ['created_at'], batch_size=2000)
+
+        try:
+            for period_days in [7, 30, 365]:
+                start = now - timedelta(days=period_days)
+                prev_start = start - timedelta(days=period_days)
+
+                def legacy():
+                    return legacy_metrics(seller, start, now), legacy_metrics(seller, prev_start, start)
+
+                def single_pass():
+                    return seller_metrics(seller, start, now, prev_start, start)
+
+                results = {}
+                for name, fn in [('legacy', legacy), ('single-pass', single_pass)]:
+                    timings = []
+                    for _ in range(options['repeat']):
+                        with CaptureQueriesContext(connection) as queries:
+                            started = time.perf_counter()
+                            result = fn()
+                            timings.append(time.perf_counter() - started)
+                        results[name] = (result, len(queries))
+                    timings.sort()
+                    self.stdout.write(
+                        f'{period_days:>3}d {name:<12} {len(queries):>3} queries  '
+                        f'median {timings[len(timings) // 2] * 1000:8.1f} ms'
+                    )
+
+                (old_cur, old_prev), _ = results['legacy']
+                (new_cur, new_prev), _ = results['single-pass']
+                for old, new in [(old_cur, new_cur), (old_prev, new_prev)]:
+                    for key in ['revenue', 'orders', 'customers']:
+                        if old[key] != new[key]:
+                            raise CommandError(f'{period_days}d {key} differs: {old[key]} != {new[key]}')
+                new_returning = round(new_cur['customer_segments']['returning_pct'] * new_cur['customers'] / 100)
+                if old_cur['returning'] != new_returning:
+                    raise CommandError(f'{period_days}d returning customers differ: {old_cur["returning"]} != {new_returning}')
+        finally:
+            if not options['keep']:
+                User.objects.filter(username__startswith=prefix).delete()
+                seller.delete()
+
+        self.stdout.write(self.style.SUCCESS('Both implementations agree.'))
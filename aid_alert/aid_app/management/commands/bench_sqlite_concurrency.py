@@ -0,0 +1,124 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+from django.db import connection, connections, OperationalError
+from aid_app import sqlite_tuning
+from aid_app.models import Incident, IncidentDailyStats
+
+# What a connection got before the tuning hook: rollback journal, full fsync,
+# Python's default 5 s lock wait and SQLite's default caches
+UNTUNED_PRAGMAS = {
+    'journal_mode': 'DELETE',
+    'synchronous': 'FULL',
+    'busy_timeout': 5000,
+    'mmap_size': 0,
+    'cache_size': -2000,
+    'temp_store': 'DEFAULT',
+}
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class Command(BaseCommand):
+    help = 'Compare concurrent alert writes and dashboard reads on SQLite with and without the tuning pragmas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=4, help='Threads reporting incidents')
+        parser.add_argument('--readers', type=int, default=8, help='Threads loading dashboard queries')
+        parser.add_argument('--duration', type=float, default=10, help='Seconds per mode')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('This benchmark is for the SQLite backend.')
+
+        user = User.objects.create(username=f'bench-sqlite-{int(time.time())}')
+        tuned = sqlite_tuning.PRAGMAS
+        try:
+            results = {}
+            for mode, pragmas in [('untuned', UNTUNED_PRAGMAS), ('tuned', tuned)]:
+                results[mode] = self.run_mode(mode, pragmas, user, options)
+        finally:
+            self.use_pragmas(tuned)
+            Incident.objects.filter(user=user).delete()
+            user.delete()
+
+        for mode, result in results.items():
+            self.stdout.write(
+                f'{mode:<8} {result["writes"] / options["duration"]:8.1f} writes/s  '
+                f'{result["reads"] / options["duration"]:8.1f} reads/s  '
+                f'write p95 {result["write_p95"]:7.1f} ms  read p95 {result["read_p95"]:7.1f} ms  '
+                f'{result["locked"]} locked error(s)'
+            )
+        before, after = results['untuned'], results['tuned']
+        self.stdout.write(self.style.SUCCESS(
+            f'Throughput with tuning: writes x{after["writes"] / max(before["writes"], 1):.1f}, '
+            f'reads x{after["reads"] / max(before["reads"], 1):.1f}.'
+        ))
+
+    def use_pragmas(self, pragmas):
+        """Makes every new connection use `pragmas`; journal_mode is switched on the file right away."""
+        sqlite_tuning.PRAGMAS = pragmas
+        connections.close_all()
+        # Opening a connection runs the hook, which sets the journal mode on the database file
+        connection.ensure_connection()
+        connections.close_all()
+
+    def run_mode(self, mode, pragmas, user, options):
+        self.use_pragmas(pragmas)
+        deadline = time.perf_counter() + options['duration']
+        start = threading.Event()
+        lock = threading.Lock()
+        result = {'writes': 0, 'reads': 0, 'locked': 0}
+        write_times, read_times = [], []
+
+        def work(operation, counter, timings):
+            start.wait()
+            try:
+                while time.perf_counter() < deadline:
+                    began = time.perf_counter()
+                    try:
+                        operation()
+                    except OperationalError:
+                        with lock:
+                            result['locked'] += 1
+                        continue
+                    elapsed = (time.perf_counter() - began) * 1000
+                    with lock:
+                        result[counter] += 1
+                        timings.append(elapsed)
+            finally:
+                connection.close()
+
+        def report_incident():
+            # Same writes as report_incident_view: the incident, its history row and the daily stats
+            Incident.objects.create(
+                user=user, incident_type='other', severity='low', location='Benchmark',
+                description='SQLite concurrency benchmark', contact_phone='000',
+            )
+
+        def load_dashboard():
+            Incident.objects.filter(status='open').count()
+            IncidentDailyStats.totals()
+            list(Incident.objects.order_by('-created_at')[:20])
+
+        threads = [threading.Thread(target=work, args=(report_incident, 'writes', write_times))
+                   for _ in range(options['writers'])]
+        threads += [threading.Thread(target=work, args=(load_dashboard, 'reads', read_times))
+                    for _ in range(options['readers'])]
+        for thread in threads:
+            thread.start()
+        self.stdout.write(f'Running {mode} for {options["duration"]:g}s...')
+        start.set()
+        for thread in threads:
+            thread.join()
+
+        result['write_p95'] = percentile(write_times, 0.95)
+        result['read_p95'] = percentile(read_times, 0.95)
+        return result
@@ -0,0 +1,195 @@
+import json
+import math
+import platform
+import subprocess
+import time
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from aid_app.models import Feedback, Incident, IncidentStatusHistory, Notification, Order, Responder
+
+# (role, URL name) of every page and API benchmarked, grouped by who can open it
+ENDPOINTS = [
+    ('user', 'aid_app:dashboard'),
+    ('user', 'aid_app:incident_history'),
+    ('user', 'aid_app:order_history'),
+    ('user', 'aid_app:my_feedback'),
+    ('user', 'aid_app:buy_products'),
+    ('responder', 'aid_app:responder_dashboard'),
+    ('responder', 'aid_app:available_incidents'),
+    ('responder', 'aid_app:responder_history'),
+    ('responder', 'aid_app:feedback_received'),
+    ('facility', 'aid_app:facility_dashboard'),
+    ('facility', 'aid_app:facility_incident_log'),
+    ('facility', 'aid_app:facility_reports'),
+    ('facility', 'aid_app:manage_kits'),
+    ('facility', 'aid_app:stock_tracking'),
+    ('facility', 'aid_app:facility_notifications'),
+    ('seller', 'aid_app:seller_dashboard'),
+    ('seller', 'aid_app:seller_report'),
+    ('seller', 'aid_app:view_orders'),
+    ('seller', 'aid_app:view_products'),
+    ('seller', 'aid_app:get_delivery_data'),
+    ('admin', 'aid_app:admin_dashboard'),
+    ('admin', 'aid_app:system_reports'),
+    ('admin', 'aid_app:view_all_incidents'),
+    ('admin', 'aid_app:incident_reports'),
+    ('admin', 'aid_app:manage_users'),
+    ('admin', 'aid_app:feedback_analysis'),
+]
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = 'Time every role\'s dashboards and APIs through the test client and report p50/p95 latency and queries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prefix', default='load', help='Prefix of the generate_load_data records to use')
+        parser.add_argument('--requests', type=int, default=10, help='Timed requests per endpoint')
+        parser.add_argument('--warmup', type=int, default=1, help='Untimed requests per endpoint first')
+        parser.add_argument('--only', help='Only endpoints whose URL name contains this text')
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+        parser.add_argument('--compare', help='JSON file from an earlier run to compare against')
+
+    def handle(self, *args, **options):
+        subjects = self.pick_subjects(options['prefix'])
+        endpoints = [(role, name) for role, name in ENDPOINTS if not options['only'] or options['only'] in name]
+        if not endpoints:
+            raise CommandError('No endpoint matches --only.')
+
+        results = {}
+        for role, name in endpoints:
+            client = Client(HTTP_HOST='localhost')
+            client.force_login(subjects[role])
+            url = reverse(name)
+            for _ in range(options['warmup']):
+                client.get(url)
+
+            timings, queries, statuses = [], [], set()
+            for _ in range(options['requests']):
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    response = client.get(url)
+                    timings.append((time.perf_counter() - started) * 1000)
+                    if response.streaming:
+                        # Drain streamed exports so their queries are counted too
+                        b''.join(response.streaming_content)
+                profile = getattr(response, 'query_profile', None)
+                queries.append(profile.query_count if profile else len(captured))
+                statuses.add(response.status_code)
+
+            results[name] = {
+                'role': role,
+                'p50_ms': round(percentile(timings, 0.5), 2),
+                'p95_ms': round(percentile(timings, 0.95), 2),
+                'mean_ms': round(sum(timings) / len(timings), 2),
+                'queries': max(queries),
+                'status': sorted(statuses),
+            }
+            self.report(name, results[name])
+
+        run = {'meta': self.metadata(subjects, options), 'results': results}
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(run, f, indent=2)
+            self.stdout.write(f'Results written to {options["output"]}')
+        if options['compare']:
+            self.compare(run, options['compare'])
+
+        failed = [name for name, result in results.items() if result['status'] != [200]]
+        if failed:
+            raise CommandError('Non-200 responses from: ' + ', '.join(failed))
+        self.stdout.write(self.style.SUCCESS(f'Benchmarked {len(results)} endpoints.'))
+
+    def pick_subjects(self, prefix):
+        """The busiest generated account of each role, so the same data set always gives the same subjects."""
+        generated = User.objects.filter(username__startswith=f'{prefix}-')
+
+        def busiest(queryset, key):
+            top = queryset.values(key).annotate(n=Count('pk')).order_by('-n', key).first()
+            return top[key] if top else None
+
+        subjects = {
+            'user': busiest(Order.objects.filter(customer__in=generated), 'customer'),
+            'responder': busiest(Incident.objects.filter(assigned_responder__user__in=generated), 'assigned_responder__user'),
+            'seller': busiest(Order.objects.filter(product__seller__in=generated), 'product__seller'),
+            'facility': generated.filter(profile__role='facility').order_by('pk').values_list('pk', flat=True).first(),
+            'admin': generated.filter(is_staff=True).order_by('pk').values_list('pk', flat=True).first(),
+        }
+        missing = [role for role, pk in subjects.items() if pk is None]
+        if missing:
+            raise CommandError(
+                f'No generated {", ".join(missing)} account with prefix "{prefix}"; run generate_load_data first.'
+            )
+        users = User.objects.in_bulk(subjects.values())
+        return {role: users[pk] for role, pk in subjects.items()}
+
+    def metadata(self, subjects, options):
+        return {
+            'commit': git_commit(),
+            'run_at': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'requests': options['requests'],
+            'subjects': {role: user.username for role, user in subjects.items()},
+            # Row counts, so runs are only compared against the same data set
+            'rows': {
+                'users': User.objects.count(),
+                'responders': Responder.objects.count(),
+                'incidents': Incident.objects.count(),
+                'status_history': IncidentStatusHistory.objects.count(),
+                'orders': Order.objects.count(),
+                'feedback': Feedback.objects.count(),
+                'notifications': Notification.objects.count(),
+            },
+        }
+
+    def report(self, name, result):
+        line = (f'{name:<36} p50 {result["p50_ms"]:9.1f} ms   p95 {result["p95_ms"]:9.1f} ms   '
+                f'{result["queries"]:4d} queries')
+        if result['status'] != [200]:
+            line += f'   status {result["status"]}'
+            self.stdout.write(self.style.WARNING(line))
+        else:
+            self.stdout.write(line)
+
+    def compare(self, run, path):
+        with open(path) as f:
+            baseline = json.load(f)
+        if baseline['meta'].get('rows') != run['meta']['rows']:
+            self.stdout.write(self.style.WARNING('Row counts differ from the baseline; timings are not comparable.'))
+
+        self.stdout.write(f'\nCompared with {baseline["meta"].get("commit") or path}:')
+        for name, result in run['results'].items():
+            before = baseline['results'].get(name)
+            if before is None:
+                continue
+            change = (result['p50_ms'] - before['p50_ms']) / before['p50_ms'] * 100 if before['p50_ms'] else 0
+            self.stdout.write(
+                f'{name:<36} p50 {before["p50_ms"]:9.1f} -> {result["p50_ms"]:9.1f} ms ({change:+.0f}%)   '
+                f'queries {before["queries"]} -> {result["queries"]}'
+            )
@@ -0,0 +1,70 @@
+import json
+import time
+from unittest import mock
+
+from django.core.management.base import BaseCommand
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from aid_app.models import ChangeTrackingMixin, Incident, Responder, UserProfile
+
+
+class Command(BaseCommand):
+    help = 'Count the queries of the responder status views with and without the loaded-value tracker'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20, help='Requests per view and mode')
+
+    def handle(self, *args, **options):
+        count = options['requests']
+        user = User.objects.create(username=f'bench-status-{int(time.time())}')
+        UserProfile.objects.create(user=user, role='responder')
+        responder = Responder.objects.create(user=user, responder_id=f'BENCH-{user.id}', phone='000', status='available')
+        incident = Incident.objects.create(
+            user=user, incident_type='medical', severity='low', location='Benchmark',
+            description='Status save benchmark', contact_phone='000',
+            assigned_responder=responder, status='en_route',
+        )
+
+        client = Client(HTTP_HOST='localhost')
+        client.force_login(user)
+        statuses = ['on-scene', 'providing-aid', 'transporting', 'en-route']
+
+        def toggle(i):
+            return client.post('/toggle-responder-status/', json.dumps({'active': i % 2 == 0}),
+                               content_type='application/json')
+
+        def update_status(i):
+            return client.post('/update-incident-status/', {'status': statuses[i % len(statuses)]})
+
+        try:
+            results = {}
+            for mode in ['tracked', 'untracked']:
+                patch = mock.patch.object(ChangeTrackingMixin, 'loaded_values', return_value=None)
+                if mode == 'untracked':
+                    # Every pre_save falls back to fetching the row, like before the tracker
+                    patch.start()
+                try:
+                    for name, view in [('toggle_responder_status', toggle), ('update_incident_status_view', update_status)]:
+                        with CaptureQueriesContext(connection) as queries:
+                            for i in range(count):
+                                response = view(i)
+                                assert response.status_code in (200, 302), response.status_code
+                        results[(name, mode)] = len(queries) / count
+                finally:
+                    if mode == 'untracked':
+                        patch.stop()
+
+            for name in ['toggle_responder_status', 'update_incident_status_view']:
+                tracked = results[(name, 'tracked')]
+                untracked = results[(name, 'untracked')]
+                self.stdout.write(
+                    f'{name:<28} {untracked:5.1f} -> {tracked:5.1f} queries per request '
+                    f'({untracked - tracked:.1f} saved)'
+                )
+        finally:
+            incident.delete()
+            user.delete()
+
+        self.stdout.write(self.style.SUCCESS('Done.'))
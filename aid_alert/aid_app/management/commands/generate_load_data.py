@@ -0,0 +1,299 @@
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.utils import timezone
+from aid_app.catalog import invalidate_catalog
+from aid_app.models import (
+    AlertDelivery, Feedback, Incident, IncidentStatusHistory, Notification, Order, Product, Responder, UserProfile,
+)
+
+# Default volumes at --scale 1
+VOLUMES = {
+    'users': 200_000,
+    'responders': 20_000,
+    'sellers': 2_000,
+    'facilities': 200,
+    'admins': 20,
+    'products': 20_000,
+    'incidents': 2_000_000,
+    'orders': 2_000_000,
+    'notifications': 1_000_000,
+}
+
+# Status mix of generated incidents (the rest of the lifecycle is filled in from it)
+INCIDENT_STATUS_WEIGHTS = {
+    'open': 3, 'en_route': 2, 'on_scene': 1, 'providing_aid': 1, 'transporting': 1, 'resolved': 60, 'closed': 32,
+}
+ORDER_STATUS_WEIGHTS = {
+    'pending': 5, 'processing': 5, 'shipped': 10, 'delivered': 70, 'cancelled': 7, 'returned': 3,
+}
+# Statuses an incident passes through, in order
+LIFECYCLE = ['open', 'en_route', 'on_scene', 'providing_aid', 'transporting', 'resolved', 'closed']
+
+CITY_CENTER = (40.7128, -74.0060)
+
+
+@contextmanager
+def historical_timestamps(*fields):
+    """Lets bulk_create keep the created_at/timestamp values we set instead of stamping "now"."""
+    previous = [(field, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, value in previous:
+            field.auto_now_add = value
+
+
+def weighted(rng, weights):
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+class Command(BaseCommand):
+    help = 'Bulk-generate a large, reproducible data set (users, incidents, orders, history, feedback, notifications)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=1.0,
+                            help='Multiplies every default volume (e.g. 0.01 for a quick local run)')
+        for name, default in VOLUMES.items():
+            parser.add_argument(f'--{name}', type=int, help=f'Number of {name} (default {default:,} x scale)')
+        parser.add_argument('--days', type=int, default=365, help='Spread records over this many past days')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per INSERT')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed; the same seed gives the same data')
+        parser.add_argument('--prefix', default='load', help='Username / id prefix of generated records')
+        parser.add_argument('--clear', action='store_true', help='Delete previously generated records first')
+
+    def handle(self, *args, **options):
+        if not connection.features.can_return_rows_from_bulk_insert:
+            raise CommandError('This database does not return ids from bulk inserts; use SQLite 3.35+ or PostgreSQL.')
+
+        self.rng = random.Random(options['seed'])
+        self.prefix = options['prefix']
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+        self.span = timedelta(days=options['days']).total_seconds()
+        volumes = {
+            name: options[name] if options[name] is not None else max(1, int(default * options['scale']))
+            for name, default in VOLUMES.items()
+        }
+
+        if options['clear']:
+            self.clear()
+        elif User.objects.filter(username__startswith=f'{self.prefix}-').exists():
+            raise CommandError(f'Records with prefix "{self.prefix}" exist; pass --clear or another --prefix.')
+
+        started = time.perf_counter()
+        self.password = make_password('loadtest')
+        users = self.create_users('user', 'user', volumes['users'])
+        sellers = self.create_users('seller', 'seller', volumes['sellers'])
+        self.create_users('facility', 'facility', volumes['facilities'])
+        self.create_users('admin', 'user', volumes['admins'], is_staff=True)
+        responders = self.create_responders(volumes['responders'])
+        products = self.create_products(sellers, volumes['products'])
+        self.create_incidents(users, responders, volumes['incidents'])
+        self.create_orders(users, products, volumes['orders'])
+        self.create_notifications(users, volumes['notifications'])
+
+        # bulk_create skips the signal handlers that maintain the rollups
+        self.stdout.write('Rebuilding incident daily stats...')
+        call_command('backfill_incident_stats', stdout=self.stdout)
+        self.stdout.write('Rebuilding notification counters...')
+        call_command('backfill_notification_counters', stdout=self.stdout)
+        # ...and the catalog cache version bump
+        invalidate_catalog()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated data set "{self.prefix}" (seed {options["seed"]}) in {time.perf_counter() - started:.0f}s.'
+        ))
+
+    def clear(self):
+        self.stdout.write(f'Deleting records with prefix "{self.prefix}"...')
+        generated = User.objects.filter(username__startswith=f'{self.prefix}-')
+        # Children first, in bulk, so the cascade doesn't have to collect millions of rows
+        notifications = Notification.objects.filter(recipient__in=generated)
+        AlertDelivery.objects.filter(notification__in=notifications).delete()
+        # Skip the per-notification counter signals: the users' counters go with the users
+        notifications._raw_delete(notifications.db)
+        Order.objects.filter(customer__in=generated).delete()
+        incidents = Incident.objects.filter(user__in=generated)
+        Feedback.objects.filter(incident__in=incidents).delete()
+        IncidentStatusHistory.objects.filter(incident__in=incidents).delete()
+        # Skip the per-incident delete signals: the daily stats are rebuilt after generating anyway
+        incidents._raw_delete(incidents.db)
+        generated.delete()
+
+    def random_time(self):
+        return self.now - timedelta(seconds=self.rng.random() * self.span)
+
+    def insert(self, model, objects, label, total):
+        created = model.objects.bulk_create(objects, batch_size=self.batch_size)
+        self.stdout.write(f'  {label}: {total:,}', ending='\r')
+        return created
+
+    def batches(self, total):
+        for start in range(0, total, self.batch_size):
+            yield start, min(self.batch_size, total - start)
+
+    def create_users(self, kind, role, count, is_staff=False):
+        ids = []
+        for start, size in self.batches(count):
+            with transaction.atomic():
+                users = self.insert(User, [
+                    User(username=f'{self.prefix}-{kind}-{start + i}', first_name=kind.title(),
+                         last_name=str(start + i), email=f'{self.prefix}-{kind}-{start + i}@example.com',
+                         password=self.password, is_staff=is_staff, date_joined=self.random_time())
+                    for i in range(size)
+                ], kind, start + size)
+                UserProfile.objects.bulk_create([
+                    UserProfile(user=user, role=role, gender=self.rng.choice(['male', 'female', 'other']))
+                    for user in users
+                ], batch_size=self.batch_size)
+            ids.extend(user.pk for user in users)
+        self.stdout.write(f'  {kind}: {count:,} created')
+        return ids
+
+    def create_responders(self, count):
+        user_ids = self.create_users('responder', 'responder', count)
+        responder_ids = []
+        for start, size in self.batches(count):
+            responders = self.insert(Responder, [
+                Responder(
+                    user_id=user_id,
+                    responder_id=f'{self.prefix[:6].upper()}-{start + i:07d}',
+                    phone='555-0100',
+                    specialization=self.rng.choice(['EMT-Basic', 'EMT-Advanced', 'Paramedic']),
+                    status=self.rng.choice(['available', 'available', 'on_duty', 'off_duty']),
+                    latitude=CITY_CENTER[0] + self.rng.uniform(-0.2, 0.2),
+                    longitude=CITY_CENTER[1] + self.rng.uniform(-0.2, 0.2),
+                    rating=round(self.rng.uniform(3, 5), 1),
+                )
+                for i, user_id in enumerate(user_ids[start:start + size])
+            ], 'responder profiles', start + size)
+            responder_ids.extend(responder.pk for responder in responders)
+        self.stdout.write(f'  responder profiles: {count:,} created')
+        return responder_ids
+
+    def create_products(self, sellers, count):
+        categories = [value for value, _ in Product.CATEGORY_CHOICES]
+        conditions = [value for value, _ in Product.CONDITION_CHOICES]
+        products = []
+        with historical_timestamps(Product._meta.get_field('created_at')):
+            for start, size in self.batches(count):
+                created = self.insert(Product, [
+                    Product(
+                        seller_id=self.rng.choice(sellers),
+                        name=f'Load Product {start + i}',
+                        description='Generated product',
+                        category=self.rng.choice(categories),
+                        condition=self.rng.choice(conditions),
+                        price=Decimal(self.rng.randint(100, 20000)) / 100,
+                        stock_quantity=self.rng.randint(0, 500),
+                        created_at=self.random_time(),
+                    )
+                    for i in range(size)
+                ], 'products', start + size)
+                products.extend((product.pk, product.price) for product in created)
+        self.stdout.write(f'  products: {count:,} created')
+        return products
+
+    def create_incidents(self, users, responders, count):
+        types = [value for value, _ in Incident.INCIDENT_TYPE_CHOICES]
+        severities = [value for value, _ in Incident.SEVERITY_CHOICES]
+        feedback_count = history_count = 0
+        stamped = historical_timestamps(
+            Incident._meta.get_field('created_at'),
+            IncidentStatusHistory._meta.get_field('timestamp'),
+            Feedback._meta.get_field('created_at'),
+        )
+        with stamped:
+            for start, size in self.batches(count):
+                incidents = []
+                for i in range(size):
+                    status = weighted(self.rng, INCIDENT_STATUS_WEIGHTS)
+                    created_at = self.random_time()
+                    incidents.append(Incident(
+                        user_id=self.rng.choice(users),
+                        assigned_responder_id=None if status == 'open' else self.rng.choice(responders),
+                        incident_type=self.rng.choice(types),
+                        severity=self.rng.choice(severities),
+                        location='Generated location',
+                        latitude=CITY_CENTER[0] + self.rng.uniform(-0.3, 0.3),
+                        longitude=CITY_CENTER[1] + self.rng.uniform(-0.3, 0.3),
+                        description='Generated incident',
+                        contact_phone='555-0199',
+                        status=status,
+                        created_at=created_at,
+                        resolved_at=(created_at + timedelta(minutes=self.rng.uniform(5, 180))
+                                     if status in ('resolved', 'closed') else None),
+                    ))
+
+                with transaction.atomic():
+                    incidents = self.insert(Incident, incidents, 'incidents', start + size)
+                    history, feedback = [], []
+                    for incident in incidents:
+                        # One history row per status the incident has been through so far
+                        reached = LIFECYCLE.index(incident.status)
+                        moment = incident.created_at
+                        for status in LIFECYCLE[:reached + 1]:
+                            history.append(IncidentStatusHistory(incident=incident, status=status, timestamp=moment))
+                            moment += timedelta(minutes=self.rng.uniform(1, 30))
+                        if incident.resolved_at and self.rng.random() < 0.3:
+                            feedback.append(Feedback(
+                                user_id=incident.user_id, incident=incident, rating=self.rng.randint(1, 5),
+                                message='Generated feedback', created_at=incident.resolved_at + timedelta(hours=1),
+                            ))
+                    IncidentStatusHistory.objects.bulk_create(history, batch_size=self.batch_size)
+                    Feedback.objects.bulk_create(feedback, batch_size=self.batch_size)
+                history_count += len(history)
+                feedback_count += len(feedback)
+        self.stdout.write(
+            f'  incidents: {count:,} created, with {history_count:,} status history rows and {feedback_count:,} feedback'
+        )
+
+    def create_orders(self, users, products, count):
+        with historical_timestamps(Order._meta.get_field('created_at')):
+            for start, size in self.batches(count):
+                orders = []
+                for i in range(size):
+                    product_id, price = self.rng.choice(products)
+                    quantity = self.rng.randint(1, 3)
+                    orders.append(Order(
+                        customer_id=self.rng.choice(users),
+                        product_id=product_id,
+                        quantity=quantity,
+                        total_price=price * quantity,
+                        status=weighted(self.rng, ORDER_STATUS_WEIGHTS),
+                        created_at=self.random_time(),
+                    ))
+                self.insert(Order, orders, 'orders', start + size)
+        self.stdout.write(f'  orders: {count:,} created')
+
+    def create_notifications(self, users, count):
+        types = [value for value, _ in Notification.TYPE_CHOICES]
+        categories = [value for value, _ in Notification.CATEGORY_CHOICES]
+        with historical_timestamps(Notification._meta.get_field('created_at')):
+            for start, size in self.batches(count):
+                notifications = []
+                for _ in range(size):
+                    notification = Notification(
+                        recipient_id=self.rng.choice(users),
+                        title='Generated notification',
+                        message='Generated notification message',
+                        notification_type=self.rng.choice(types),
+                        category=self.rng.choice(categories),
+                        is_read=self.rng.random() < 0.7,
+                        created_at=self.random_time(),
+                    )
+                    notification.last_occurred_at = notification.created_at
+                    notifications.append(notification)
+                self.insert(Notification, notifications, 'notifications', start + size)
+        self.stdout.write(f'  notifications: {count:,} created')
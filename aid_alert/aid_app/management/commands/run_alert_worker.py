@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from aid_app.delivery import POOL_SIZE, drain_deliveries
+
+
+class Command(BaseCommand):
+    help = 'Push queued critical alerts out over the configured channels (email, SMS, ...)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Send what is due once and exit')
+        parser.add_argument('--interval', type=float, default=2.0, help='Seconds to sleep when nothing is due')
+        parser.add_argument('--workers', type=int, default=POOL_SIZE, help='Sends running at once')
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+
+        if options['once']:
+            sent, failed = drain_deliveries(pool_size=workers)
+            self.stdout.write(self.style.SUCCESS(f'Sent {sent} alerts, {failed} failed.'))
+            return
+
+        self.stdout.write(self.style.SUCCESS('Alert worker running, press Ctrl+C to stop.'))
+        try:
+            while True:
+                close_old_connections()
+                sent, failed = drain_deliveries(pool_size=workers)
+                if sent or failed:
+                    self.stdout.write(f'Sent {sent} alerts, {failed} failed.')
+                else:
+                    # Also the pace at which retries come due
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.SUCCESS('Alert worker stopped.'))
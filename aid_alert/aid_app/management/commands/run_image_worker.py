@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from aid_app.thumbnails import drain_jobs, queue_missing
+
+
+class Command(BaseCommand):
+    help = 'Make the resized WebP/JPEG renditions of queued product images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Process the queue once and exit')
+        parser.add_argument('--interval', type=float, default=2.0, help='Seconds to sleep when the queue is empty')
+        parser.add_argument('--queue-missing', action='store_true',
+                            help='First queue every product image that has no renditions yet')
+
+    def handle(self, *args, **options):
+        if options['queue_missing']:
+            self.stdout.write(f'Queued {queue_missing()} product images.')
+
+        if options['once']:
+            done, failed = drain_jobs()
+            self.stdout.write(self.style.SUCCESS(f'Processed {done} image jobs, {failed} failed.'))
+            return
+
+        self.stdout.write(self.style.SUCCESS('Image worker running, press Ctrl+C to stop.'))
+        try:
+            while True:
+                close_old_connections()
+                done, failed = drain_jobs()
+                if done or failed:
+                    self.stdout.write(f'Processed {done} image jobs, {failed} failed.')
+                else:
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.SUCCESS('Image worker stopped.'))
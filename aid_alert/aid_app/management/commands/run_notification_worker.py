@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from aid_app.notifications import drain_outbox, FANOUT_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued notification fan-outs from the outbox to every recipient'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Drain the outbox once and exit')
+        parser.add_argument('--interval', type=float, default=2.0, help='Seconds to sleep when the outbox is empty')
+        parser.add_argument('--batch-size', type=int, default=FANOUT_BATCH_SIZE, help='Notification rows per INSERT')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        if options['once']:
+            delivered, failed = drain_outbox(batch_size=batch_size)
+            self.stdout.write(self.style.SUCCESS(f'Delivered {delivered} outbox entries, {failed} failed.'))
+            return
+
+        self.stdout.write(self.style.SUCCESS('Notification worker running, press Ctrl+C to stop.'))
+        try:
+            while True:
+                close_old_connections()
+                delivered, failed = drain_outbox(batch_size=batch_size)
+                if delivered or failed:
+                    self.stdout.write(f'Delivered {delivered} outbox entries, {failed} failed.')
+                else:
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.SUCCESS('Notification worker stopped.'))
@@ -0,0 +1,33 @@
+# Generated by Django 6.0 on 2026-10-17 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aid_app', '0020_userprofile_allergies_userprofile_blood_type_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='incident',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='incident',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='responder',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='responder',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
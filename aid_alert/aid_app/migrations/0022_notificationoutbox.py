@@ -0,0 +1,37 @@
+# Generated by Django 6.0 on 2026-10-17 17:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aid_app', '0021_incident_latitude_incident_longitude_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('audience', models.CharField(choices=[('facility', 'Facility Managers'), ('staff', 'Administrators')], max_length=20)),
+                ('title', models.CharField(max_length=200)),
+                ('message', models.TextField()),
+                ('notification_type', models.CharField(choices=[('critical', 'Critical'), ('high', 'High Priority'), ('medium', 'Medium Priority'), ('low', 'Low Priority'), ('info', 'Information')], default='info', max_length=20)),
+                ('category', models.CharField(choices=[('incident', 'Incident'), ('system', 'System'), ('maintenance', 'Maintenance'), ('staff', 'Staff'), ('equipment', 'Equipment')], default='system', max_length=20)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('delivered_count', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('related_incident', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='notification_outbox', to='aid_app.incident')),
+            ],
+            options={
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='outbox_status_created_idx')],
+            },
+        ),
+    ]
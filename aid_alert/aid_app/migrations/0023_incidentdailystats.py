@@ -0,0 +1,64 @@
+# Generated by Django 6.0 on 2026-10-17 17:40
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_daily_stats(apps, schema_editor):
+    Incident = apps.get_model('aid_app', 'Incident')
+    IncidentDailyStats = apps.get_model('aid_app', 'IncidentDailyStats')
+
+    rows = {}
+    incidents = Incident.objects.order_by().values_list(
+        'incident_type', 'severity', 'status', 'created_at', 'resolved_at'
+    ).iterator(chunk_size=2000)
+    for incident_type, severity, status, created_at, resolved_at in incidents:
+        if created_at is None:
+            continue
+        key = (timezone.localdate(created_at), incident_type, severity)
+        stats = rows.get(key)
+        if stats is None:
+            stats = rows[key] = IncidentDailyStats(date=key[0], incident_type=incident_type, severity=severity)
+        stats.total += 1
+        if hasattr(stats, f'{status}_count'):
+            setattr(stats, f'{status}_count', getattr(stats, f'{status}_count') + 1)
+        if resolved_at:
+            stats.response_minutes_total += (resolved_at - created_at).total_seconds() / 60
+            stats.response_count += 1
+
+    IncidentDailyStats.objects.bulk_create(rows.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aid_app', '0022_notificationoutbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IncidentDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('incident_type', models.CharField(choices=[('medical', 'Medical Emergency'), ('fire', 'Fire Hazard'), ('accident', 'Accident'), ('crime', 'Crime/Security'), ('natural', 'Natural Disaster'), ('other', 'Other')], max_length=20)),
+                ('severity', models.CharField(choices=[('critical', 'Critical'), ('high', 'High'), ('medium', 'Medium'), ('low', 'Low')], max_length=20)),
+                ('total', models.IntegerField(default=0)),
+                ('open_count', models.IntegerField(default=0)),
+                ('en_route_count', models.IntegerField(default=0)),
+                ('on_scene_count', models.IntegerField(default=0)),
+                ('providing_aid_count', models.IntegerField(default=0)),
+                ('transporting_count', models.IntegerField(default=0)),
+                ('resolved_count', models.IntegerField(default=0)),
+                ('closed_count', models.IntegerField(default=0)),
+                ('in_progress_count', models.IntegerField(default=0)),
+                ('response_minutes_total', models.FloatField(default=0)),
+                ('response_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-date'],
+                'unique_together': {('date', 'incident_type', 'severity')},
+            },
+        ),
+        migrations.RunPython(backfill_daily_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 6.0 on 2026-10-17 18:25
+
+from django.db import migrations, models
+from django.db.models import Count, F, Q
+
+
+def count_low_stock_items(apps, schema_editor):
+    MedicalKit = apps.get_model('aid_app', 'MedicalKit')
+    kits = MedicalKit.objects.annotate(
+        low_count=Count('items', filter=Q(items__quantity__lte=F('items__min_quantity')))
+    ).filter(low_count__gt=0)
+    updated = []
+    for kit in kits:
+        kit.low_stock_items = kit.low_count
+        updated.append(kit)
+    MedicalKit.objects.bulk_update(updated, ['low_stock_items'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aid_app', '0023_incidentdailystats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='medicalkit',
+            name='low_stock_items',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_low_stock_items, migrations.RunPython.noop),
+    ]
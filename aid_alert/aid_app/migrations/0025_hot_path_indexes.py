@@ -0,0 +1,57 @@
+# Generated by Django 6.0 on 2026-10-17 19:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aid_app', '0024_medicalkit_low_stock_items'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='feedback',
+            index=models.Index(fields=['incident', '-created_at'], name='feedback_incident_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='incident',
+            index=models.Index(fields=['assigned_responder', 'status'], name='incident_responder_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='incident',
+            index=models.Index(fields=['user', '-created_at'], name='incident_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='incident',
+            index=models.Index(condition=models.Q(('assigned_responder__isnull', True), ('status', 'open')), fields=['-created_at'], name='incident_open_unassigned_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='incidentstatushistory',
+            index=models.Index(fields=['incident', 'status', 'timestamp'], name='inc_history_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='kititem',
+            index=models.Index(fields=['quantity', 'min_quantity'], name='kititem_stock_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='medicalkit',
+            index=models.Index(condition=models.Q(('low_stock_items__gt', 0)), fields=['low_stock_items'], name='kit_low_stock_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['recipient', '-created_at'], name='notif_recipient_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('is_read', False)), fields=['recipient'], name='notif_unread_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['product', 'status', 'created_at'], name='order_product_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['customer', '-created_at'], name='order_customer_created_idx'),
+        ),
+    ]
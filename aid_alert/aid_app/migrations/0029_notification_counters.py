@@ -0,0 +1,43 @@
+# Generated by Django 6.0 on 2026-10-17 23:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_unread_notifications(apps, schema_editor):
+    Notification = apps.get_model('aid_app', 'Notification')
+    NotificationCounter = apps.get_model('aid_app', 'NotificationCounter')
+    counts = Notification.objects.filter(is_read=False).order_by().values_list(
+        'recipient_id', 'notification_type'
+    ).annotate(n=Count('id'))
+    NotificationCounter.objects.bulk_create(
+        (NotificationCounter(user_id=user_id, notification_type=notification_type, unread_count=n)
+         for user_id, notification_type, n in counts.iterator()),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aid_app', '0028_keyset_pagination_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('notification_type', models.CharField(choices=[('critical', 'Critical'), ('high', 'High Priority'), ('medium', 'Medium Priority'), ('low', 'Low Priority'), ('info', 'Information')], max_length=20)),
+                ('unread_count', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notification_counters', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'notification_type')},
+            },
+        ),
+        migrations.RunPython(count_unread_notifications, migrations.RunPython.noop),
+    ]
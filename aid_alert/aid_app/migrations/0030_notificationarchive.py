@@ -0,0 +1,35 @@
+# Generated by Django 6.0 on 2026-10-18 00:15
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aid_app', '0029_notification_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('notification_id', models.BigIntegerField(unique=True)),
+                ('title', models.CharField(max_length=200)),
+                ('message', models.TextField()),
+                ('notification_type', models.CharField(choices=[('critical', 'Critical'), ('high', 'High Priority'), ('medium', 'Medium Priority'), ('low', 'Low Priority'), ('info', 'Information')], max_length=20)),
+                ('category', models.CharField(choices=[('incident', 'Incident'), ('system', 'System'), ('maintenance', 'Maintenance'), ('staff', 'Staff'), ('equipment', 'Equipment')], max_length=20)),
+                ('related_incident_id', models.BigIntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('recipient', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='archived_notifications', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['recipient', '-created_at'], name='notif_archive_recipient_idx')],
+            },
+        ),
+    ]
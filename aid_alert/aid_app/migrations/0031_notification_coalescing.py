@@ -0,0 +1,41 @@
+# Generated by Django 6.0 on 2026-10-18 00:50
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def copy_created_at(apps, schema_editor):
+    Notification = apps.get_model('aid_app', 'Notification')
+    Notification.objects.update(last_occurred_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aid_app', '0030_notificationarchive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='occurrences',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='last_occurred_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(copy_created_at, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='notificationoutbox',
+            name='coalesce_window',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='notificationarchive',
+            name='occurrences',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 6.0 on 2026-10-18 02:40
+
+import time
+
+from django.db import migrations, models
+
+
+def create_catalog_version(apps, schema_editor):
+    CacheVersion = apps.get_model('aid_app', 'CacheVersion')
+    # Clock-based like catalog.catalog_version, so no entry a shared cache still holds matches it
+    CacheVersion.objects.create(name='catalog', version=time.time_ns())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aid_app', '0033_drop_redundant_fk_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CacheVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('version', models.BigIntegerField()),
+            ],
+        ),
+        migrations.RunPython(create_catalog_version, migrations.RunPython.noop),
+    ]
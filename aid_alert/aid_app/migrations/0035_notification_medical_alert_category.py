@@ -0,0 +1,28 @@
+# Generated by Django 6.0 on 2026-10-18 03:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aid_app', '0034_cacheversion'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='notification',
+            name='category',
+            field=models.CharField(choices=[('incident', 'Incident'), ('medical_alert', 'Medical Alert'), ('system', 'System'), ('maintenance', 'Maintenance'), ('staff', 'Staff'), ('equipment', 'Equipment')], default='system', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='notificationarchive',
+            name='category',
+            field=models.CharField(choices=[('incident', 'Incident'), ('medical_alert', 'Medical Alert'), ('system', 'System'), ('maintenance', 'Maintenance'), ('staff', 'Staff'), ('equipment', 'Equipment')], max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='notificationoutbox',
+            name='category',
+            field=models.CharField(choices=[('incident', 'Incident'), ('medical_alert', 'Medical Alert'), ('system', 'System'), ('maintenance', 'Maintenance'), ('staff', 'Staff'), ('equipment', 'Equipment')], default='system', max_length=20),
+        ),
+    ]
@@ -1,11 +1,50 @@
 from django.db import models
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save, pre_save
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_save, pre_save, post_delete
 from django.dispatch import receiver
 from django.utils import timezone
 
 # Create your models here.
 
+class ChangeTrackingMixin:
+    """
+    Remembers the values of `tracked_fields` as they were loaded from (or last
+    saved to) the database, so pre_save/post_save signals can see what changed
+    without fetching the row again.
+    """
+    tracked_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_loaded_values()
+        return instance
+
+    def _remember_loaded_values(self, fields=None):
+        loaded = getattr(self, '_loaded_values', None) or {}
+        for name in self.tracked_fields:
+            # Deferred fields aren't in __dict__, their old value stays unknown
+            if (fields is None or name in fields) and name in self.__dict__:
+                loaded[name] = self.__dict__[name]
+        self._loaded_values = loaded
+
+    def loaded_values(self):
+        """The tracked fields as stored in the database, or None if they aren't all known."""
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None or len(loaded) != len(self.tracked_fields):
+            return None
+        return dict(loaded)
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._remember_loaded_values(kwargs.get('update_fields'))
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        self._remember_loaded_values(fields)
+
 class UserProfile(models.Model):
     ROLE_CHOICES = [
         ('user', 'User'),
@@ -42,7 +81,9 @@ class UserProfile(models.Model):
     def __str__(self):
         return f"{self.user.username} - {self.get_role_display()}"
 
-class Product(models.Model):
+class Product(ChangeTrackingMixin, models.Model):
+    tracked_fields = ('image',)
+
     CATEGORY_CHOICES = [
         ('medical_supplies', 'Medical Supplies'),
         ('emergency_equipment', 'Emergency Equipment'),
@@ -73,6 +114,8 @@ class Product(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock_quantity = models.PositiveIntegerField(default=1)
     image = models.ImageField(upload_to='products/', blank=True, null=True)
+    # SHA-256 of the image once its resized renditions exist (see thumbnails.py), blank until then
+    image_digest = models.CharField(max_length=64, blank=True, editable=False)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -82,6 +125,12 @@ class Product(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Marketplace pages: active products newest first, cut with a (created_at, id) cursor
+            models.Index(fields=['status', '-created_at', '-id'], name='product_catalog_idx'),
+            # Marketplace monitor: every product, keyset-paginated
+            models.Index(fields=['-created_at', '-id'], name='product_created_idx'),
+        ]
 
 class Facility(models.Model):
     STATUS_CHOICES = [
@@ -141,16 +190,35 @@ class MedicalKit(models.Model):
     location = models.CharField(max_length=200, blank=True)
     last_checked = models.DateTimeField(auto_now=True)
     expiry_date = models.DateField(blank=True, null=True)
+    # Items at or below their minimum quantity, kept current by the KitItem signals
+    low_stock_items = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
         return f"{self.kit_id} - {self.name}"
     
+    @classmethod
+    def refresh_low_stock(cls, kits=None):
+        """Recounts low_stock_items in one UPDATE (for the given kit pks, or every kit)."""
+        low_items = KitItem.objects.filter(
+            kit=models.OuterRef('pk'), quantity__lte=F('min_quantity')
+        ).order_by().values('kit').annotate(count=models.Count('pk')).values('count')
+        queryset = cls.objects.all() if kits is None else cls.objects.filter(pk__in=kits)
+        return queryset.update(
+            low_stock_items=Coalesce(models.Subquery(low_items), 0)
+        )
+
     class Meta:
         ordering = ['kit_id']
+        indexes = [
+            # Low-stock dashboard card only ever counts the kits that need attention
+            models.Index(fields=['low_stock_items'], condition=models.Q(low_stock_items__gt=0), name='kit_low_stock_idx'),
+        ]
+
+class Responder(ChangeTrackingMixin, models.Model):
+    tracked_fields = ('status',)
 
-class Responder(models.Model):
     STATUS_CHOICES = [
         ('available', 'Available'),
         ('on_duty', 'On Duty'),
@@ -165,6 +233,8 @@ class Responder(models.Model):
     certification = models.CharField(max_length=200, blank=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='available')
     current_location = models.CharField(max_length=200, blank=True)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
     rating = models.FloatField(default=0.0)
     handled_incidents = models.PositiveIntegerField(default=0)
     last_active = models.DateTimeField(auto_now=True)
@@ -177,7 +247,9 @@ class Responder(models.Model):
     class Meta:
         ordering = ['responder_id']
 
-class KitItem(models.Model):
+class KitItem(ChangeTrackingMixin, models.Model):
+    tracked_fields = ('kit_id', 'quantity', 'min_quantity')
+
     kit = models.ForeignKey(MedicalKit, on_delete=models.CASCADE, related_name='items')
     name = models.CharField(max_length=200)
     quantity = models.PositiveIntegerField(default=1)
@@ -196,8 +268,40 @@ class KitItem(models.Model):
     
     class Meta:
         ordering = ['name']
+        indexes = [
+            # Low/in-stock filters compare quantity with min_quantity, answered from the index alone
+            models.Index(fields=['quantity', 'min_quantity'], name='kititem_stock_idx'),
+        ]
+
+@receiver(pre_save, sender=KitItem)
+def store_previous_kit_item_stock(sender, instance, **kwargs):
+    instance._old_stock = None
+    if instance.pk:
+        old = instance.loaded_values()
+        if old is None:
+            old = KitItem.objects.filter(pk=instance.pk).values('kit_id', 'quantity', 'min_quantity').first()
+        if old:
+            instance._old_stock = (old['kit_id'], old['quantity'] <= old['min_quantity'])
+
+@receiver(post_save, sender=KitItem)
+def update_kit_low_stock_on_save(sender, instance, **kwargs):
+    old = getattr(instance, '_old_stock', None)
+    if old == (instance.kit_id, instance.is_low_stock):
+        return
+    # Only recount when the item crossed its minimum or moved to another kit
+    kits = {instance.kit_id}
+    if old:
+        kits.add(old[0])
+    MedicalKit.refresh_low_stock(kits)
+
+@receiver(post_delete, sender=KitItem)
+def update_kit_low_stock_on_delete(sender, instance, **kwargs):
+    if instance.is_low_stock:
+        MedicalKit.refresh_low_stock([instance.kit_id])
+
+class Incident(ChangeTrackingMixin, models.Model):
+    tracked_fields = ('incident_type', 'severity', 'status', 'created_at', 'resolved_at')
 
-class Incident(models.Model):
     INCIDENT_TYPE_CHOICES = [
         ('medical', 'Medical Emergency'),
         ('fire', 'Fire Hazard'),
@@ -224,11 +328,14 @@ class Incident(models.Model):
         ('closed', 'Closed'),
     ]
     
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='incidents')
-    assigned_responder = models.ForeignKey('Responder', on_delete=models.SET_NULL, null=True, blank=True, related_name='assigned_incidents')
+    # Both FKs are served by the composite indexes below
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='incidents', db_index=False)
+    assigned_responder = models.ForeignKey('Responder', on_delete=models.SET_NULL, null=True, blank=True, related_name='assigned_incidents', db_index=False)
     incident_type = models.CharField(max_length=20, choices=INCIDENT_TYPE_CHOICES)
     severity = models.CharField(max_length=20, choices=SEVERITY_CHOICES)
     location = models.TextField()
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
     description = models.TextField()
     contact_phone = models.CharField(max_length=20)
     people_involved = models.PositiveIntegerField(default=1)
@@ -247,6 +354,25 @@ class Incident(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Responder assignment lookups (active / completed incidents of one responder). Assigned
+            # rows only: the unassigned ones are the dispatch queue's, below
+            models.Index(
+                fields=['assigned_responder', 'status'],
+                condition=models.Q(assigned_responder__isnull=False),
+                name='incident_responder_status_idx',
+            ),
+            # "My incidents" lists, newest first
+            models.Index(fields=['user', '-created_at'], name='incident_user_created_idx'),
+            # Dispatch queue: open incidents nobody has claimed yet
+            models.Index(
+                fields=['-created_at'],
+                condition=models.Q(status='open', assigned_responder__isnull=True),
+                name='incident_open_unassigned_idx',
+            ),
+            # All-incident lists, keyset-paginated on (created_at, id)
+            models.Index(fields=['-created_at', '-id'], name='incident_created_idx'),
+        ]
 
 
 
@@ -260,8 +386,9 @@ class Order(models.Model):
         ('returned', 'Returned'),
     ]
     
-    customer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='customer_orders')
-    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='orders')
+    # Both FKs are served by the composite indexes below
+    customer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='customer_orders', db_index=False)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='orders', db_index=False)
     quantity = models.PositiveIntegerField(default=1)
     total_price = models.DecimalField(max_digits=10, decimal_places=2)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
@@ -286,6 +413,14 @@ class Order(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Seller reports: orders of the seller's products by status and period
+            models.Index(fields=['product', 'status', 'created_at'], name='order_product_status_idx'),
+            # Customer order history, newest first
+            models.Index(fields=['customer', '-created_at'], name='order_customer_created_idx'),
+            # Admin order list, keyset-paginated on (created_at, id)
+            models.Index(fields=['-created_at', '-id'], name='order_created_idx'),
+        ]
 
 class Feedback(models.Model):
     STATUS_CHOICES = [
@@ -296,7 +431,8 @@ class Feedback(models.Model):
     ]
     
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='feedback')
-    incident = models.ForeignKey('Incident', on_delete=models.SET_NULL, null=True, blank=True, related_name='feedback')
+    # Served by feedback_incident_created_idx
+    incident = models.ForeignKey('Incident', on_delete=models.SET_NULL, null=True, blank=True, related_name='feedback', db_index=False)
     rating = models.IntegerField()
     message = models.TextField()
     sentiment = models.CharField(max_length=20, blank=True) # positive, negative, neutral
@@ -312,6 +448,12 @@ class Feedback(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Feedback on a responder's incidents, newest first
+            models.Index(fields=['incident', '-created_at'], name='feedback_incident_created_idx'),
+            # Feedback analysis list, keyset-paginated on (created_at, id)
+            models.Index(fields=['-created_at', '-id'], name='feedback_created_idx'),
+        ]
 
 class SystemReport(models.Model):
     TYPE_CHOICES = [
@@ -382,6 +524,11 @@ class ResponderAvailabilityHistory(models.Model):
 @receiver(pre_save, sender=Responder)
 def store_previous_status(sender, instance, **kwargs):
     if instance.pk:
+        loaded = instance.loaded_values()
+        if loaded is not None:
+            # Loaded from the database, no need to fetch it again
+            instance._old_status = loaded['status']
+            return
         try:
             old_instance = Responder.objects.get(pk=instance.pk)
             instance._old_status = old_instance.status
@@ -422,17 +569,126 @@ class IncidentStatusHistory(models.Model):
 
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            # First 'on_scene' entry per incident (response-time subquery)
+            models.Index(fields=['incident', 'status', 'timestamp'], name='inc_history_status_idx'),
+        ]
 
     def __str__(self):
         return f"{self.incident.incident_id} - {self.status} at {self.timestamp}"
 
+class IncidentDailyStats(models.Model):
+    """
+    Incident counters per day (of creation), type and severity.
+    Kept current by the Incident signals so dashboards sum a few rollup rows
+    instead of scanning every incident. Rebuild with `manage.py backfill_incident_stats`.
+    """
+    date = models.DateField()
+    incident_type = models.CharField(max_length=20, choices=Incident.INCIDENT_TYPE_CHOICES)
+    severity = models.CharField(max_length=20, choices=Incident.SEVERITY_CHOICES)
+    total = models.IntegerField(default=0)
+    # One counter per Incident status
+    open_count = models.IntegerField(default=0)
+    en_route_count = models.IntegerField(default=0)
+    on_scene_count = models.IntegerField(default=0)
+    providing_aid_count = models.IntegerField(default=0)
+    transporting_count = models.IntegerField(default=0)
+    resolved_count = models.IntegerField(default=0)
+    closed_count = models.IntegerField(default=0)
+    # Legacy status, left on incidents assigned by older admin actions
+    in_progress_count = models.IntegerField(default=0)
+    # Minutes from report to resolution, over incidents that have resolved_at set
+    response_minutes_total = models.FloatField(default=0)
+    response_count = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['-date']
+        unique_together = ('date', 'incident_type', 'severity')
+
+    def __str__(self):
+        return f"{self.date} {self.incident_type}/{self.severity}: {self.total}"
+
+    COUNTER_FIELDS = [
+        'total', 'open_count', 'en_route_count', 'on_scene_count', 'providing_aid_count',
+        'transporting_count', 'resolved_count', 'closed_count', 'in_progress_count',
+        'response_minutes_total', 'response_count',
+    ]
+
+    @classmethod
+    def totals(cls, **filters):
+        """Sums every counter over the matching rows in one query (missing rows count as 0)."""
+        sums = cls.objects.filter(**filters).aggregate(
+            **{field: models.Sum(field, default=0) for field in cls.COUNTER_FIELDS}
+        )
+        sums['avg_response_minutes'] = (
+            sums['response_minutes_total'] / sums['response_count'] if sums['response_count'] else 0
+        )
+        return sums
+
+    @classmethod
+    def snapshot(cls, incident):
+        """What one incident contributes: (rollup key, status, response minutes or None)."""
+        if incident is None:
+            return None
+        return cls.snapshot_values(
+            incident_type=incident.incident_type,
+            severity=incident.severity,
+            status=incident.status,
+            created_at=incident.created_at,
+            resolved_at=incident.resolved_at,
+        )
+
+    @staticmethod
+    def snapshot_values(incident_type, severity, status, created_at, resolved_at):
+        if created_at is None:
+            return None
+        key = (timezone.localdate(created_at), incident_type, severity)
+        minutes = None
+        if resolved_at:
+            minutes = (resolved_at - created_at).total_seconds() / 60
+        return key, status, minutes
+
+    @classmethod
+    def apply_change(cls, old, new):
+        """Moves an incident's contribution from the `old` snapshot to the `new` one."""
+        if old == new:
+            return
+        deltas = {}
+        for snap, sign in ((old, -1), (new, 1)):
+            if snap is None:
+                continue
+            key, status, minutes = snap
+            row = deltas.setdefault(key, {})
+            row['total'] = row.get('total', 0) + sign
+            if f'{status}_count' in cls.COUNTER_FIELDS:
+                row[f'{status}_count'] = row.get(f'{status}_count', 0) + sign
+            if minutes is not None:
+                row['response_minutes_total'] = row.get('response_minutes_total', 0) + sign * minutes
+                row['response_count'] = row.get('response_count', 0) + sign
+
+        for (date, incident_type, severity), changes in deltas.items():
+            changes = {field: F(field) + amount for field, amount in changes.items() if amount}
+            if not changes:
+                continue
+            stats, _ = cls.objects.get_or_create(date=date, incident_type=incident_type, severity=severity)
+            # F() updates so concurrent saves never lose an increment
+            cls.objects.filter(pk=stats.pk).update(**changes)
+
 # Signals for Incident Status History
 @receiver(pre_save, sender=Incident)
 def store_previous_incident_status(sender, instance, **kwargs):
+    instance._old_stats = None
     if instance.pk:
+        loaded = instance.loaded_values()
+        if loaded is not None:
+            # Loaded from the database, no need to fetch it again
+            instance._old_status = loaded['status']
+            instance._old_stats = IncidentDailyStats.snapshot_values(**loaded)
+            return
         try:
             old_instance = Incident.objects.get(pk=instance.pk)
             instance._old_status = old_instance.status
+            instance._old_stats = IncidentDailyStats.snapshot(old_instance)
         except Incident.DoesNotExist:
             instance._old_status = None
     else:
@@ -486,7 +742,18 @@ def update_resolved_at(sender, instance, **kwargs):
         if instance.status in ['open', 'en_route', 'on_scene', 'providing_aid', 'transporting']:
              instance.resolved_at = None
 
-class Notification(models.Model):
+@receiver(post_save, sender=Incident)
+def update_incident_daily_stats(sender, instance, created, **kwargs):
+    IncidentDailyStats.apply_change(
+        getattr(instance, '_old_stats', None),
+        IncidentDailyStats.snapshot(instance)
+    )
+
+@receiver(post_delete, sender=Incident)
+def remove_incident_daily_stats(sender, instance, **kwargs):
+    IncidentDailyStats.apply_change(IncidentDailyStats.snapshot(instance), None)
+
+class Notification(ChangeTrackingMixin, models.Model):
     TYPE_CHOICES = [
         ('critical', 'Critical'),
         ('high', 'High Priority'),
@@ -497,6 +764,9 @@ class Notification(models.Model):
     
     CATEGORY_CHOICES = [
         ('incident', 'Incident'),
+        # Responder escalations; their own category, so repeats coalesce with
+        # each other and never into the incident's other notifications
+        ('medical_alert', 'Medical Alert'),
         ('system', 'System'),
         ('maintenance', 'Maintenance'),
         ('staff', 'Staff'),
@@ -511,31 +781,257 @@ class Notification(models.Model):
     related_incident = models.ForeignKey(Incident, on_delete=models.SET_NULL, null=True, blank=True, related_name='generated_notifications')
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Repeats of the same incident alert inside the coalescing window bump these
+    # instead of adding rows (see notifications.coalesce)
+    occurrences = models.PositiveIntegerField(default=1)
+    last_occurred_at = models.DateTimeField(default=timezone.now)
+
+    # What the unread counters need to see changing
+    tracked_fields = ('recipient_id', 'notification_type', 'is_read')
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Notification list of one user, newest first
+            models.Index(fields=['recipient', '-created_at'], name='notif_recipient_created_idx'),
+            # Unread badge and mark-all-read (is_read=False is written as NOT is_read, so a partial index)
+            models.Index(fields=['recipient'], condition=models.Q(is_read=False), name='notif_unread_idx'),
+        ]
 
     def __str__(self):
         return f"{self.notification_type.upper()}: {self.title}"
 
+class NotificationArchive(models.Model):
+    """
+    A read notification moved out of the Notification table by
+    `manage.py archive_notifications`. Keeps the content but none of the
+    live table's indexes, so old history stops slowing the inbox queries.
+    """
+    # pk of the Notification this was
+    notification_id = models.BigIntegerField(unique=True)
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_notifications', db_index=False)
+    title = models.CharField(max_length=200)
+    message = models.TextField()
+    notification_type = models.CharField(max_length=20, choices=Notification.TYPE_CHOICES)
+    category = models.CharField(max_length=20, choices=Notification.CATEGORY_CHOICES)
+    # Plain id: archived rows don't hold incidents in place
+    related_incident_id = models.BigIntegerField(null=True, blank=True)
+    occurrences = models.PositiveIntegerField(default=1)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # Archived history of one user, newest first
+            models.Index(fields=['recipient', '-created_at'], name='notif_archive_recipient_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.notification_type.upper()}: {self.title} (archived)"
+
+class NotificationCounter(models.Model):
+    """
+    Unread notifications per user and notification type.
+    Kept current by the Notification signals, bulk_create_notifications and the
+    mark-read helpers in notifications.py, so the unread badge reads a few
+    counter rows instead of counting the user's whole history.
+    Rebuild with `manage.py backfill_notification_counters`.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notification_counters')
+    notification_type = models.CharField(max_length=20, choices=Notification.TYPE_CHOICES)
+    unread_count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('user', 'notification_type')
+
+    def __str__(self):
+        return f"{self.user_id} {self.notification_type}: {self.unread_count}"
+
+    @staticmethod
+    def snapshot(notification):
+        """The counter an unread notification adds to, or None for a read one."""
+        if notification is None or notification.is_read:
+            return None
+        return notification.recipient_id, notification.notification_type
+
+    @classmethod
+    def apply_deltas(cls, deltas):
+        """
+        Adds {(user_id, notification_type): amount} to the counters: one
+        INSERT for the missing rows and one UPDATE per (type, amount) group,
+        however many users a bulk fan-out reaches.
+        """
+        groups = {}
+        for (user_id, notification_type), amount in deltas.items():
+            if amount:
+                groups.setdefault((notification_type, amount), []).append(user_id)
+        for (notification_type, amount), user_ids in groups.items():
+            cls.objects.bulk_create(
+                [cls(user_id=user_id, notification_type=notification_type) for user_id in user_ids],
+                ignore_conflicts=True,
+            )
+            # F() updates so concurrent writers never lose an increment
+            cls.objects.filter(user_id__in=user_ids, notification_type=notification_type).update(
+                unread_count=F('unread_count') + amount
+            )
+
+    @classmethod
+    def apply_change(cls, old, new):
+        """Moves a notification's contribution from the `old` snapshot to the `new` one."""
+        if old == new:
+            return
+        deltas = {}
+        for snap, sign in ((old, -1), (new, 1)):
+            if snap is not None:
+                deltas[snap] = deltas.get(snap, 0) + sign
+        cls.apply_deltas(deltas)
+
+    @classmethod
+    def unread_counts(cls, user):
+        """{notification_type: unread count} for one user plus a 'total', in one query."""
+        counts = {value: 0 for value, _ in Notification.TYPE_CHOICES}
+        counts.update(cls.objects.filter(user=user).values_list('notification_type', 'unread_count'))
+        counts['total'] = sum(counts.values())
+        return counts
+
+class NotificationOutbox(models.Model):
+    """One pending fan-out: a notification to be copied to every user in an audience."""
+    AUDIENCE_CHOICES = [
+        ('facility', 'Facility Managers'),
+        ('staff', 'Administrators'),
+    ]
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    audience = models.CharField(max_length=20, choices=AUDIENCE_CHOICES)
+    title = models.CharField(max_length=200)
+    message = models.TextField()
+    notification_type = models.CharField(max_length=20, choices=Notification.TYPE_CHOICES, default='info')
+    category = models.CharField(max_length=20, choices=Notification.CATEGORY_CHOICES, default='system')
+    related_incident = models.ForeignKey(Incident, on_delete=models.SET_NULL, null=True, blank=True, related_name='notification_outbox')
+    # Seconds within which a repeat folds into the recipient's earlier notification; 0 always adds one
+    coalesce_window = models.PositiveIntegerField(default=0)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    delivered_count = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='outbox_status_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_audience_display()}: {self.title} ({self.status})"
+
+class AlertDelivery(models.Model):
+    """One notification to push out over one channel (email, SMS, ...), see delivery.py."""
+    STATUS_CHOICES = NotificationOutbox.STATUS_CHOICES
+
+    notification = models.ForeignKey(Notification, on_delete=models.CASCADE, related_name='deliveries')
+    # Key of the channel in ALERT_DELIVERY_CHANNELS
+    channel = models.CharField(max_length=20)
+    # Email address, phone number, ... resolved when the delivery is queued
+    destination = models.CharField(max_length=255)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    # Retries wait here with exponential backoff
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        unique_together = ('notification', 'channel')
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='delivery_status_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.channel} to {self.destination} ({self.status})"
+
+class ProductImageJob(models.Model):
+    """One product image waiting for its resized renditions."""
+    STATUS_CHOICES = NotificationOutbox.STATUS_CHOICES
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='image_jobs')
+    # The upload the job was queued for; a newer upload makes the job moot
+    image_name = models.CharField(max_length=255)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='imagejob_status_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.image_name} ({self.status})"
+
+class CacheVersion(models.Model):
+    """
+    Version stamp of a family of cache entries, e.g. the catalog pages.
+    Kept in the database so that moving it on reaches every worker process,
+    whatever cache backend (per process or shared) holds the entries.
+    """
+    name = models.CharField(max_length=50, unique=True)
+    version = models.BigIntegerField()
+
+    def __str__(self):
+        return f"{self.name}: {self.version}"
+
 # Signals for Notifications
+@receiver(pre_save, sender=Notification)
+def store_previous_notification_counter(sender, instance, **kwargs):
+    instance._old_counter = None
+    if instance.pk and not instance._state.adding:
+        loaded = instance.loaded_values()
+        if loaded is not None:
+            instance._old_counter = None if loaded['is_read'] else (loaded['recipient_id'], loaded['notification_type'])
+            return
+        old_instance = Notification.objects.filter(pk=instance.pk).only('recipient', 'notification_type', 'is_read').first()
+        instance._old_counter = NotificationCounter.snapshot(old_instance)
+
+@receiver(post_save, sender=Notification)
+def update_notification_counter(sender, instance, **kwargs):
+    NotificationCounter.apply_change(getattr(instance, '_old_counter', None), NotificationCounter.snapshot(instance))
+
+@receiver(post_delete, sender=Notification)
+def remove_notification_counter(sender, instance, **kwargs):
+    NotificationCounter.apply_change(NotificationCounter.snapshot(instance), None)
+
 @receiver(post_save, sender=Incident)
 def create_incident_notification(sender, instance, created, **kwargs):
     if created:
         # Notify Facility Managers for Critical/High incidents
         if instance.severity in ['critical', 'high']:
-            # Find facility managers
-            facility_profiles = UserProfile.objects.filter(role='facility') 
-            
-            for profile in facility_profiles:
-                Notification.objects.create(
-                    recipient=profile.user,
-                    title=f"New {instance.get_severity_display()} Incident",
-                    message=f"Type: {instance.get_incident_type_display()}. Location: {instance.location}",
-                    notification_type=instance.severity,
-                    category='incident',
-                    related_incident=instance
-                )
+            # Queued for the outbox worker so reporting stays fast however many managers exist
+            from .notifications import fan_out
+            fan_out(
+                'facility',
+                title=f"New {instance.get_severity_display()} Incident",
+                message=f"Type: {instance.get_incident_type_display()}. Location: {instance.location}",
+                notification_type=instance.severity,
+                category='incident',
+                related_incident=instance
+            )
 
 class FirstAidGuide(models.Model):
     URGENCY_CHOICES = [
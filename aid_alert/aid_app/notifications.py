@@ -0,0 +1,306 @@
+"""
+Batched notification fan-out.
+
+Alerts that go to a whole audience (every facility manager, every admin) are
+not written recipient by recipient inside the request. The request stores one
+NotificationOutbox row in its own transaction and returns; the outbox is then
+drained by the notification worker (`manage.py run_notification_worker`),
+which copies the entry to every recipient with chunked bulk_create.
+
+With NOTIFICATION_OUTBOX_IN_PROCESS enabled (the default) each process also
+runs a small background thread that drains the outbox right after commit, so
+a development server delivers alerts without a separate worker.
+
+bulk_create() skips the Notification signals, so bulk writes and mark-read
+go through the helpers here, which keep the NotificationCounter unread counts
+in step in the same transaction, and queue the alert deliveries (delivery.py).
+
+Alerts raised again and again for one incident (a responder pressing the
+alert button repeatedly) are coalesced: fan_out(..., coalesce=True) makes
+delivery fold a repeat into the recipient's notification for the same
+(incident, category) from within COALESCE_WINDOW, bumping its occurrences
+and marking it unread again, instead of adding another row.
+
+Read notifications don't stay in the table for ever: archive_batch() moves
+old ones to NotificationArchive (run `manage.py archive_notifications` daily).
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .delivery import DELIVERY_TYPES, queue_deliveries
+from .models import AlertDelivery, Notification, NotificationArchive, NotificationCounter, NotificationOutbox
+from .workers import InProcessWorker
+
+# Notification rows per INSERT
+FANOUT_BATCH_SIZE = getattr(settings, 'NOTIFICATION_FANOUT_BATCH_SIZE', 500)
+# Give up on an outbox entry after this many failed deliveries
+OUTBOX_MAX_ATTEMPTS = getattr(settings, 'NOTIFICATION_OUTBOX_MAX_ATTEMPTS', 5)
+# An entry stuck in 'processing' this long (crashed worker) is picked up again
+OUTBOX_CLAIM_TIMEOUT = getattr(settings, 'NOTIFICATION_OUTBOX_CLAIM_TIMEOUT', 600)
+# Drain the outbox from a background thread of the web process
+OUTBOX_IN_PROCESS = getattr(settings, 'NOTIFICATION_OUTBOX_IN_PROCESS', True)
+# Repeats of an incident alert within this many seconds update the earlier notification
+COALESCE_WINDOW = getattr(settings, 'NOTIFICATION_COALESCE_WINDOW', 600)
+# Read notifications older than this many days get archived
+RETENTION_DAYS = getattr(settings, 'NOTIFICATION_RETENTION_DAYS', 90)
+# Notifications moved per archive transaction; keeps each delete's locks short
+ARCHIVE_BATCH_SIZE = getattr(settings, 'NOTIFICATION_ARCHIVE_BATCH_SIZE', 1000)
+
+ARCHIVE_FIELDS = (
+    'id', 'recipient_id', 'title', 'message', 'notification_type', 'category', 'related_incident_id', 'occurrences',
+    'created_at',
+)
+
+
+def audience_recipients(audience):
+    """Queryset of User ids an outbox audience expands to."""
+    if audience == 'facility':
+        # Facility users carry either role name, see the facility views
+        return User.objects.filter(
+            is_active=True, profile__role__in=['facility', 'facility_manager']
+        ).values_list('id', flat=True)
+    if audience == 'staff':
+        return User.objects.filter(is_active=True, is_staff=True).values_list('id', flat=True)
+    raise ValueError(f'Unknown notification audience: {audience}')
+
+
+def fan_out(audience, *, title, message, notification_type='info', category='system', related_incident=None,
+            coalesce=False):
+    """
+    Queues a notification for everyone in the audience. One INSERT, whatever
+    the audience size. With `coalesce` (and an incident), repeats within
+    COALESCE_WINDOW update the recipients' earlier notification instead.
+    """
+    entry = NotificationOutbox.objects.create(
+        audience=audience,
+        title=title,
+        message=message,
+        notification_type=notification_type,
+        category=category,
+        related_incident=related_incident,
+        coalesce_window=COALESCE_WINDOW if coalesce and related_incident is not None else 0,
+    )
+    transaction.on_commit(wake_worker)
+    return entry
+
+
+def _write_batch(batch, deliver):
+    with transaction.atomic():
+        Notification.objects.bulk_create(batch)
+        NotificationCounter.apply_deltas(Counter(
+            NotificationCounter.snapshot(notification) for notification in batch if not notification.is_read
+        ))
+        # Critical alerts also go out by email/SMS (the signal that would queue them doesn't fire here)
+        if deliver:
+            queue_deliveries(batch)
+
+
+def bulk_create_notifications(notifications, batch_size=FANOUT_BATCH_SIZE, deliver=True):
+    """
+    Writes an iterable of unsaved Notification objects in chunks and adds
+    them to the unread counters, returns how many were written. With
+    `deliver` off (backfills of past alerts) nothing is sent by email/SMS.
+    """
+    written = 0
+    batch = []
+    for notification in notifications:
+        batch.append(notification)
+        if len(batch) >= batch_size:
+            _write_batch(batch, deliver)
+            written += len(batch)
+            batch = []
+    if batch:
+        _write_batch(batch, deliver)
+        written += len(batch)
+    return written
+
+
+def mark_read(notification):
+    """Marks one notification read. Returns False if it already was (so it is only counted down once)."""
+    with transaction.atomic():
+        if not Notification.objects.filter(pk=notification.pk, is_read=False).update(is_read=True):
+            return False
+        NotificationCounter.apply_deltas({(notification.recipient_id, notification.notification_type): -1})
+    notification.is_read = True
+    return True
+
+
+def mark_all_read(user):
+    """Marks every unread notification of `user` read and zeroes the user's counters. Returns how many."""
+    with transaction.atomic():
+        # Lock the counters first: a notification created meanwhile waits for
+        # its increment until this commits, so zeroing never swallows it
+        list(NotificationCounter.objects.select_for_update().filter(user=user).values_list('pk'))
+        updated = Notification.objects.filter(recipient=user, is_read=False).update(is_read=True)
+        NotificationCounter.objects.filter(user=user).update(unread_count=0)
+    return updated
+
+
+def coalesce(entry, recipient_ids):
+    """
+    Folds an outbox entry into the recipients' latest notification for the
+    same (incident, category) raised within the entry's coalesce window: one
+    UPDATE bumps occurrences and last_occurred_at, refreshes the text and
+    marks it unread again, queueing the email/SMS deliveries for the ones the
+    repeat escalates to a delivered type. Returns the ids of the recipients it
+    reached.
+    """
+    since = entry.created_at - timedelta(seconds=entry.coalesce_window)
+    candidates = Notification.objects.select_for_update().filter(
+        related_incident_id=entry.related_incident_id,
+        category=entry.category,
+        last_occurred_at__gte=since,
+        recipient_id__in=recipient_ids,
+    ).order_by('recipient_id', '-last_occurred_at', '-pk').values_list('pk', 'recipient_id', 'notification_type', 'is_read')
+
+    latest = {}
+    for pk, recipient_id, notification_type, is_read in candidates:
+        latest.setdefault(recipient_id, (pk, notification_type, is_read))
+    if not latest:
+        return set()
+
+    # update() skips the signals, so move the unread counts here
+    deltas = Counter()
+    for recipient_id, (pk, notification_type, is_read) in latest.items():
+        if not is_read:
+            deltas[(recipient_id, notification_type)] -= 1
+        deltas[(recipient_id, entry.notification_type)] += 1
+    Notification.objects.filter(pk__in=[pk for pk, _, _ in latest.values()]).update(
+        title=entry.title,
+        message=entry.message,
+        notification_type=entry.notification_type,
+        is_read=False,
+        occurrences=F('occurrences') + 1,
+        last_occurred_at=entry.created_at,
+    )
+    NotificationCounter.apply_deltas(deltas)
+    # A repeat that turns the notification critical goes out like a new critical alert
+    escalated = [pk for pk, notification_type, _ in latest.values() if notification_type not in DELIVERY_TYPES]
+    if entry.notification_type in DELIVERY_TYPES and escalated:
+        queue_deliveries(Notification.objects.filter(pk__in=escalated))
+    return set(latest)
+
+
+def deliver(entry, batch_size=FANOUT_BATCH_SIZE):
+    """
+    Copies one outbox entry to all of its recipients (coalescing it first
+    if the entry asks for it). All or nothing, so a retry never duplicates.
+    """
+    with transaction.atomic():
+        reached = set()
+        if entry.coalesce_window and entry.related_incident_id:
+            reached = coalesce(entry, audience_recipients(entry.audience))
+        recipient_ids = audience_recipients(entry.audience).iterator(chunk_size=batch_size)
+        notifications = (
+            Notification(
+                recipient_id=user_id,
+                title=entry.title,
+                message=entry.message,
+                notification_type=entry.notification_type,
+                category=entry.category,
+                related_incident_id=entry.related_incident_id,
+                last_occurred_at=entry.created_at,
+            )
+            for user_id in recipient_ids
+            if user_id not in reached
+        )
+        return len(reached) + bulk_create_notifications(notifications, batch_size)
+
+
+def claim_next_entry():
+    """Takes the oldest pending entry with a conditional UPDATE, so parallel workers never share one."""
+    stale = timezone.now() - timedelta(seconds=OUTBOX_CLAIM_TIMEOUT)
+    candidates = NotificationOutbox.objects.filter(
+        Q(status='pending') | Q(status='processing', claimed_at__lt=stale)
+    ).values_list('pk', 'status')[:10]
+
+    for pk, status in candidates:
+        claimed = NotificationOutbox.objects.filter(pk=pk, status=status).update(
+            status='processing', claimed_at=timezone.now(), attempts=F('attempts') + 1
+        )
+        if claimed:
+            return NotificationOutbox.objects.get(pk=pk)
+    return None
+
+
+def process_entry(entry, batch_size=FANOUT_BATCH_SIZE):
+    """
+    Delivers a claimed entry and records the outcome in the same transaction,
+    provided the claim is still this worker's: if the entry went stale and
+    another worker took it over, this delivery is rolled back and theirs
+    counts. Returns True (delivered), False (failed) or None (claim lost).
+    """
+    claim = NotificationOutbox.objects.filter(pk=entry.pk, status='processing', claimed_at=entry.claimed_at)
+    try:
+        with transaction.atomic():
+            count = deliver(entry, batch_size)
+            if not claim.update(status='done', delivered_count=count, processed_at=timezone.now(), last_error=''):
+                transaction.set_rollback(True)
+                return None
+    except Exception as e:
+        status = 'failed' if entry.attempts >= OUTBOX_MAX_ATTEMPTS else 'pending'
+        return False if claim.update(status=status, last_error=str(e)) else None
+    return True
+
+
+def drain_outbox(limit=None, batch_size=FANOUT_BATCH_SIZE):
+    """Delivers pending entries until the outbox is empty (or `limit` entries). Returns (delivered, failed)."""
+    delivered = failed = 0
+    while limit is None or delivered + failed < limit:
+        entry = claim_next_entry()
+        if entry is None:
+            break
+        outcome = process_entry(entry, batch_size)
+        if outcome:
+            delivered += 1
+        elif outcome is False:
+            failed += 1
+    return delivered, failed
+
+
+_in_process_worker = InProcessWorker('notification-outbox', drain_outbox)
+
+
+def wake_worker():
+    if OUTBOX_IN_PROCESS:
+        _in_process_worker.wake()
+
+
+def archive_to_table(rows):
+    NotificationArchive.objects.bulk_create(
+        [NotificationArchive(notification_id=row['id'], **{k: v for k, v in row.items() if k != 'id'}) for row in rows],
+        # A batch written before a failed delete is simply skipped the second time
+        ignore_conflicts=True,
+    )
+
+
+def archive_batch(cutoff, after=0, batch_size=ARCHIVE_BATCH_SIZE, write=archive_to_table):
+    """
+    Moves the next `batch_size` read notifications created before `cutoff`
+    (in pk order, past pk `after`): hands them to `write` as dicts of
+    ARCHIVE_FIELDS, then deletes them, in one short transaction.
+    Returns (how many, last pk) so the caller can continue from there.
+    """
+    with transaction.atomic():
+        rows = list(
+            Notification.objects.filter(is_read=True, created_at__lt=cutoff, pk__gt=after)
+            # Rows a request is marking right now are left for the next run
+            .select_for_update(skip_locked=True)
+            .order_by('pk').values(*ARCHIVE_FIELDS)[:batch_size]
+        )
+        if not rows:
+            return 0, after
+        write(rows)
+        ids = [row['id'] for row in rows]
+        # The raw delete below doesn't cascade: their (finished or now moot) deliveries go first
+        AlertDelivery.objects.filter(notification_id__in=ids).delete()
+        # Read notifications aren't in the unread counters, so skip the per-row delete signals
+        archived = Notification.objects.filter(pk__in=ids)
+        archived._raw_delete(archived.db)
+    return len(rows), rows[-1]['id']
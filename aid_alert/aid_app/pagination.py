@@ -0,0 +1,176 @@
+"""
+Keyset (seek) pagination.
+
+Long lists (all incidents, all orders, feedback, ...) are shown a page at a
+time, newest first, ordered by (created_at, id). A page is fetched with
+"WHERE (created_at, id) < (last row's values) ORDER BY ... LIMIT n+1" instead of
+an OFFSET, so the database seeks straight to the page through the created_at
+index: page 1000 costs the same as page 1, and rows added meanwhile don't
+shift the next page by one.
+
+Pages are addressed by opaque cursor tokens (the ?cursor= parameter) that
+carry the boundary row's key and a direction, so both "older" and "newer"
+links work. The tokens aren't signed: a forged one only seeks to another
+position in a list the user may already read.
+
+Views call paginate_request() and render the `page` it returns like a list
+(plus common/keyset_pager.html for the links), or with ?format=json return
+page.as_json(serializer).
+"""
+import base64
+import datetime
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+PAGE_SIZE = getattr(settings, 'KEYSET_PAGE_SIZE', 25)
+# Largest ?page_size= a client may ask for
+MAX_PAGE_SIZE = getattr(settings, 'KEYSET_MAX_PAGE_SIZE', 100)
+ORDERING = ('-created_at', '-id')
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class KeysetPage:
+    """One page of rows plus the cursors of the pages next to it. Iterates like a list."""
+
+    def __init__(self, object_list, next_cursor, previous_cursor, page_size):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.page_size = page_size
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def as_json(self, serialize):
+        return {
+            'results': [serialize(obj) for obj in self.object_list],
+            'next': self.next_cursor,
+            'previous': self.previous_cursor,
+            'page_size': self.page_size,
+        }
+
+
+def _key_fields(ordering):
+    names = [field.lstrip('-') for field in ordering]
+    descending = {field.startswith('-') for field in ordering}
+    if len(descending) != 1:
+        raise ValueError('Keyset ordering fields must all go the same direction.')
+    return names, descending.pop()
+
+
+def _row_key(row, names):
+    if isinstance(row, dict):
+        return [row[name] for name in names]
+    return [getattr(row, name) for name in names]
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """
+    Keeps datetimes to the microsecond: DjangoJSONEncoder cuts them to
+    milliseconds, and a boundary moved back even that much skips the rows
+    in between.
+    """
+
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(values, direction):
+    raw = json.dumps({'k': values, 'd': direction}, cls=CursorEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, model, names):
+    """The (key values, direction) of a cursor token, converted with the model's fields."""
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        values, direction = raw['k'], raw['d']
+        if direction not in ('next', 'prev') or len(values) != len(names):
+            raise ValueError(direction)
+        return [model._meta.get_field(name).to_python(value) for name, value in zip(names, values)], direction
+    except Exception as e:
+        raise InvalidCursor(cursor) from e
+
+
+def _seek(names, values, after):
+    """Rows strictly after (`after`) or before the key in lexicographic order: an OR of prefix matches."""
+    op = 'gt' if after else 'lt'
+    q = Q()
+    for i, name in enumerate(names):
+        q |= Q(**dict(zip(names[:i], values[:i])), **{f'{name}__{op}': values[i]})
+    # The bound on the first field alone lets the planner use a plain index range
+    return Q(**{f'{names[0]}__{op}e': values[0]}) & q
+
+
+def paginate(queryset, cursor=None, page_size=PAGE_SIZE, ordering=ORDERING):
+    """
+    The page of `queryset` after (or, for a 'previous' cursor, before) the
+    cursor, or the first page. Raises InvalidCursor for a malformed token.
+    Works for model querysets and .values() querysets alike.
+    """
+    names, descending = _key_fields(ordering)
+    reverse_ordering = [name if descending else f'-{name}' for name in names]
+
+    if not cursor:
+        rows = list(queryset.order_by(*ordering)[:page_size + 1])
+        more = len(rows) > page_size
+        rows = rows[:page_size]
+        next_cursor = encode_cursor(_row_key(rows[-1], names), 'next') if more else None
+        return KeysetPage(rows, next_cursor, None, page_size)
+
+    values, direction = decode_cursor(cursor, queryset.model, names)
+    if direction == 'next':
+        # Newest first means "next" rows have smaller keys
+        rows = list(queryset.filter(_seek(names, values, after=not descending)).order_by(*ordering)[:page_size + 1])
+        more = len(rows) > page_size
+        rows = rows[:page_size]
+        next_cursor = encode_cursor(_row_key(rows[-1], names), 'next') if more else None
+        previous_cursor = encode_cursor(_row_key(rows[0], names), 'prev') if rows else None
+    else:
+        rows = list(queryset.filter(_seek(names, values, after=descending)).order_by(*reverse_ordering)[:page_size + 1])
+        if not rows:
+            # Everything newer is gone: start over
+            return paginate(queryset, None, page_size, ordering)
+        more = len(rows) > page_size
+        rows = rows[:page_size][::-1]
+        previous_cursor = encode_cursor(_row_key(rows[0], names), 'prev') if more else None
+        next_cursor = encode_cursor(_row_key(rows[-1], names), 'next')
+    return KeysetPage(rows, next_cursor, previous_cursor, page_size)
+
+
+def paginate_request(request, queryset, page_size=PAGE_SIZE, ordering=ORDERING):
+    """paginate() with the cursor and page size from the query string; a bad cursor shows the first page."""
+    try:
+        page_size = max(1, min(int(request.GET.get('page_size', page_size)), MAX_PAGE_SIZE))
+    except ValueError:
+        pass
+    try:
+        return paginate(queryset, request.GET.get('cursor'), page_size, ordering)
+    except InvalidCursor:
+        return paginate(queryset, None, page_size, ordering)
+
+
+def wants_json(request):
+    return request.GET.get('format') == 'json'
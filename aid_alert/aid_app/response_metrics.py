@@ -0,0 +1,88 @@
+"""
+Response-time analytics computed in the database.
+
+Two durations are measured for an incident:
+
+* resolution time: resolved_at - created_at
+* on-scene time: first 'on_scene' status history entry - created_at
+
+Both are annotated onto any Incident queryset (the on-scene timestamp with one
+correlated subquery, not a status_history query per incident) and summarised
+as count, mean, median and p90 in minutes. Mean and count are one aggregate
+query; each percentile reads at most two ordered rows with OFFSET, which
+works the same on SQLite and PostgreSQL.
+"""
+import math
+
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import IncidentStatusHistory
+
+RESOLUTION = 'resolution_time'
+ON_SCENE = 'on_scene_time'
+# On-scene time where known, resolution time otherwise
+ARRIVAL = 'arrival_time'
+
+
+def with_response_times(incidents):
+    """Annotates resolution_time, on_scene_time and arrival_time (timedeltas, None when unknown)."""
+    first_on_scene = IncidentStatusHistory.objects.filter(
+        incident=OuterRef('pk'), status='on_scene'
+    ).order_by('timestamp').values('timestamp')[:1]
+
+    return incidents.annotate(
+        first_on_scene_at=Subquery(first_on_scene),
+    ).annotate(**{
+        RESOLUTION: ExpressionWrapper(F('resolved_at') - F('created_at'), output_field=DurationField()),
+        ON_SCENE: ExpressionWrapper(F('first_on_scene_at') - F('created_at'), output_field=DurationField()),
+    }).annotate(**{
+        ARRIVAL: Coalesce(F(ON_SCENE), F(RESOLUTION), output_field=DurationField()),
+    })
+
+
+def _minutes(duration):
+    return duration.total_seconds() / 60 if duration is not None else None
+
+
+def _percentile(values, count, fraction):
+    """Linear-interpolated percentile of an ordered values_list, reading only the one or two rows needed."""
+    position = fraction * (count - 1)
+    low = math.floor(position)
+    high = math.ceil(position)
+    rows = list(values[low:high + 1])
+    if len(rows) == 1:
+        return _minutes(rows[0])
+    return _minutes(rows[0]) + (_minutes(rows[1]) - _minutes(rows[0])) * (position - low)
+
+
+def duration_summary(incidents, field=RESOLUTION):
+    """{'count', 'mean', 'median', 'p90'} of one duration, in minutes (0 when there is no data)."""
+    measured = with_response_times(incidents).filter(**{f'{field}__isnull': False})
+    totals = measured.aggregate(count=Count(field), mean=Avg(field))
+    count = totals['count']
+    if not count:
+        return {'count': 0, 'mean': 0, 'median': 0, 'p90': 0}
+
+    values = measured.order_by(field).values_list(field, flat=True)
+    return {
+        'count': count,
+        'mean': _minutes(totals['mean']),
+        'median': _percentile(values, count, 0.5),
+        'p90': _percentile(values, count, 0.9),
+    }
+
+
+def response_time_summary(incidents):
+    """Summaries of resolution and on-scene times for the incidents."""
+    return {
+        'resolution': duration_summary(incidents, RESOLUTION),
+        'on_scene': duration_summary(incidents, ON_SCENE),
+    }
+
+
+def format_minutes(minutes):
+    """'1h 5m' / '42m' as shown on the responder pages."""
+    if minutes >= 60:
+        return f"{int(minutes // 60)}h {int(minutes % 60)}m"
+    return f"{int(minutes)}m"
@@ -0,0 +1,132 @@
+"""
+Request role resolution.
+
+ProfileBackend loads the session's user together with its UserProfile in one
+query (select_related), and RoleMiddleware caches the result on the request:
+
+* request.profile: the UserProfile, or None (anonymous, or no profile row)
+* request.role: the profile's role, or None
+
+Views gate on the role with the decorators below instead of repeating the
+try/except UserProfile.DoesNotExist block, and the user_profile context
+processor reuses request.profile instead of fetching it again.
+"""
+import functools
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.contrib import messages
+from django.contrib.auth import BACKEND_SESSION_KEY, get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.http import JsonResponse
+from django.shortcuts import redirect
+
+from .models import UserProfile
+
+UserModel = get_user_model()
+
+FACILITY_ROLES = ('facility', 'facility_manager')
+
+PROFILE_BACKEND = 'aid_app.roles.ProfileBackend'
+# Sessions created before ProfileBackend was configured still name this one
+LEGACY_BACKEND = 'django.contrib.auth.backends.ModelBackend'
+
+
+class ProfileBackend(ModelBackend):
+    """ModelBackend that fetches the session user with its profile joined in."""
+
+    def get_user(self, user_id):
+        try:
+            user = UserModel._default_manager.select_related('profile').get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
+
+
+def get_profile(user):
+    """The user's UserProfile, or None. Free when the user came from ProfileBackend."""
+    if not user.is_authenticated:
+        return None
+    try:
+        return user.profile
+    except UserProfile.DoesNotExist:
+        return None
+
+
+class RoleMiddleware:
+    """
+    Sets request.profile and request.role. Must come after
+    AuthenticationMiddleware. Under ASGI the lookup runs in a worker thread
+    before the rest of the chain is awaited.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        self.prepare(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        await sync_to_async(self.prepare)(request)
+        return await self.get_response(request)
+
+    @staticmethod
+    def prepare(request):
+        if request.session.get(BACKEND_SESSION_KEY) == LEGACY_BACKEND:
+            request.session[BACKEND_SESSION_KEY] = PROFILE_BACKEND
+        resolve_role(request)
+
+
+def resolve_role(request):
+    """Sets request.profile and request.role unless the middleware already did."""
+    if not hasattr(request, 'role'):
+        request.profile = get_profile(request.user)
+        request.role = request.profile.role if request.profile else None
+    return request.role
+
+
+def has_role(request, roles):
+    return resolve_role(request) in roles
+
+
+def role_required(*roles, message='Access denied.', login_message='Please login to access this page.',
+                  redirect_to='aid_app:dashboard'):
+    """
+    Lets a view through only for users whose profile has one of `roles`.
+    Anonymous users are sent to the login page with `login_message` (none if
+    it is None), everyone else to `redirect_to` with `message`.
+    """
+    def decorator(view_func):
+        @functools.wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if not request.user.is_authenticated:
+                if login_message:
+                    messages.error(request, login_message)
+                return redirect('aid_app:login')
+            if not has_role(request, roles):
+                messages.error(request, message)
+                return redirect(redirect_to)
+            return view_func(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def api_role_required(*roles, message='Permission denied.'):
+    """JSON counterpart of role_required: 401 for anonymous users, 403 for other roles."""
+    def decorator(view_func):
+        @functools.wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if not request.user.is_authenticated:
+                return JsonResponse({'success': False, 'error': 'Unauthorized'}, status=401)
+            if not has_role(request, roles):
+                return JsonResponse({'success': False, 'message': message}, status=403)
+            return view_func(request, *args, **kwargs)
+        return wrapper
+    return decorator
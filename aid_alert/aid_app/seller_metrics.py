@@ -0,0 +1,128 @@
+"""
+Seller sales metrics.
+
+The totals for the current and the previous period come from a single
+conditional-aggregation query over the seller's orders (SUM/COUNT ... FILTER
+per period), including the new/returning customer split. Top customers and
+top products are one grouped query each, with the names joined in, so
+building a report costs three queries whatever the order volume.
+"""
+from django.db.models import Count, Q, Sum
+
+from .models import Order
+
+
+def seller_orders(seller):
+    """Orders that count towards a seller's sales (cancelled ones don't)."""
+    return Order.objects.filter(product__seller=seller).exclude(status='cancelled')
+
+
+def _period_totals(seller, periods):
+    """One query: revenue, orders, customers and returning customers for each (start, end) period."""
+    orders = seller_orders(seller).filter(
+        created_at__gte=min(start for start, _ in periods),
+        created_at__lte=max(end for _, end in periods),
+    )
+
+    aggregates = {}
+    for i, (start, end) in enumerate(periods):
+        in_period = Q(created_at__range=(start, end))
+        # Returning: the customer already ordered from this seller before the period started
+        # (uncorrelated, so the database builds the customer set once, not per order row)
+        ordered_before = Q(customer_id__in=Order.objects.filter(
+            product__seller=seller, created_at__lt=start
+        ).values('customer_id'))
+        aggregates[f'revenue_{i}'] = Sum('total_price', filter=in_period, default=0)
+        aggregates[f'orders_{i}'] = Count('id', filter=in_period)
+        aggregates[f'customers_{i}'] = Count('customer_id', filter=in_period, distinct=True)
+        aggregates[f'returning_{i}'] = Count('customer_id', filter=in_period & ordered_before, distinct=True)
+
+    row = orders.aggregate(**aggregates)
+    return [
+        {
+            'revenue': row[f'revenue_{i}'] or 0,
+            'orders': row[f'orders_{i}'],
+            'customers': row[f'customers_{i}'],
+            'returning': row[f'returning_{i}'],
+        }
+        for i in range(len(periods))
+    ]
+
+
+def top_customers(seller, start_date, end_date, limit=3):
+    rows = (
+        seller_orders(seller).filter(created_at__range=(start_date, end_date))
+        .values('customer_id', 'customer__username', 'customer__first_name', 'customer__last_name')
+        .annotate(spent=Sum('total_price'))
+        .order_by('-spent')[:limit]
+    )
+    return [
+        {
+            'name': f"{row['customer__first_name']} {row['customer__last_name']}".strip() or row['customer__username'],
+            'total_spent': row['spent'],
+        }
+        for row in rows
+    ]
+
+
+def top_products(seller, start_date, end_date, limit=5):
+    rows = (
+        seller_orders(seller).filter(created_at__range=(start_date, end_date))
+        .values('product__name', 'product__id')
+        .annotate(units_sold=Sum('quantity'), revenue=Sum('total_price'))
+        .order_by('-revenue')[:limit]
+    )
+    return [
+        {
+            'name': row['product__name'],
+            'id': row['product__id'],
+            'units_sold': row['units_sold'],
+            'revenue': row['revenue'],
+            'growth': '+0%', # Placeholder as product-level growth comparison is complex
+            'trend': 'Stable'
+        }
+        for row in rows
+    ]
+
+
+def _segments(totals):
+    customers = totals['customers']
+    total_active_cust = customers if customers > 0 else 1
+    # Basic VIP def: top 10% of active customers
+    vip_count = max(1, int(customers * 0.1)) if customers > 0 else 0
+    return {
+        'new_customers_pct': ((customers - totals['returning']) / total_active_cust) * 100,
+        'returning_pct': (totals['returning'] / total_active_cust) * 100,
+        'vip_pct': (vip_count / total_active_cust) * 100
+    }
+
+
+def seller_metrics(seller, start_date, end_date, prev_start=None, prev_end=None):
+    """
+    Metrics for the period, plus the previous period's totals when a previous
+    range is given. Returns (current, previous); previous is None without a range.
+    """
+    periods = [(start_date, end_date)]
+    if prev_start is not None and prev_end is not None:
+        periods.append((prev_start, prev_end))
+    totals = _period_totals(seller, periods)
+
+    results = []
+    for (start, end), period in zip(periods, totals):
+        orders = period['orders']
+        results.append({
+            'revenue': period['revenue'],
+            'orders': orders,
+            'avg_order': period['revenue'] / orders if orders > 0 else 0,
+            'customers': period['customers'],
+            # Lazy queryset, only evaluated by the chart aggregation
+            'orders_qs': seller_orders(seller).filter(created_at__range=(start, end)),
+        })
+
+    current = results[0]
+    current['customer_segments'] = _segments(totals[0])
+    current['top_customers'] = top_customers(seller, start_date, end_date)
+    current['products'] = top_products(seller, start_date, end_date)
+
+    previous = results[1] if len(results) > 1 else None
+    return current, previous
@@ -0,0 +1,50 @@
+"""
+SQLite connection tuning.
+
+Every new SQLite connection gets the pragmas below (override any of them with
+the SQLITE_PRAGMAS setting; a value of None leaves SQLite's default).
+
+* journal_mode=WAL: readers no longer block the writer and the writer no
+  longer blocks readers, so dashboards keep loading while alerts are saved.
+  The mode is stored in the database file.
+* synchronous=NORMAL: safe with WAL (a power cut can lose the last commits,
+  never corrupt the file) and saves an fsync per commit.
+* busy_timeout: a writer waits this many milliseconds for the lock instead of
+  failing straight away with "database is locked".
+* mmap_size / cache_size: read pages through a memory map and keep a bigger
+  page cache (negative cache_size is in KiB).
+
+Other backends are left alone.
+"""
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+PRAGMAS = {**DEFAULT_PRAGMAS, **getattr(settings, 'SQLITE_PRAGMAS', {})}
+
+
+def apply_pragmas(connection, pragmas):
+    # On the driver's cursor: connection setup isn't one of the request's queries
+    # (it would count against the query budget of whichever request connected)
+    cursor = connection.connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            if value is not None:
+                cursor.execute(f'PRAGMA {name} = {value}')
+    finally:
+        cursor.close()
+
+
+@receiver(connection_created)
+def tune_sqlite_connection(sender, connection, **kwargs):
+    if connection.vendor == 'sqlite':
+        apply_pragmas(connection, PRAGMAS)
@@ -42,6 +42,8 @@ function handleAssign(event) {
     const form = event.target;
     const incidentId = form.dataset.incidentId;
     const responderId = document.getElementById('responderSelect').value;
+    // 'auto' lets the server pick the nearest available responder
+    const payload = responderId === 'auto' ? { auto: true } : { responder_id: responderId };
     const submitBtn = form.querySelector('button[type="submit"]');
 
     submitBtn.disabled = true;
@@ -53,7 +55,7 @@ function handleAssign(event) {
             'Content-Type': 'application/json',
             'X-CSRFToken': getCookie('csrftoken')
         },
-        body: JSON.stringify({ responder_id: responderId })
+        body: JSON.stringify(payload)
     })
         .then(response => response.json())
         .then(data => {
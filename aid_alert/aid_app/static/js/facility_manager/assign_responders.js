@@ -10,6 +10,8 @@ document.addEventListener('DOMContentLoaded', function () {
     const responderSelect = document.getElementById('responderSelect');
     const assignButtons = document.querySelectorAll('.btn-assign');
     const viewDetailsBtns = document.querySelectorAll('.view-details-btn');
+    const dispatchSection = document.getElementById('dispatchSection');
+    const dispatchButtons = document.querySelectorAll('.btn-dispatch');
 
     // --- Helper Functions ---
 
@@ -94,6 +96,37 @@ document.addEventListener('DOMContentLoaded', function () {
         });
     });
 
+    // Assign a suggested responder to the incident being dispatched (?incident=<id>)
+    dispatchButtons.forEach(btn => {
+        btn.addEventListener('click', function () {
+            dispatchButtons.forEach(b => b.disabled = true);
+
+            fetch(dispatchSection.dataset.assignUrl, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                    'X-CSRFToken': getCookie('csrftoken')
+                },
+                body: JSON.stringify({ responder_id: this.dataset.id })
+            })
+                .then(response => response.json())
+                .then(result => {
+                    if (result.success) {
+                        // Back to the page without the suggestions, the assignment now shows as active
+                        window.location.href = window.location.pathname;
+                    } else {
+                        alert('Error: ' + result.message);
+                        dispatchButtons.forEach(b => b.disabled = false);
+                    }
+                })
+                .catch(error => {
+                    console.error('Error:', error);
+                    alert('An error occurred. Please try again.');
+                    dispatchButtons.forEach(b => b.disabled = false);
+                });
+        });
+    });
+
     // Close Modal
     if (closeBtn) {
         closeBtn.addEventListener('click', closeModal);
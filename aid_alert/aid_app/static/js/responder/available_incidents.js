@@ -118,3 +118,73 @@ function filterTable() {
         row.style.display = show ? '' : 'none';
     });
 }
+
+// Live incident feed (Server-Sent Events) - keeps the table current without reloading
+function connectIncidentFeed() {
+    const tbody = document.getElementById('incident-rows');
+    if (!tbody || !window.EventSource) return;
+
+    const source = new EventSource(tbody.dataset.feedUrl);
+
+    source.addEventListener('incident.created', function (e) {
+        const incident = JSON.parse(e.data);
+        if (incident.status === 'open' && !incident.assigned_responder_id) {
+            addIncidentRow(tbody, incident);
+            showNotification(`New ${incident.severity_display} incident ${incident.incident_id}`);
+        }
+    });
+
+    source.addEventListener('incident.claimed', function (e) {
+        removeIncidentRow(tbody, JSON.parse(e.data).incident_id);
+    });
+
+    source.addEventListener('incident.status', function (e) {
+        const incident = JSON.parse(e.data);
+        if (incident.status !== 'open' || incident.assigned_responder_id) {
+            removeIncidentRow(tbody, incident.incident_id);
+        }
+    });
+}
+
+function addIncidentRow(tbody, incident) {
+    if (tbody.querySelector(`tr[data-incident-id="${incident.incident_id}"]`)) return;
+
+    const emptyRow = tbody.querySelector('.empty-row');
+    if (emptyRow) emptyRow.remove();
+
+    const row = document.createElement('tr');
+    row.dataset.incidentId = incident.incident_id;
+
+    const idCell = row.insertCell();
+    idCell.textContent = incident.incident_id;
+
+    const typeSpan = document.createElement('span');
+    typeSpan.className = `incident-type ${incident.incident_type}`;
+    typeSpan.textContent = incident.incident_type_display;
+    row.insertCell().appendChild(typeSpan);
+
+    row.insertCell().textContent = incident.location;
+
+    const badge = document.createElement('span');
+    const urgent = incident.severity === 'critical' || incident.severity === 'high';
+    badge.className = `badge ${urgent ? 'badge-inactive' : 'badge-active'}`;
+    badge.textContent = incident.severity_display;
+    row.insertCell().appendChild(badge);
+
+    row.insertCell().textContent = 'Just now';
+
+    const button = document.createElement('button');
+    button.className = 'btn-action';
+    button.textContent = 'Accept';
+    button.addEventListener('click', () => acceptIncident(incident.incident_id));
+    row.insertCell().appendChild(button);
+
+    tbody.insertBefore(row, tbody.firstChild);
+}
+
+function removeIncidentRow(tbody, incidentId) {
+    const row = tbody.querySelector(`tr[data-incident-id="${incidentId}"]`);
+    if (row) row.remove();
+}
+
+document.addEventListener('DOMContentLoaded', connectIncidentFeed);
@@ -116,6 +116,10 @@ document.addEventListener('DOMContentLoaded', () => {
                     const lat = position.coords.latitude;
                     const lon = position.coords.longitude;
 
+                    // Coordinates are used for nearest-responder dispatch
+                    document.getElementById('latitude').value = lat;
+                    document.getElementById('longitude').value = lon;
+
                     // Reverse geocoding
                     fetch(`https://nominatim.openstreetmap.org/reverse?format=json&lat=${lat}&lon=${lon}`)
                         .then(response => response.json())
@@ -0,0 +1,19 @@
+from django import template
+
+from aid_app.thumbnails import rendition_url
+
+register = template.Library()
+
+
+@register.simple_tag
+def product_image_url(product, width, fmt='webp'):
+    """
+    {% product_image_url product 320 %}: a resized copy of the product's image
+    at least 320px wide (pass 'jpeg' for the JPEG one), or the original until
+    the copies are made. Works for Product objects and catalog rows alike.
+    """
+    if isinstance(product, dict):
+        image, digest = product.get('image'), product.get('image_digest')
+    else:
+        image, digest = product.image, product.image_digest
+    return rendition_url(getattr(image, 'name', image), digest, int(width), fmt) or ''
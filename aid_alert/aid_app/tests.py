@@ -1,3 +1,930 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import json
+import socket
+import threading
+import time
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import Count, F, Q
+from django.test import AsyncClient, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import delivery
+from .catalog import catalog_page, invalidate_catalog
+from .dispatch import claim_incident, nearest_responders, responder_index
+from .instrumentation import QueryBudgetExceeded, assert_query_budget, request_metrics
+from .models import (
+    AlertDelivery, CacheVersion, Feedback, Incident, IncidentDailyStats, KitItem, MedicalKit, Notification,
+    NotificationArchive, NotificationCounter, NotificationOutbox, Order, Product, Responder, UserProfile,
+)
+from .notifications import (
+    OUTBOX_CLAIM_TIMEOUT, _write_batch, archive_batch, bulk_create_notifications, claim_next_entry, drain_outbox,
+    fan_out, mark_all_read, mark_read, process_entry,
+)
+from .pagination import paginate
+from .response_metrics import ARRIVAL, duration_summary
+from .seller_metrics import seller_metrics
+from .workers import InProcessWorker
+
+
+def make_user(username, role='user', **fields):
+    user = User.objects.create_user(username=username, password='pw', email=f'{username}@example.com', **fields)
+    UserProfile.objects.create(user=user, role=role)
+    return user
+
+
+class DispatchTests(TestCase):
+    def setUp(self):
+        # The index lives for the process, drop what earlier tests put in it
+        responder_index.clear()
+        self.addCleanup(responder_index.clear)
+        self.reporter = make_user('reporter')
+        self.incident = Incident.objects.create(
+            user=self.reporter, incident_type='medical', severity='medium', location='Fort',
+            description='Fainted', contact_phone='555-0100', latitude=6.9271, longitude=79.8612,
+        )
+
+    def add_responder(self, name, latitude=None, longitude=None, status='available'):
+        user = make_user(name, role='responder')
+        return Responder.objects.create(user=user, responder_id=name, phone='555-0101', status=status,
+                                        latitude=latitude, longitude=longitude)
+
+    def test_nearest_first(self):
+        self.add_responder('kandy', 7.2906, 80.6337)
+        self.add_responder('pettah', 6.9355, 79.8487)
+        self.add_responder('dehiwala', 6.8511, 79.8659)
+        self.add_responder('galle', 6.0535, 80.2210)
+
+        suggested = nearest_responders(self.incident, k=3)
+        self.assertEqual([responder.responder_id for responder in suggested], ['pettah', 'dehiwala', 'kandy'])
+        distances = [responder.distance_km for responder in suggested]
+        self.assertEqual(distances, sorted(distances))
+        self.assertLess(distances[0], 2)
+
+    def test_only_available_responders(self):
+        self.add_responder('on-duty', 6.9272, 79.8613, status='on_duty')
+        self.add_responder('no-location')
+        nearby = self.add_responder('nearby', 6.9300, 79.8600)
+        self.add_responder('further', 6.9500, 79.8700)
+        self.assertEqual([responder.responder_id for responder in nearest_responders(self.incident)],
+                         ['nearby', 'further'])
+
+        # Kept current by the save signal
+        nearby.status = 'unavailable'
+        nearby.save()
+        self.assertEqual([responder.responder_id for responder in nearest_responders(self.incident)], ['further'])
+
+        # Changed behind the index's back (another process): the database check drops it
+        Responder.objects.filter(responder_id='further').update(status='off_duty')
+        self.assertEqual(nearest_responders(self.incident), [])
+
+    def test_incident_without_coordinates(self):
+        self.add_responder('located', 6.9300, 79.8600)
+        self.add_responder('no-location')
+        self.add_responder('on-duty', status='on_duty')
+        Incident.objects.filter(pk=self.incident.pk).update(latitude=None, longitude=None)
+        self.incident.refresh_from_db()
+
+        suggested = nearest_responders(self.incident)
+        self.assertEqual(sorted(responder.responder_id for responder in suggested), ['located', 'no-location'])
+        self.assertEqual({responder.distance_km for responder in suggested}, {None})
+
+    def test_assign_suggested_responder(self):
+        responder = self.add_responder('nearby', 6.9300, 79.8600)
+        self.client.force_login(make_user('dispatcher', role='facility_manager'))
+
+        response = self.client.get('/facility-incident-log/')
+        self.assertContains(response, f'href="/assign-responders/?incident={self.incident.pk}"')
+        response = self.client.get('/assign-responders/', {'incident': self.incident.pk})
+        self.assertContains(response, f'data-assign-url="/admin-panel/assign-incident/{self.incident.pk}/"')
+        response = self.client.post(f'/admin-panel/assign-incident/{self.incident.pk}/',
+                                    {'responder_id': responder.pk}, content_type='application/json')
+        self.assertEqual(response.json()['success'], True)
+
+        # Assigned to the existing incident, not a new one
+        self.assertEqual(Incident.objects.count(), 1)
+        self.incident.refresh_from_db()
+        self.assertEqual((self.incident.assigned_responder, self.incident.status), (responder, 'en_route'))
+
+
+class IncidentFeedTests(TestCase):
+    def setUp(self):
+        self.responder = make_user('feed-responder', role='responder')
+
+    def report(self):
+        # The feed publishes on commit
+        with self.captureOnCommitCallbacks(execute=True):
+            return Incident.objects.create(user=self.responder, incident_type='fire', severity='medium',
+                                           location='Kitchen', description='Smoke', contact_phone='555-0100')
+
+    async def open_stream(self, last_event_id=None):
+        client = AsyncClient()
+        await client.aforce_login(self.responder)
+        headers = {} if last_event_id is None else {'Last-Event-ID': str(last_event_id)}
+        response = await client.get('/api/incidents/stream/', headers=headers)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b'retry: 3000\n\n')
+        return stream
+
+    async def next_event(self, stream):
+        chunk = await asyncio.wait_for(anext(stream), timeout=5)
+        fields = dict(line.split(': ', 1) for line in chunk.decode().strip().splitlines())
+        return int(fields['id']), fields['event'], json.loads(fields['data'])
+
+    async def test_published_incident_reaches_stream(self):
+        stream = await self.open_stream()
+        incident = await sync_to_async(self.report)()
+
+        event_id, event_type, payload = await self.next_event(stream)
+        self.assertEqual(event_type, 'incident.created')
+        self.assertEqual((payload['id'], payload['location']), (incident.pk, 'Kitchen'))
+
+        # A reconnecting client replays what came after its Last-Event-ID
+        replayed = await self.open_stream(last_event_id=event_id - 1)
+        self.assertEqual(await self.next_event(replayed), (event_id, event_type, payload))
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        self.managers = [make_user('first-manager', role='facility_manager'),
+                         make_user('second-manager', role='facility_manager')]
+        self.entry = fan_out('facility', title='Stock low', message='Gauze')
+
+    def assertDeliveredOnce(self):
+        self.entry.refresh_from_db()
+        self.assertEqual((self.entry.status, self.entry.delivered_count), ('done', 2))
+        for manager in self.managers:
+            self.assertEqual(Notification.objects.filter(recipient=manager).count(), 1)
+            self.assertEqual(NotificationCounter.unread_counts(manager)['total'], 1)
+
+    def test_retry_after_failure_writes_each_row_once(self):
+        calls = []
+
+        def fail_second_batch(batch, deliver):
+            calls.append(batch)
+            if len(calls) == 2:
+                raise RuntimeError('database is locked')
+            _write_batch(batch, deliver)
+
+        with mock.patch('aid_app.notifications._write_batch', side_effect=fail_second_batch):
+            self.assertEqual(drain_outbox(limit=1, batch_size=1), (0, 1))
+        # The first batch was rolled back with the failure, the entry waits for a retry
+        self.entry.refresh_from_db()
+        self.assertEqual((self.entry.status, self.entry.attempts, self.entry.last_error),
+                         ('pending', 1, 'database is locked'))
+        self.assertFalse(Notification.objects.exists())
+
+        self.assertEqual(drain_outbox(batch_size=1), (1, 0))
+        self.assertDeliveredOnce()
+        self.assertEqual(self.entry.attempts, 2)
+
+    def test_fails_after_max_attempts(self):
+        with mock.patch('aid_app.notifications.deliver', side_effect=RuntimeError('boom')), \
+                mock.patch('aid_app.notifications.OUTBOX_MAX_ATTEMPTS', 3):
+            self.assertEqual(drain_outbox(limit=2), (0, 2))
+            self.entry.refresh_from_db()
+            self.assertEqual((self.entry.status, self.entry.attempts), ('pending', 2))
+            self.assertEqual(drain_outbox(), (0, 1))
+
+        self.entry.refresh_from_db()
+        self.assertEqual((self.entry.status, self.entry.attempts, self.entry.last_error), ('failed', 3, 'boom'))
+        self.assertEqual(drain_outbox(), (0, 0))
+        self.assertFalse(Notification.objects.exists())
+
+    def test_stale_claim_taken_over_delivers_once(self):
+        for stalled_finishes_first in (False, True):
+            with self.subTest(stalled_finishes_first=stalled_finishes_first):
+                Notification.objects.all().delete()
+                NotificationOutbox.objects.all().delete()
+                self.entry = fan_out('facility', title='Stock low', message='Gauze')
+                stalled = claim_next_entry()
+                # The first worker hangs past the claim timeout, so a second one takes the entry over
+                NotificationOutbox.objects.filter(pk=stalled.pk).update(
+                    claimed_at=timezone.now() - timedelta(seconds=OUTBOX_CLAIM_TIMEOUT + 1)
+                )
+                takeover = claim_next_entry()
+                self.assertEqual((takeover.pk, takeover.attempts), (stalled.pk, 2))
+
+                if stalled_finishes_first:
+                    self.assertIsNone(process_entry(stalled))
+                    self.assertTrue(process_entry(takeover))
+                else:
+                    self.assertTrue(process_entry(takeover))
+                    self.assertIsNone(process_entry(stalled))
+                self.assertDeliveredOnce()
+
+
+class IncidentStatsTests(TestCase):
+    def setUp(self):
+        self.reporter = make_user('reporter')
+
+    def report(self, incident_type='medical', severity='medium'):
+        return Incident.objects.create(user=self.reporter, incident_type=incident_type, severity=severity,
+                                       location='Hall B', description='Fall', contact_phone='555-0100')
+
+    def assertMatchesIncidents(self, **filters):
+        """The rollup gives the same numbers as aggregating the incidents themselves."""
+        incidents = Incident.objects.filter(**filters)
+        counters = {'total': Count('id')}
+        for field in IncidentDailyStats.COUNTER_FIELDS:
+            if field.endswith('_count') and field != 'response_count':
+                counters[field] = Count('id', filter=Q(status=field.removesuffix('_count')))
+        expected = incidents.aggregate(**counters)
+        minutes = [(incident.resolved_at - incident.created_at).total_seconds() / 60
+                   for incident in incidents.filter(resolved_at__isnull=False)]
+        expected['response_count'] = len(minutes)
+
+        totals = IncidentDailyStats.totals(**filters)
+        self.assertAlmostEqual(totals.pop('response_minutes_total'), sum(minutes))
+        self.assertAlmostEqual(totals.pop('avg_response_minutes'), sum(minutes) / len(minutes) if minutes else 0)
+        self.assertEqual(totals, expected)
+
+    def test_rollup_follows_incident_changes(self):
+        cardiac = self.report(severity='critical')
+        fall = self.report()
+        fire = self.report(incident_type='fire', severity='high')
+        self.assertMatchesIncidents()
+
+        # Saved twice from the same instance
+        fall.status = 'on_scene'
+        fall.save()
+        fall.status = 'resolved'
+        fall.save()
+        self.assertMatchesIncidents()
+        self.assertMatchesIncidents(severity='medium')
+
+        # Claimed with a conditional UPDATE instead of save()
+        responder = Responder.objects.create(user=make_user('medic', role='responder'), responder_id='R-1',
+                                             phone='555-0101')
+        self.assertTrue(claim_incident(cardiac.pk, responder))
+        cardiac = Incident.objects.get(pk=cardiac.pk)
+        cardiac.status = 'resolved'
+        cardiac.save()
+        self.assertMatchesIncidents()
+
+        # Reclassified: moves to another rollup row
+        fire.severity = 'critical'
+        fire.save()
+        self.assertMatchesIncidents(severity='high')
+        self.assertMatchesIncidents(severity='critical')
+
+        # Reopened, then deleted
+        fall.status = 'open'
+        fall.save()
+        self.assertMatchesIncidents()
+        fall.delete()
+        Incident.objects.filter(pk=fire.pk).delete()
+        self.assertMatchesIncidents()
+        self.assertMatchesIncidents(incident_type='fire')
+        self.assertEqual(IncidentDailyStats.totals()['total'], 1)
+
+
+class RoleMiddlewareTests(TestCase):
+    """request.role / request.profile must be set under ASGI as well as WSGI."""
+
+    async def test_async_request_gets_role(self):
+        user = await User.objects.acreate(username='async-responder')
+        await UserProfile.objects.acreate(user=user, role='responder')
+        client = AsyncClient()
+        await client.aforce_login(user)
+        response = await client.get('/dashboard/')
+        self.assertRedirects(response, '/responder-dashboard/', fetch_redirect_response=False)
+
+    def test_sync_request_gets_role(self):
+        self.client.force_login(make_user('sync-responder', role='responder'))
+        response = self.client.get('/dashboard/')
+        self.assertRedirects(response, '/responder-dashboard/', fetch_redirect_response=False)
+
+
+class ArchiveTests(TestCase):
+    def test_archives_notification_with_deliveries(self):
+        user = make_user('archived')
+        notification = Notification.objects.create(recipient=user, title='Cardiac arrest', message='Hall B',
+                                                   notification_type='critical')
+        self.assertTrue(AlertDelivery.objects.filter(notification=notification).exists())
+        Notification.objects.filter(pk=notification.pk).update(is_read=True)
+
+        archived, last_pk = archive_batch(timezone.now() + timedelta(minutes=1))
+
+        self.assertEqual((archived, last_pk), (1, notification.pk))
+        self.assertFalse(Notification.objects.filter(pk=notification.pk).exists())
+        self.assertFalse(AlertDelivery.objects.filter(notification_id=notification.pk).exists())
+        self.assertTrue(NotificationArchive.objects.filter(notification_id=notification.pk).exists())
+
+
+class BackfillTests(TestCase):
+    def setUp(self):
+        self.manager = make_user('manager', role='facility_manager')
+        # bulk_create: no signal alerts, so every manager x incident pair is missing
+        self.incident, = Incident.objects.bulk_create([Incident(
+            user=self.manager, incident_type='medical', severity='critical', location='Hall B',
+            description='Collapsed', contact_phone='555-0100',
+        )])
+
+    def test_bulk_create_queues_deliveries(self):
+        bulk_create_notifications([Notification(recipient=self.manager, title='Cardiac arrest', message='Hall B',
+                                                notification_type='critical')])
+        self.assertEqual(AlertDelivery.objects.count(), 1)
+
+    def test_backfill_sends_nothing(self):
+        call_command('backfill_incident_notifications', stdout=StringIO())
+        self.assertTrue(Notification.objects.filter(recipient=self.manager, related_incident=self.incident).exists())
+        self.assertFalse(AlertDelivery.objects.exists())
+
+    def test_backfill_skips_archived(self):
+        call_command('backfill_incident_notifications', stdout=StringIO())
+        Notification.objects.update(is_read=True)
+        archive_batch(timezone.now() + timedelta(minutes=1))
+
+        call_command('backfill_incident_notifications', stdout=StringIO())
+        self.assertFalse(Notification.objects.exists())
+        self.assertEqual(NotificationArchive.objects.filter(recipient=self.manager).count(), 1)
+
+
+class QueryBudgetTests(TestCase):
+    """Budgeted views are profiled under WSGI and ASGI alike."""
+
+    def setUp(self):
+        self.responder = make_user('budget-responder', role='responder')
+
+    def test_within_budget(self):
+        self.client.force_login(self.responder)
+        profile = assert_query_budget(self.client.get('/available-incidents/'))
+        self.assertEqual(profile.view_name, 'aid_app:available_incidents')
+        self.assertEqual(profile.budget, 8)
+        self.assertGreater(profile.query_count, 0)
+
+    def test_over_budget(self):
+        self.client.force_login(self.responder)
+        response = self.client.get('/available-incidents/')
+        with self.assertRaisesMessage(QueryBudgetExceeded, 'aid_app:available_incidents ran'):
+            assert_query_budget(response, budget=1)
+
+    def test_view_without_budget(self):
+        with self.assertRaisesMessage(AssertionError, 'declares no query budget'):
+            assert_query_budget(self.client.get('/'))
+
+    async def test_async_request_is_profiled(self):
+        client = AsyncClient()
+        await client.aforce_login(self.responder)
+        response = await client.get('/available-incidents/')
+        profile = assert_query_budget(response)
+        self.assertGreater(profile.query_count, 0)
+        self.assertGreater(profile.total_time, 0)
+
+    async def test_stream_is_not_recorded(self):
+        request_metrics.reset()
+        client = AsyncClient()
+        await client.aforce_login(self.responder)
+        response = await client.get('/api/incidents/stream/', headers={'Last-Event-ID': '0'})
+        self.assertFalse(hasattr(response, 'query_profile'))
+        self.assertNotIn('aid_app:incident_feed', request_metrics.snapshot()['views'])
+
+
+def plan_checks():
+    """(label, callable running the query the way a view does, index that must serve it)."""
+    # Any id will do: plans depend on the shape of the query, not on whether rows match
+    user = User(pk=1)
+    responder = Responder(pk=1)
+    today = timezone.now().date()
+    week_ago = timezone.now() - timedelta(days=7)
+    handled_today = Incident.objects.filter(
+        assigned_responder=responder, status__in=['resolved', 'closed'], resolved_at__date=today
+    )
+    # Named by Django (unique_together); computing the name needs no open schema editor
+    stats_unique = connection.SchemaEditorClass(connection)._create_index_name(
+        IncidentDailyStats._meta.db_table, ['date', 'incident_type', 'severity'], suffix='_uniq'
+    )
+
+    return [
+        # User dashboard / incident lists
+        ('user active incidents',
+         lambda: Incident.objects.filter(user=user).exclude(status__in=['resolved', 'closed']).count(),
+         'incident_user_created_idx'),
+        ('user recent incidents',
+         lambda: list(Incident.objects.filter(user=user).order_by('-created_at')[:5]),
+         'incident_user_created_idx'),
+
+        # Customer orders
+        ('customer active orders',
+         lambda: Order.objects.filter(customer=user).exclude(status__in=['delivered', 'cancelled', 'returned']).count(),
+         'order_customer_created_idx'),
+        ('customer order history',
+         lambda: list(Order.objects.filter(customer=user).order_by('-created_at')[:20]),
+         'order_customer_created_idx'),
+
+        # Seller dashboard
+        ('seller orders',
+         lambda: list(Order.objects.filter(product__seller=user).order_by('-created_at')[:20]),
+         'order_product_status_idx'),
+        ('seller bulk schedule',
+         lambda: Order.objects.filter(product__seller=user, status='pending').update(status='processing'),
+         'order_product_status_idx'),
+        ('seller delivery map',
+         lambda: list(Order.objects.filter(
+             product__seller=user, status__in=['pending', 'processing', 'shipped', 'delivered']
+         ).exclude(latitude__isnull=True, longitude__isnull=True)),
+         'order_product_status_idx'),
+        ('seller metrics',
+         lambda: seller_metrics(user, week_ago, timezone.now()),
+         'order_product_status_idx'),
+
+        # Responder pages
+        ('dispatch queue',
+         lambda: list(Incident.objects.filter(status='open', assigned_responder__isnull=True).order_by('-created_at')),
+         'incident_open_unassigned_idx'),
+        ('responder active assignment',
+         lambda: Incident.objects.filter(assigned_responder=responder).exclude(
+             status__in=['open', 'resolved', 'closed']).first(),
+         'incident_responder_status_idx'),
+        ('responder recent activity',
+         lambda: list(Incident.objects.filter(
+             assigned_responder=responder, status__in=['resolved', 'closed']).order_by('-updated_at')[:3]),
+         'incident_responder_status_idx'),
+        ('responder handled today',
+         lambda: handled_today.count(),
+         'incident_responder_status_idx'),
+        ('responder arrival times',
+         lambda: duration_summary(handled_today, ARRIVAL),
+         'inc_history_status_idx'),
+        ('responder history',
+         lambda: list(Incident.objects.filter(assigned_responder=responder).order_by('-created_at')[:20]),
+         'incident_responder_status_idx'),
+        ('responder feedback',
+         lambda: list(Feedback.objects.filter(
+             incident__assigned_responder=responder).select_related('user', 'incident').order_by('-created_at')[:20]),
+         'feedback_incident_created_idx'),
+
+        # Notifications
+        ('notification list',
+         lambda: list(Notification.objects.filter(recipient=user).order_by('-created_at')[:20]),
+         'notif_recipient_created_idx'),
+        ('unread notification count',
+         lambda: Notification.objects.filter(recipient=user, is_read=False).count(),
+         'notif_unread_idx'),
+        ('mark notifications read',
+         lambda: Notification.objects.filter(recipient=user, is_read=False).update(is_read=True),
+         'notif_unread_idx'),
+        ('notification outbox claim',
+         claim_next_entry,
+         'outbox_status_created_idx'),
+
+        # Facility dashboards
+        ('low stock kits',
+         lambda: MedicalKit.objects.filter(low_stock_items__gt=0).count(),
+         'kit_low_stock_idx'),
+        ('inventory low stock items',
+         lambda: KitItem.objects.filter(quantity__lte=F('min_quantity'), quantity__gt=0).count(),
+         'kititem_stock_idx'),
+        ('inventory out of stock items',
+         lambda: KitItem.objects.filter(quantity=0).count(),
+         'kititem_stock_idx'),
+        ('daily incident stats',
+         lambda: IncidentDailyStats.totals(date__gte=week_ago.date()),
+         stats_unique),
+    ]
+
+
+def explain(sql):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return '\n'.join(str(row[-1]) for row in cursor.fetchall())
+        cursor.execute('EXPLAIN ' + sql)
+        return '\n'.join(row[0] for row in cursor.fetchall())
+
+
+class QueryPlanTests(TestCase):
+    """The hot view queries must keep using the indexes added for them."""
+
+    def query_plan(self, run):
+        # Rolled back, so the checked updates change nothing
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                # Small tables are cheaper to scan; ask whether the index *can* serve the query
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+            with CaptureQueriesContext(connection) as queries:
+                run()
+            plans = [
+                explain(query['sql']) for query in queries.captured_queries
+                if query['sql'].lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE'))
+            ]
+            transaction.set_rollback(True)
+        return '\n'.join(plans)
+
+    def test_queries_use_their_index(self):
+        for label, run, index in plan_checks():
+            with self.subTest(label):
+                plan = self.query_plan(run)
+                self.assertIn(index, plan, f'{label} no longer uses {index}:\n{plan}')
+
+
+class GatewayHandler(BaseHTTPRequestHandler):
+    """SMS gateway stub: answers with the server's queued statuses, then 200."""
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        status = self.server.statuses.pop(0) if self.server.statuses else 200
+        if status == 200:
+            self.server.received.append(body)
+        self.send_response(status)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class AlertDeliveryTests(TestCase):
+    def setUp(self):
+        self.port = free_port()
+        channels = {
+            'email': {'BACKEND': 'aid_app.delivery.EmailChannel'},
+            'sms': {'BACKEND': 'aid_app.delivery.HttpChannel', 'URL': f'http://127.0.0.1:{self.port}/send',
+                    'TIMEOUT': 2},
+        }
+        for patcher in (mock.patch.object(delivery, 'CHANNELS', channels),
+                        mock.patch.dict(delivery._channels, clear=True)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.user = make_user('dispatcher', role='facility_manager')
+        UserProfile.objects.filter(user=self.user).update(phone='555-0100')
+
+    def start_gateway(self, statuses=()):
+        server = ThreadingHTTPServer(('127.0.0.1', self.port), GatewayHandler)
+        server.statuses = list(statuses)
+        server.received = []
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def alert(self, notification_type='critical'):
+        return Notification.objects.create(recipient=self.user, title='Cardiac arrest', message='Hall B',
+                                           notification_type=notification_type)
+
+    def send_due(self):
+        """One pass of drain_deliveries, on this thread so it sees the test transaction."""
+        return [delivery.send_delivery(due) for due in delivery.claim_due(10)]
+
+    def make_due(self, sms):
+        # Stands in for the backoff delay passing
+        AlertDelivery.objects.filter(pk=sms.pk).update(next_attempt_at=timezone.now())
+
+    def test_critical_alert_goes_out_on_every_channel(self):
+        gateway = self.start_gateway()
+        notification = self.alert()
+        self.alert(notification_type='info')
+
+        self.assertEqual(self.send_due(), [True, True])
+        self.assertEqual([message.to for message in mail.outbox], [['dispatcher@example.com']])
+        self.assertEqual(mail.outbox[0].subject, 'Cardiac arrest')
+        self.assertEqual(gateway.received, [{'to': '555-0100', 'title': 'Cardiac arrest', 'message': 'Hall B',
+                                             'type': 'critical', 'incident': None}])
+        self.assertEqual(
+            set(AlertDelivery.objects.values_list('notification', 'status', 'attempts')),
+            {(notification.pk, 'done', 1)},
+        )
+
+    def test_repeat_escalated_to_critical_is_delivered(self):
+        incident = Incident.objects.create(
+            user=self.user, incident_type='medical', severity='low', location='Hall B',
+            description='Fall', contact_phone='555-0100',
+        )
+        for notification_type in ('high', 'critical', 'critical'):
+            fan_out('facility', title='Patient worsening', message='Hall B', notification_type=notification_type,
+                    category='medical_alert', related_incident=incident, coalesce=True)
+            drain_outbox()
+
+        notification = Notification.objects.get(recipient=self.user, category='medical_alert')
+        self.assertEqual((notification.notification_type, notification.occurrences), ('critical', 3))
+        # Queued once, when the repeat made it critical
+        self.assertEqual(
+            sorted(AlertDelivery.objects.values_list('notification', 'channel')),
+            [(notification.pk, 'email'), (notification.pk, 'sms')],
+        )
+
+    def test_retries_after_server_error(self):
+        gateway = self.start_gateway(statuses=[503])
+        self.alert()
+
+        self.assertEqual(sorted(self.send_due()), [False, True])
+        sms = AlertDelivery.objects.get(channel='sms')
+        self.assertEqual((sms.status, sms.attempts), ('pending', 1))
+        self.assertIn('503', sms.last_error)
+        # Backed off: not due yet
+        self.assertGreater(sms.next_attempt_at, timezone.now())
+        self.assertEqual(self.send_due(), [])
+
+        self.make_due(sms)
+        self.assertEqual(self.send_due(), [True])
+        sms.refresh_from_db()
+        self.assertEqual((sms.status, sms.attempts, sms.last_error), ('done', 2, ''))
+        self.assertEqual(len(gateway.received), 1)
+
+    def test_retries_after_connection_refused(self):
+        self.alert()
+        self.send_due()
+        sms = AlertDelivery.objects.get(channel='sms')
+        self.assertEqual((sms.status, sms.attempts), ('pending', 1))
+        self.assertIn('URLError', sms.last_error)
+
+        gateway = self.start_gateway()
+        self.make_due(sms)
+        self.assertEqual(self.send_due(), [True])
+        sms.refresh_from_db()
+        self.assertEqual((sms.status, sms.attempts), ('done', 2))
+        self.assertEqual(len(gateway.received), 1)
+
+    def test_backoff_grows(self):
+        with mock.patch.object(delivery, 'BACKOFF_BASE', 10), mock.patch.object(delivery, 'BACKOFF_MAX', 60):
+            self.assertTrue(5 <= delivery.backoff(1) <= 10)
+            self.assertTrue(20 <= delivery.backoff(3) <= 40)
+            self.assertTrue(30 <= delivery.backoff(10) <= 60)
+
+    def test_fails_after_max_attempts(self):
+        self.start_gateway(statuses=[503, 503, 503])
+        self.alert()
+        with mock.patch.object(delivery, 'MAX_ATTEMPTS', 2):
+            self.send_due()
+            sms = AlertDelivery.objects.get(channel='sms')
+            self.make_due(sms)
+            self.assertEqual(self.send_due(), [False])
+
+        sms.refresh_from_db()
+        self.assertEqual((sms.status, sms.attempts), ('failed', 2))
+        self.make_due(sms)
+        self.assertEqual(self.send_due(), [])
+
+    def test_rate_limiter(self):
+        limiter = delivery.RateLimiter(20)
+        started = time.monotonic()
+        for _ in range(30):
+            limiter.acquire()
+        # A burst of 20, then 10 more at 20 a second
+        self.assertGreaterEqual(time.monotonic() - started, 0.45)
+
+    def test_channel_rate_is_applied(self):
+        with mock.patch.dict(delivery.CHANNELS, {'email': {'BACKEND': 'aid_app.delivery.EmailChannel', 'RATE': 3}}):
+            channel, limiter = delivery.get_channel('email')
+        self.assertIsInstance(channel, delivery.EmailChannel)
+        self.assertEqual(limiter.rate, 3)
+        self.assertIsNone(delivery.get_channel('sms')[1])
+
+
+class IncidentExportTests(TestCase):
+    def setUp(self):
+        self.manager = make_user('report-manager', role='facility_manager')
+        Incident.objects.bulk_create([
+            Incident(user=self.manager, incident_type='medical', severity='high', location=f'Gate {i}',
+                     description='Fainted', contact_phone='555-0100')
+            for i in range(5)
+        ])
+
+    async def aget_export(self, export_format):
+        client = AsyncClient()
+        await client.aforce_login(self.manager)
+        response = await client.get('/facility-reports/', {'export': export_format})
+        self.assertTrue(response.is_async)
+        return response, b''.join([chunk async for chunk in response.streaming_content])
+
+    async def test_csv_streams_async_under_asgi(self):
+        response, content = await self.aget_export('csv')
+        rows = content.decode().splitlines()
+        self.assertEqual(rows[0].split(',')[0], 'Incident ID')
+        self.assertEqual(len(rows), 6)
+
+    async def test_ndjson_streams_async_under_asgi(self):
+        response, content = await self.aget_export('ndjson')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        lines = gzip.decompress(content).decode().splitlines()
+        self.assertEqual(sorted(json.loads(line)['location'] for line in lines), [f'Gate {i}' for i in range(5)])
+
+    def test_csv_streams_sync_under_wsgi(self):
+        self.client.force_login(self.manager)
+        response = self.client.get('/facility-reports/', {'export': 'csv'})
+        self.assertFalse(response.is_async)
+        self.assertEqual(len(b''.join(response.streaming_content).decode().splitlines()), 6)
+
+
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        # Every test starts from the migration's catalog version: drop pages an earlier test cached under it
+        cache.clear()
+        seller = make_user('seller', role='seller')
+        Product.objects.bulk_create([
+            Product(seller=seller, name=f'Trauma kit {i}', description='Bandages', category='first_aid_kits',
+                    condition='new', price='20.00')
+            for i in range(3)
+        ])
+
+    def test_page_is_cached_until_invalidated(self):
+        self.assertEqual(catalog_page()['facets']['total'], 3)
+        # bulk update: no signal, the cached page stays
+        Product.objects.filter(name='Trauma kit 0').update(status='inactive')
+        self.assertEqual(catalog_page()['facets']['total'], 3)
+        invalidate_catalog()
+        self.assertEqual(catalog_page()['facets']['total'], 2)
+
+    def test_version_moved_by_another_process(self):
+        catalog_page()
+        Product.objects.filter(name='Trauma kit 0').update(status='inactive')
+        # What invalidate_catalog in another worker does; this process's cache is never told
+        CacheVersion.objects.filter(name='catalog').update(version=F('version') + 1)
+        self.assertEqual(catalog_page()['facets']['total'], 2)
+
+    def test_load_more_reaches_every_product(self):
+        # As after a bulk_create: several products inside one millisecond, two with the same created_at
+        base = timezone.now().replace(microsecond=500000)
+        for i, product in enumerate(Product.objects.order_by('pk')):
+            Product.objects.filter(pk=product.pk).update(created_at=base + timedelta(microseconds=min(i, 1) * 300))
+        invalidate_catalog()
+
+        seen = []
+        page = catalog_page(page_size=1)
+        seen += [product['name'] for product in page['products']]
+        while page['next_cursor'] and len(seen) < 10:
+            page = catalog_page(cursor=page['next_cursor'], page_size=1)
+            seen += [product['name'] for product in page['products']]
+        self.assertEqual(seen, ['Trauma kit 2', 'Trauma kit 1', 'Trauma kit 0'])
+
+    def test_product_save_invalidates(self):
+        self.assertEqual(catalog_page()['facets']['total'], 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.get(name='Trauma kit 1').delete()
+        self.assertEqual(catalog_page()['facets']['total'], 2)
+
+
+class InProcessWorkerTests(TestCase):
+    def test_failed_drain_is_logged_and_worker_keeps_going(self):
+        drained = threading.Event()
+        calls = []
+
+        def drain():
+            calls.append(len(calls))
+            if len(calls) == 1:
+                raise RuntimeError('gateway down')
+            drained.set()
+
+        worker = InProcessWorker('test-worker', drain)
+        with self.assertLogs('aid_app.workers', 'ERROR') as logs:
+            worker.wake()
+            for _ in range(100):
+                if logs.records:
+                    break
+                time.sleep(0.01)
+        self.assertIn('test-worker worker failed', logs.output[0])
+        self.assertIn('RuntimeError: gateway down', logs.output[0])
+
+        worker.wake()
+        self.assertTrue(drained.wait(2))
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        user = make_user('pager')
+        # All inside one millisecond, n2/n3 and n5/n6 tied on created_at
+        base = timezone.now().replace(microsecond=123000)
+        for i, offset in enumerate([0, 100, 200, 200, 400, 500, 500]):
+            notification = Notification.objects.create(recipient=user, title=f'n{i}', message='')
+            Notification.objects.filter(pk=notification.pk).update(created_at=base + timedelta(microseconds=offset))
+        self.queryset = Notification.objects.filter(recipient=user)
+
+    def titles(self, page):
+        return [notification.title for notification in page]
+
+    def walk_forward(self):
+        pages = [paginate(self.queryset, page_size=2)]
+        # Bounded, so a cursor that doesn't move fails instead of looping
+        while pages[-1].next_cursor and len(pages) < 10:
+            pages.append(paginate(self.queryset, pages[-1].next_cursor, page_size=2))
+        return pages
+
+    def test_next_visits_every_row_once(self):
+        pages = self.walk_forward()
+        # Newest first, ties broken by id
+        self.assertEqual([self.titles(page) for page in pages], [['n6', 'n5'], ['n4', 'n3'], ['n2', 'n1'], ['n0']])
+
+    def test_previous_walks_back(self):
+        pages = self.walk_forward()
+        page = pages[-1]
+        back = [self.titles(page)]
+        while page.previous_cursor and len(back) < 10:
+            page = paginate(self.queryset, page.previous_cursor, page_size=2)
+            back.append(self.titles(page))
+        self.assertEqual(back, [self.titles(page) for page in reversed(pages)])
+
+    def test_previous_from_second_page_is_first_page(self):
+        second = paginate(self.queryset, paginate(self.queryset, page_size=3).next_cursor, page_size=3)
+        self.assertEqual(self.titles(second), ['n3', 'n2', 'n1'])
+        self.assertEqual(self.titles(paginate(self.queryset, second.previous_cursor, page_size=3)), ['n6', 'n5', 'n4'])
+
+
+class MedicalAlertTests(TestCase):
+    def setUp(self):
+        self.manager = make_user('alert-manager', role='facility_manager')
+        self.responder = make_user('alert-responder', role='responder')
+        self.incident = Incident.objects.create(
+            user=self.responder, incident_type='medical', severity='high', location='Hall B',
+            description='Bleeding', contact_phone='555-0100',
+        )
+        drain_outbox()
+        self.client.force_login(self.responder)
+
+    def press_urgent(self, alert_type='blood_loss'):
+        response = self.client.post('/api/trigger-medical-alert/', {
+            'incident_id': self.incident.incident_id, 'alert_type': alert_type, 'notes': 'Heavy bleeding',
+        }, content_type='application/json')
+        self.assertEqual(response.json()['success'], True)
+        drain_outbox()
+
+    def test_repeated_alerts_coalesce_apart_from_incident_notification(self):
+        self.press_urgent()
+        self.press_urgent()
+        notifications = Notification.objects.filter(recipient=self.manager).order_by('pk')
+        self.assertEqual(
+            list(notifications.values_list('title', 'notification_type', 'category', 'occurrences')),
+            [('New High Incident', 'high', 'incident', 1),
+             (f'URGENT: Blood Loss Reported - {self.incident.incident_id}', 'critical', 'medical_alert', 2)],
+        )
+
+
+class NotificationCounterTests(TestCase):
+    def setUp(self):
+        self.first = make_user('first-manager', role='facility_manager')
+        self.second = make_user('second-manager', role='facility_manager')
+        self.incident = Incident.objects.create(
+            user=self.first, incident_type='medical', severity='low', location='Hall B',
+            description='Fall', contact_phone='555-0100',
+        )
+
+    def assertCountersMatch(self):
+        """Every user's unread counters equal a COUNT over their notifications."""
+        for user in (self.first, self.second):
+            expected = {value: 0 for value, _ in Notification.TYPE_CHOICES}
+            expected.update(Notification.objects.filter(recipient=user, is_read=False)
+                            .values_list('notification_type').annotate(Count('id')).order_by())
+            expected['total'] = sum(expected.values())
+            self.assertEqual(NotificationCounter.unread_counts(user), expected, user.username)
+
+    def raise_alert(self, notification_type):
+        fan_out('facility', title='Patient worsening', message='Hall B', notification_type=notification_type,
+                category='medical_alert', related_incident=self.incident, coalesce=True)
+        drain_outbox()
+
+    def test_counters_follow_every_write_path(self):
+        bulk_create_notifications(
+            Notification(recipient=user, title='Stock low', message='Gauze', notification_type=notification_type,
+                         is_read=is_read)
+            for user in (self.first, self.second)
+            for notification_type, is_read in (('info', False), ('medium', False), ('info', True))
+        )
+        self.assertCountersMatch()
+
+        medium = Notification.objects.get(recipient=self.first, notification_type='medium')
+        self.assertTrue(mark_read(medium))
+        self.assertFalse(mark_read(medium))
+        self.assertCountersMatch()
+
+        # Folded repeats: one recipient had read the alert, it comes back unread with the new type
+        self.raise_alert('high')
+        mark_read(Notification.objects.get(recipient=self.first, category='medical_alert'))
+        self.raise_alert('critical')
+        self.assertEqual(Notification.objects.filter(category='medical_alert').count(), 2)
+        self.assertCountersMatch()
+
+        # One at a time, through the signals
+        single = Notification.objects.create(recipient=self.second, title='Shift', message='Starts at 8')
+        single.is_read = True
+        single.save()
+        Notification.objects.create(recipient=self.second, title='Drill', message='At noon').delete()
+        self.assertCountersMatch()
+
+        self.assertEqual(mark_all_read(self.first), 2)
+        self.assertCountersMatch()
+
+        # Only read rows are archived, the second manager's unread ones stay counted
+        for notification in Notification.objects.filter(recipient=self.second, notification_type='info'):
+            mark_read(notification)
+        read = Notification.objects.filter(is_read=True).count()
+        self.assertEqual(archive_batch(timezone.now() + timedelta(minutes=1))[0], read)
+        self.assertEqual(NotificationCounter.unread_counts(self.second)['total'], 2)
+        self.assertCountersMatch()
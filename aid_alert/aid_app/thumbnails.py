@@ -0,0 +1,200 @@
+"""
+Product image renditions.
+
+Uploads are stored as they come, which can be several megabytes. Listing pages
+should not send that, so every product image gets resized, recompressed copies
+(RENDITION_WIDTHS wide, in WebP and JPEG) made by a background worker:
+
+* Saving a product with a new image queues a ProductImageJob and clears
+  image_digest, so pages fall back to the original until the copies exist.
+* The image worker (`manage.py run_image_worker`, or a thread of the web
+  process with PRODUCT_IMAGE_IN_PROCESS on) claims jobs the same way the
+  notification outbox does, writes the renditions and sets image_digest.
+* Renditions are stored under the SHA-256 of the original
+  (renditions/ab/abcd.../320.webp), so an image uploaded for several products
+  is resized and stored once. They are never deleted here.
+
+Templates ask for a width with the product_image_url tag (templatetags/
+product_images.py) and get the smallest rendition at least that wide.
+"""
+import hashlib
+from datetime import timedelta
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F, Q
+from django.db.models.signals import post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .catalog import invalidate_catalog
+from .models import Product, ProductImageJob
+from .workers import InProcessWorker
+
+RENDITION_WIDTHS = tuple(sorted(getattr(settings, 'PRODUCT_IMAGE_WIDTHS', (160, 320, 640))))
+RENDITION_FORMATS = ('webp', 'jpeg')
+RENDITION_QUALITY = getattr(settings, 'PRODUCT_IMAGE_QUALITY', 80)
+# Give up on a job after this many failed attempts
+JOB_MAX_ATTEMPTS = getattr(settings, 'PRODUCT_IMAGE_MAX_ATTEMPTS', 3)
+# A job stuck in 'processing' this long (crashed worker) is picked up again
+JOB_CLAIM_TIMEOUT = getattr(settings, 'PRODUCT_IMAGE_CLAIM_TIMEOUT', 600)
+# Make renditions from a background thread of the web process
+IN_PROCESS = getattr(settings, 'PRODUCT_IMAGE_IN_PROCESS', True)
+
+
+def rendition_name(digest, width, fmt):
+    return f'renditions/{digest[:2]}/{digest}/{width}.{fmt}'
+
+
+def rendition_url(image_name, digest, width, fmt='webp'):
+    """
+    URL of the smallest rendition at least `width` wide (the largest one if
+    none is), or of the original while renditions are missing.
+    """
+    if not image_name:
+        return None
+    if not digest:
+        return default_storage.url(image_name)
+    size = next((w for w in RENDITION_WIDTHS if w >= width), RENDITION_WIDTHS[-1])
+    return default_storage.url(rendition_name(digest, size, fmt))
+
+
+def _render(source, width, fmt):
+    image = source.copy()
+    # Only the width is bounded; images are never scaled up
+    image.thumbnail((width, image.height), Image.Resampling.LANCZOS)
+    buffer = BytesIO()
+    if fmt == 'jpeg':
+        if image.mode in ('RGBA', 'LA', 'P'):
+            # JPEG has no alpha: flatten onto white
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, 'white')
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+        image.save(buffer, 'JPEG', quality=RENDITION_QUALITY, optimize=True, progressive=True)
+    else:
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() or image.mode == 'P' else 'RGB')
+        image.save(buffer, 'WEBP', quality=RENDITION_QUALITY, method=4)
+    return buffer.getvalue()
+
+
+def build_renditions(image_name):
+    """Writes the renditions of a stored image that don't exist yet. Returns the image's digest."""
+    with default_storage.open(image_name, 'rb') as f:
+        data = f.read()
+    digest = hashlib.sha256(data).hexdigest()
+
+    missing = [
+        (width, fmt) for width in RENDITION_WIDTHS for fmt in RENDITION_FORMATS
+        if not default_storage.exists(rendition_name(digest, width, fmt))
+    ]
+    if missing:
+        with Image.open(BytesIO(data)) as source:
+            # Apply the camera's rotation; the copies don't carry EXIF
+            source = ImageOps.exif_transpose(source)
+            for width, fmt in missing:
+                default_storage.save(rendition_name(digest, width, fmt), ContentFile(_render(source, width, fmt)))
+    return digest
+
+
+def queue_renditions(product):
+    job = ProductImageJob.objects.create(product=product, image_name=product.image.name)
+    transaction.on_commit(wake_worker)
+    return job
+
+
+def _image_name(value):
+    return getattr(value, 'name', value) or ''
+
+
+@receiver(pre_save, sender=Product)
+def forget_stale_renditions(sender, instance, **kwargs):
+    # Deferred image: it can't have changed
+    if 'image' not in instance.__dict__:
+        instance._image_changed = False
+        return
+    loaded = instance.loaded_values()
+    old_name = _image_name(loaded['image']) if loaded else None
+    instance._image_changed = instance._state.adding or old_name != _image_name(instance.image)
+    if instance._image_changed:
+        instance.image_digest = ''
+
+
+@receiver(post_save, sender=Product)
+def queue_product_renditions(sender, instance, **kwargs):
+    if getattr(instance, '_image_changed', False) and instance.image:
+        queue_renditions(instance)
+
+
+def process_job(job):
+    """Makes the renditions for one job. A job for an image that has since been replaced just finishes."""
+    product = Product.objects.filter(pk=job.product_id, image=job.image_name).first()
+    if product is None:
+        return None
+    digest = build_renditions(job.image_name)
+    # update() so saving doesn't queue the image again; it also skips the catalog signal
+    if Product.objects.filter(pk=product.pk, image=job.image_name).update(image_digest=digest):
+        transaction.on_commit(invalidate_catalog)
+    return digest
+
+
+def claim_next_job():
+    """Takes the oldest pending job with a conditional UPDATE, so parallel workers never share one."""
+    stale = timezone.now() - timedelta(seconds=JOB_CLAIM_TIMEOUT)
+    candidates = ProductImageJob.objects.filter(
+        Q(status='pending') | Q(status='processing', claimed_at__lt=stale)
+    ).values_list('pk', 'status')[:10]
+
+    for pk, status in candidates:
+        claimed = ProductImageJob.objects.filter(pk=pk, status=status).update(
+            status='processing', claimed_at=timezone.now(), attempts=F('attempts') + 1
+        )
+        if claimed:
+            return ProductImageJob.objects.get(pk=pk)
+    return None
+
+
+def drain_jobs(limit=None):
+    """Processes pending jobs until there are none left (or `limit` jobs). Returns (done, failed)."""
+    done = failed = 0
+    while limit is None or done + failed < limit:
+        job = claim_next_job()
+        if job is None:
+            break
+        try:
+            process_job(job)
+        except Exception as e:
+            failed += 1
+            status = 'failed' if job.attempts >= JOB_MAX_ATTEMPTS else 'pending'
+            ProductImageJob.objects.filter(pk=job.pk).update(status=status, last_error=str(e))
+        else:
+            done += 1
+            ProductImageJob.objects.filter(pk=job.pk).update(
+                status='done', processed_at=timezone.now(), last_error=''
+            )
+    return done, failed
+
+
+def queue_missing():
+    """Queues a job for every product image without renditions and no job in flight. Returns how many."""
+    products = Product.objects.exclude(image='').exclude(image__isnull=True).filter(image_digest='').exclude(
+        image_jobs__status__in=['pending', 'processing']
+    ).values_list('pk', 'image')
+    jobs = [ProductImageJob(product_id=pk, image_name=image) for pk, image in products.iterator()]
+    ProductImageJob.objects.bulk_create(jobs, batch_size=500)
+    return len(jobs)
+
+
+_in_process_worker = InProcessWorker('product-image-renditions', drain_jobs)
+
+
+def wake_worker():
+    if IN_PROCESS:
+        _in_process_worker.wake()
@@ -54,6 +54,7 @@ urlpatterns = [
     path('api/delivery-data/', views.get_delivery_data, name='get_delivery_data'),
     path('available-incidents/', views.available_incidents_view, name='available_incidents'),
     path('accept-incident/', views.accept_incident_view, name='accept_incident'),
+    path('api/incidents/stream/', views.incident_feed_view, name='incident_feed'),
     path('update-incident-status/', views.update_incident_status_view, name='update_incident_status'),
     path('api/trigger-medical-alert/', views.trigger_medical_alert, name='trigger_medical_alert'),
     path('api/forward-medical-alert/', views.forward_medical_alert, name='forward_medical_alert'),
@@ -104,6 +105,7 @@ urlpatterns = [
     path('admin-panel/update-facility/<int:profile_id>/', views.update_facility_view, name='update_facility'),
     path('admin-panel/update-product-image/<int:product_id>/', views.update_product_image_view, name='update_product_image'),
     path('admin-panel/generate-report/', views.generate_report_view, name='generate_report'),
+    path('admin-panel/request-metrics/', views.request_metrics_view, name='request_metrics'),
     path('approve-sellers/', views.approve_sellers_view, name='approve_sellers'),
     path('marketplace-monitor/', views.marketplace_monitor_view, name='marketplace_monitor'),
     path('system-reports/', views.system_reports_view, name='system_reports'),
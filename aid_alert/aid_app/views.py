@@ -5,12 +5,24 @@ from django.views.decorators.http import require_http_methods
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate, login, logout
 from django.contrib import messages
-from django.http import HttpResponse, JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
 from django.db.models import Sum, Count, Avg, F, Min, Q
 from django.db.models.functions import TruncHour, TruncDay, TruncMonth
 from django.utils import timezone
-from .models import UserProfile, MedicalKit, Responder, KitItem, Product, Incident, Order, Feedback, SystemReport, Facility, IncidentStatusHistory, ResponderAvailabilityHistory, Notification
+from .models import UserProfile, MedicalKit, Responder, KitItem, Product, Incident, Order, Feedback, SystemReport, Facility, IncidentStatusHistory, ResponderAvailabilityHistory, Notification, NotificationCounter, IncidentDailyStats
 from .forms import ProductForm, MedicalKitForm
+from .dispatch import nearest_responders, parse_coordinates, claim_incident
+from .feed import incident_feed, parse_last_event_id
+from .notifications import fan_out, mark_read, mark_all_read
+from .seller_metrics import seller_metrics
+from .exports import stream_incident_export, incident_json, order_json, product_json, feedback_json
+from .checkout import place_orders, CheckoutError
+from .response_metrics import response_time_summary, duration_summary, format_minutes, ARRIVAL, RESOLUTION
+from .instrumentation import no_request_metrics, request_metrics, query_budget
+from .roles import FACILITY_ROLES, role_required, api_role_required
+from .catalog import catalog_page, CATEGORY_ICONS
+from .pagination import InvalidCursor, paginate_request, wants_json
 from datetime import timedelta, datetime
 import random
 from django.template.loader import render_to_string
@@ -29,6 +41,7 @@ def contact_view(request):
     """Renders the contact page with contact information."""
     return render(request, 'common/contact.html')
 
+@query_budget(10)
 def dashboard_view(request):
     """Renders the appropriate dashboard based on user role."""
     if not request.user.is_authenticated:
@@ -40,14 +53,10 @@ def dashboard_view(request):
         return redirect('aid_app:admin_dashboard')
     
     # Check if user is responder and redirect to responder dashboard
-    try:
-        user_role = request.user.profile.role
-        if user_role == 'responder':
-            return redirect('aid_app:responder_dashboard')
-        elif user_role == 'facility' or user_role == 'facility_manager':
-            return redirect('aid_app:facility_dashboard')
-    except UserProfile.DoesNotExist:
-        pass
+    if request.role == 'responder':
+        return redirect('aid_app:responder_dashboard')
+    elif request.role in FACILITY_ROLES:
+        return redirect('aid_app:facility_dashboard')
     
     # Regular user dashboard
     # Fetch real data for dashboard stats
@@ -62,9 +71,9 @@ def dashboard_view(request):
     # Emergency contacts count
     emergency_contacts_count = 0
     try:
-        if request.user.profile.emergency_contacts:
+        if request.profile.emergency_contacts:
             # Check if likely comma or newline separated
-            contacts_text = request.user.profile.emergency_contacts
+            contacts_text = request.profile.emergency_contacts
             if ',' in contacts_text:
                 emergency_contacts_count = len([c for c in contacts_text.split(',') if c.strip()])
             else:
@@ -87,22 +96,9 @@ def dashboard_view(request):
 
     return render(request, 'user/user_dashboard.html', context)
 
+@role_required('seller', message='Access denied. This dashboard is for seller users only.', login_message='Please login to access your dashboard.')
 def seller_dashboard_view(request):
     """Renders the seller dashboard for seller users."""
-    if not request.user.is_authenticated:
-        messages.error(request, 'Please login to access your dashboard.')
-        return redirect('aid_app:login')
-    
-    # Check if user is seller
-    try:
-        user_profile = request.user.profile
-        if user_profile.role != 'seller':
-            messages.error(request, 'Access denied. This dashboard is for seller users only.')
-            return redirect('aid_app:dashboard')
-    except UserProfile.DoesNotExist:
-        messages.error(request, 'Access denied. This dashboard is for seller users only.')
-        return redirect('aid_app:dashboard')
-    
     # Get all products for this seller
     seller_products = Product.objects.filter(seller=request.user)
     
@@ -148,130 +144,9 @@ def seller_dashboard_view(request):
     
     return render(request, 'seller/seller_dashboard.html', context)
 
+@role_required('seller', message='Access denied. This page is for seller users only.', login_message='Please login to access your sales report.')
 def seller_report_view(request):
     """Renders the seller sales report page with real data."""
-    if not request.user.is_authenticated:
-        messages.error(request, 'Please login to access your sales report.')
-        return redirect('aid_app:login')
-    
-    # Check if user is seller
-    try:
-        user_profile = request.user.profile
-        if user_profile.role != 'seller':
-            messages.error(request, 'Access denied. This page is for seller users only.')
-            return redirect('aid_app:dashboard')
-    except UserProfile.DoesNotExist:
-        messages.error(request, 'Access denied. This page is for seller users only.')
-        return redirect('aid_app:dashboard')
-
-    # Helper to calculate metrics for a given date range
-    def get_metrics(start_date, end_date):
-        orders = Order.objects.filter(
-            product__seller=request.user,
-            created_at__range=(start_date, end_date)
-        ).exclude(status='cancelled')
-        
-        total_revenue = orders.aggregate(total=Sum('total_price'))['total'] or 0
-        total_orders = orders.count()
-        # Avg Order Value & Unique Customers (already calculated effectively, but let's be explicitly robust)
-        unique_customer_ids = list(orders.values_list('customer_id', flat=True).distinct())
-        unique_customers_count = len(unique_customer_ids)
-        avg_order_value = total_revenue / total_orders if total_orders > 0 else 0
-        
-        # --- Customer Segments ---
-        # 1. New vs Returning
-        # New: First order ever is within this period (and they bought in this period)
-        # Returning: First order ever was BEFORE this period
-        
-        # We need to look at the global first order for these specific active customers
-        
-        # Get these customers' global first order dates
-        # optimized: filter orders by these customers, group by customer, get min created_at
-        customer_first_orders = Order.objects.filter(
-            customer_id__in=unique_customer_ids,
-            product__seller=request.user 
-        ).values('customer_id').annotate(first_seen=Min('created_at'))
-        
-        new_count = 0
-        returning_count = 0
-        
-        for cdict in customer_first_orders:
-            if cdict['first_seen'] >= start_date:
-                new_count += 1
-            else:
-                returning_count += 1
-                
-        # VIP: Top 10% by spend in this period
-        # Calculate spend per customer in this period
-        customer_spends = orders.values('customer').annotate(
-            spent=Sum('total_price')
-        ).order_by('-spent')
-        
-        # Basic VIP def: top 10% of active customers
-        vip_threshold_count = max(1, int(unique_customers_count * 0.1))
-        vip_count = 0
-        # If we have customers, the top N are VIPs. 
-        # But this is just a count for the dashboard stats. 
-        # Actually, "VIP" segment usually implies a persistent status, but let's base it on high spenders for now.
-        if unique_customers_count > 0:
-             # Count how many are in top 10%
-             vip_count = vip_threshold_count # Simplified/Circular logic but fits "Top 10%" display
-        
-        # Calculate Percentages
-        total_active_cust = unique_customers_count if unique_customers_count > 0 else 1
-        segments = {
-            'new_customers_pct': (new_count / total_active_cust) * 100,
-            'returning_pct': (returning_count / total_active_cust) * 100,
-            'vip_pct': (vip_count / total_active_cust) * 100
-        }
-        
-        # --- Top Customers List ---
-        # Reuse customer_spends, get top 3 with details
-        top_customers_data = []
-        top_qs = customer_spends[:3]
-        for item in top_qs:
-            # Need to fetch user object/name efficiently
-            # We have customer ID.
-            try:
-                u = User.objects.get(id=item['customer'])
-                name = u.get_full_name() or u.username
-                top_customers_data.append({
-                    'name': name,
-                    'total_spent': item['spent']
-                })
-            except User.DoesNotExist:
-                continue
-
-        # Product Performance Aggregation
-        product_stats = orders.values(
-            'product__name', 'product__id'
-        ).annotate(
-            units_sold=Sum('quantity'),
-            revenue=Sum('total_price')
-        ).order_by('-revenue')[:5] # Top 5 products
-        
-        products_list = []
-        for p in product_stats:
-            products_list.append({
-                'name': p['product__name'],
-                'id': p['product__id'],
-                'units_sold': p['units_sold'],
-                'revenue': p['revenue'],
-                'growth': '+0%', # Placeholder as product-level growth comparison is complex
-                'trend': 'Stable'
-            })
-
-        return {
-            'revenue': total_revenue,
-            'orders': total_orders,
-            'avg_order': avg_order_value,
-            'customers': unique_customers_count,
-            'orders_qs': orders, # Return queryset for chart data
-            'products': products_list,
-            'customer_segments': segments,
-            'top_customers': top_customers_data
-        }
-
     # Handle AJAX request for filtered data
     if request.headers.get('change_period') or request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         period = request.GET.get('period', 'today')
@@ -310,11 +185,8 @@ def seller_report_view(request):
             prev_end = start_date
             chart_labels = []
 
-        # Current Period Metrics
-        current = get_metrics(start_date, end_date)
-        
-        # Previous Period Metrics
-        previous = get_metrics(prev_start, prev_end)
+        # Current and Previous Period Metrics (one aggregation query for both)
+        current, previous = seller_metrics(request.user, start_date, end_date, prev_start, prev_end)
         
         def calc_growth(current_val, prev_val):
             if prev_val == 0:
@@ -511,7 +383,7 @@ def seller_report_view(request):
     
     start_date = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
     end_date = timezone.now()
-    metrics = get_metrics(start_date, end_date)
+    metrics, _ = seller_metrics(request.user, start_date, end_date)
 
     context = {
         'user': request.user,
@@ -527,22 +399,9 @@ def seller_report_view(request):
     
     return render(request, 'seller/sales_report.html', context)
 
+@role_required('seller', message='Access denied. This page is for seller users only.', login_message='Please login to access your profile.')
 def seller_profile_view(request):
     """Renders the seller profile page for seller users."""
-    if not request.user.is_authenticated:
-        messages.error(request, 'Please login to access your profile.')
-        return redirect('aid_app:login')
-    
-    # Check if user is seller
-    try:
-        user_profile = request.user.profile
-        if user_profile.role != 'seller':
-            messages.error(request, 'Access denied. This page is for seller users only.')
-            return redirect('aid_app:dashboard')
-    except UserProfile.DoesNotExist:
-        messages.error(request, 'Access denied. This page is for seller users only.')
-        return redirect('aid_app:dashboard')
-    
     context = {
         'user': request.user,
         'user_profile': getattr(request.user, 'profile', None),
@@ -554,21 +413,9 @@ def sales_report_redirect_view(request):
     """Redirect old hardcoded URL to correct seller report page."""
     return redirect('aid_app:seller_report')
 
+@role_required('seller', message='Access denied. This is for seller testing only.', login_message=None)
 def create_sample_orders_view(request):
     """Create sample orders for testing seller reports."""
-    if not request.user.is_authenticated:
-        return redirect('aid_app:login')
-    
-    # Check if user is seller
-    try:
-        user_profile = request.user.profile
-        if user_profile.role != 'seller':
-            messages.error(request, 'Access denied. This is for seller testing only.')
-            return redirect('aid_app:dashboard')
-    except UserProfile.DoesNotExist:
-        messages.error(request, 'Access denied. This is for seller testing only.')
-        return redirect('aid_app:dashboard')
-    
     # Get seller's products
     seller_products = Product.objects.filter(seller=request.user)
     
@@ -597,7 +444,7 @@ def create_sample_orders_view(request):
     # Get some sample customers (all users except current seller)
     customers = User.objects.exclude(id=request.user.id)[:5]
     
-    created_count = 0
+    orders = []
     for product in seller_products:
         for customer in customers:
             # Create 1-3 orders per product per customer
@@ -605,33 +452,22 @@ def create_sample_orders_view(request):
                 quantity = random.randint(1, 5)
                 total_price = product.price * quantity
                 
-                Order.objects.create(
+                orders.append(Order(
                     customer=customer,
                     product=product,
                     quantity=quantity,
                     total_price=total_price,
                     status=random.choice(['pending', 'processing', 'shipped', 'delivered'])
-                )
-                created_count += 1
+                ))
+    # One INSERT instead of one per order (Order has no save signals)
+    created_count = len(Order.objects.bulk_create(orders))
     
     messages.success(request, f'Created {created_count} sample orders for testing.')
     return redirect('aid_app:seller_report')
 
+@role_required('seller', message='Access denied. This is for seller users only.', login_message=None)
 def generate_seller_report_view(request):
     """Generate a downloadable sales report for the seller."""
-    if not request.user.is_authenticated:
-        return redirect('aid_app:login')
-    
-    # Check if user is seller
-    try:
-        user_profile = request.user.profile
-        if user_profile.role != 'seller':
-            messages.error(request, 'Access denied. This is for seller users only.')
-            return redirect('aid_app:dashboard')
-    except UserProfile.DoesNotExist:
-        messages.error(request, 'Access denied. This is for seller users only.')
-        return redirect('aid_app:dashboard')
-    
     # Get the same data as the seller report view
     try:
         seller_products = Product.objects.filter(seller=request.user)
@@ -736,22 +572,9 @@ def generate_seller_report_view(request):
         'data': report_data
     })
 
+@role_required('seller', message='Access denied. This page is for seller users only.', login_message='Please login to add products.')
 def add_product_view(request):
     """Handles product submission for seller users."""
-    if not request.user.is_authenticated:
-        messages.error(request, 'Please login to add products.')
-        return redirect('aid_app:login')
-    
-    # Check if user is seller
-    try:
-        user_profile = request.user.profile
-        if user_profile.role != 'seller':
-            messages.error(request, 'Access denied. This page is for seller users only.')
-            return redirect('aid_app:dashboard')
-    except UserProfile.DoesNotExist:
-        messages.error(request, 'Access denied. This page is for seller users only.')
-        return redirect('aid_app:dashboard')
-    
     if request.method == 'POST':
         form = ProductForm(request.POST, request.FILES)
         if form.is_valid():
@@ -778,22 +601,9 @@ def add_product_view(request):
     
     return render(request, 'seller/add_product.html', context)
 
+@role_required('seller', message='Access denied. This page is for seller users only.', login_message='Please login to update products.')
 def update_product_view(request, product_id=None):
     """Handles product updating for seller users."""
-    if not request.user.is_authenticated:
-        messages.error(request, 'Please login to update products.')
-        return redirect('aid_app:login')
-    
-    # Check if user is seller
-    try:
-        user_profile = request.user.profile
-        if user_profile.role != 'seller':
-            messages.error(request, 'Access denied. This page is for seller users only.')
-            return redirect('aid_app:dashboard')
-    except UserProfile.DoesNotExist:
-        messages.error(request, 'Access denied. This page is for seller users only.')
-        return redirect('aid_app:dashboard')
-    
     
     if request.method == 'POST':
         product_id = request.POST.get('product_id')
@@ -818,22 +628,9 @@ def update_product_view(request, product_id=None):
     
     return render(request, 'seller/update_product.html', context)
 
+@role_required('seller', message='Access denied. This page is for seller users only.', login_message='Please login to view products.')
 def view_products_view(request):
     """Handles viewing products for seller users."""
-    if not request.user.is_authenticated:
-        messages.error(request, 'Please login to view products.')
-        return redirect('aid_app:login')
-    
-    # Check if user is seller
-    try:
-        user_profile = request.user.profile
-        if user_profile.role != 'seller':
-            messages.error(request, 'Access denied. This page is for seller users only.')
-            return redirect('aid_app:dashboard')
-    except UserProfile.DoesNotExist:
-        messages.error(request, 'Access denied. This page is for seller users only.')
-        return redirect('aid_app:dashboard')
-    
     # Get all products for this seller
     products = Product.objects.filter(seller=request.user).order_by('-created_at')
     
@@ -863,36 +660,34 @@ def view_orders_view(request):
     # Check if user is seller or admin
     is_admin = request.user.is_staff or request.user.is_superuser
     
-    try:
-        user_profile = request.user.profile
-        if user_profile.role != 'seller' and not is_admin:
-            messages.error(request, 'Access denied. This page is for seller users only.')
-            return redirect('aid_app:dashboard')
-    except UserProfile.DoesNotExist:
-        if not is_admin:
-            messages.error(request, 'Access denied. This page is for seller users only.')
-            return redirect('aid_app:dashboard')
+    if request.role != 'seller' and not is_admin:
+        messages.error(request, 'Access denied. This page is for seller users only.')
+        return redirect('aid_app:dashboard')
     
     # Get all orders
     if is_admin:
-        orders = Order.objects.all().order_by('-created_at')
+        orders = Order.objects.all()
     else:
         # Get all orders for this seller's products
-        orders = Order.objects.filter(product__seller=request.user).order_by('-created_at')
-    
-    # Calculate statistics
-    total_orders = orders.count()
-    pending_orders = orders.filter(status='pending').count()
-    in_transit_orders = orders.filter(status='shipped').count()
-    total_revenue = orders.exclude(status='cancelled').aggregate(
-        total=Sum('total_price'))['total'] or 0
+        orders = Order.objects.filter(product__seller=request.user)
+    
+    # One page of orders, newest first
+    page = paginate_request(request, orders.select_related('customer', 'product'))
+    if wants_json(request):
+        return JsonResponse(page.as_json(order_json))
+    
+    # Calculate statistics (one conditional aggregate)
+    stats = orders.aggregate(
+        total_orders=Count('id'),
+        pending_orders=Count('id', filter=Q(status='pending')),
+        in_transit_orders=Count('id', filter=Q(status='shipped')),
+        total_revenue=Sum('total_price', filter=~Q(status='cancelled'), default=0),
+    )
     
     context = {
-        'orders': orders,
-        'total_orders': total_orders,
-        'pending_orders': pending_orders,
-        'in_transit_orders': in_transit_orders,
-        'total_revenue': total_revenue,
+        'orders': page,
+        'page': page,
+        **stats,
         'user': request.user,
     }
     
@@ -1057,17 +852,9 @@ def get_delivery_data(request):
         return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
 
 @login_required
+@role_required('seller', message='Access denied. This page is for seller users only.')
 def manage_delivery_view(request):
     """Handles delivery management for seller users."""
-    try:
-        user_profile = request.user.profile
-        if user_profile.role != 'seller':
-            messages.error(request, 'Access denied. This page is for seller users only.')
-            return redirect('aid_app:dashboard')
-    except UserProfile.DoesNotExist:
-        messages.error(request, 'Access denied. This page is for seller users only.')
-        return redirect('aid_app:dashboard')
-    
     # Get all orders for this seller
     orders = Order.objects.filter(product__seller=request.user).order_by('-created_at')
     
@@ -1087,32 +874,16 @@ def manage_delivery_view(request):
     
     return render(request, 'seller/manage_delivery.html', context)
 
+@query_budget(12)
+@role_required(*FACILITY_ROLES, message='Access denied. This dashboard is for facility users only.', login_message='Please login to access your dashboard.')
 def facility_dashboard_view(request):
-    if not request.user.is_authenticated:
-        messages.error(request, 'Please login to access your dashboard.')
-        return redirect('aid_app:login')
-    
-    # Check if user is facility
-    try:
-        user_profile = request.user.profile
-        if user_profile.role != 'facility' and user_profile.role != 'facility_manager':
-            messages.error(request, 'Access denied. This dashboard is for facility users only.')
-            return redirect('aid_app:dashboard')
-    except UserProfile.DoesNotExist:
-        messages.error(request, 'Access denied. This dashboard is for facility users only.')
-        return redirect('aid_app:dashboard')
-    
     # Get real data from database
     total_kits = MedicalKit.objects.count()
     available_kits = MedicalKit.objects.filter(status='available').count()
     
     # Calculate low stock items - count kits where any item is below minimum quantity
-    low_stock_kits = 0
-    for kit in MedicalKit.objects.all():
-        for item in kit.items.all():
-            if item.quantity <= item.min_quantity:
-                low_stock_kits += 1
-                break  # Count each kit only once
+    # (per-kit counter kept current by the KitItem signals, so no item scan here)
+    low_stock_kits = MedicalKit.objects.filter(low_stock_items__gt=0).count()
     
     # Count active responders
     active_responders = Responder.objects.filter(
@@ -1175,21 +946,8 @@ def facility_dashboard_view(request):
     
     return render(request, 'facility manager/facility_dashboard.html', context)
 
+@role_required(*FACILITY_ROLES, message='Access denied. This page is for facility users only.')
 def manage_kits_view(request):
-    if not request.user.is_authenticated:
-        messages.error(request, 'Please login to access this page.')
-        return redirect('aid_app:login')
-    
-    # Check if user is facility
-    try:
-        user_profile = request.user.profile
-        if user_profile.role != 'facility' and user_profile.role != 'facility_manager':
-            messages.error(request, 'Access denied. This page is for facility users only.')
-            return redirect('aid_app:dashboard')
-    except UserProfile.DoesNotExist:
-        messages.error(request, 'Access denied. This page is for facility users only.')
-        return redirect('aid_app:dashboard')
-    
     # Get real data from database
     kits_list = MedicalKit.objects.all().order_by('kit_id') # Order for consistent pagination
     available_kits = kits_list.filter(status='available').count()
@@ -1209,13 +967,8 @@ def manage_kits_view(request):
         # If page is out of range (e.g. 9999), deliver last page of results.
         kits = paginator.page(paginator.num_pages)
 
-    # Calculate low stock kits
-    low_stock_kits = 0
-    for kit in kits:
-        for item in kit.items.all():
-            if item.quantity <= item.min_quantity:
-                low_stock_kits += 1
-                break
+    # Calculate low stock kits (on this page, from the per-kit counter)
+    low_stock_kits = sum(1 for kit in kits if kit.low_stock_items)
     
     context = {
         'user': request.user,
@@ -1293,22 +1046,8 @@ def check_kit_api(request, kit_id):
     kit.save() # Updates auto_now=True field 'last_checked' / 'updated_at'
     return JsonResponse({'success': True, 'message': 'Kit checked successfully', 'last_checked': kit.updated_at.strftime('%Y-%m-%d %H:%M')})
 
+@role_required(*FACILITY_ROLES, message='Access denied. This page is for facility users only.')
 def stock_tracking_view(request):
-    if not request.user.is_authenticated:
-        messages.error(request, 'Please login to access this page.')
-        return redirect('aid_app:login')
-    
-    # Check if user is facility
-    # Check if user is facility
-    try:
-        user_profile = request.user.profile
-        if user_profile.role != 'facility' and user_profile.role != 'facility_manager':
-            messages.error(request, 'Access denied. This page is for facility users only.')
-            return redirect('aid_app:dashboard')
-    except:
-        messages.error(request, 'Access denied. This page is for facility users only.')
-        return redirect('aid_app:dashboard')
-    
     from django.db.models import F # Fix UnboundLocalError by importing at top of function logic
     
     # Calculate stats
@@ -1433,21 +1172,8 @@ def update_stock_api(request):
         return JsonResponse({'success': False, 'message': str(e)})
 
 @login_required # Ideally should be here
+@role_required(*FACILITY_ROLES, message='Access denied. This page is for facility users only.')
 def assign_responders_view(request):
-    if not request.user.is_authenticated:
-        messages.error(request, 'Please login to access this page.')
-        return redirect('aid_app:login')
-    
-    # Check if user is facility
-    try:
-        user_profile = request.user.profile
-        if user_profile.role != 'facility' and user_profile.role != 'facility_manager':
-            messages.error(request, 'Access denied. This page is for facility users only.')
-            return redirect('aid_app:dashboard')
-    except:
-        messages.error(request, 'Access denied. This page is for facility users only.')
-        return redirect('aid_app:dashboard')
-    
     # Fetch Responders
     # To support server-side filtering combined with pagination if needed later (or now if we want to be thorough),
     # we can filter here. For now, just pagination on the full list as requested + basic search if param exists.
@@ -1499,6 +1225,16 @@ def assign_responders_view(request):
         assigned_responder__isnull=False,
         status__in=active_statuses
     ).select_related('assigned_responder', 'assigned_responder__user').order_by('-updated_at')
+
+    # Nearest available responders for a selected incident (?incident=<id>)
+    dispatch_incident = None
+    suggested_responders = []
+    incident_param = request.GET.get('incident', '')
+    if incident_param:
+        incident_pk = incident_param.replace('INC-', '')
+        dispatch_incident = Incident.objects.filter(pk=incident_pk).first() if incident_pk.isdigit() else None
+        if dispatch_incident:
+            suggested_responders = nearest_responders(dispatch_incident, k=5)
     
     context = {
         'user': request.user,
@@ -1509,6 +1245,8 @@ def assign_responders_view(request):
         'on_duty_responders': on_duty_responders,
         'unavailable_responders': unavailable_responders,
         'active_assignments': active_assignments,
+        'dispatch_incident': dispatch_incident,
+        'suggested_responders': suggested_responders,
         'search_query': search_query,
         'status_filter': status_filter,
     }
@@ -1523,6 +1261,7 @@ def create_assignment_api(request):
         location = data.get('location')
         description = data.get('description')
         responder_id = data.get('responder_id')
+        latitude, longitude = parse_coordinates(data.get('latitude'), data.get('longitude'))
         
         # Create Incident
         incident = Incident.objects.create(
@@ -1530,6 +1269,8 @@ def create_assignment_api(request):
             incident_type=incident_type,
             severity=severity,
             location=location,
+            latitude=latitude,
+            longitude=longitude,
             description=description,
             contact_phone=request.user.profile.phone or 'N/A', # Use facility phone
             status='open'
@@ -1551,33 +1292,30 @@ def create_assignment_api(request):
         return JsonResponse({'success': False, 'message': str(e)}, status=400)
 
 @login_required
+@role_required(*FACILITY_ROLES, message='Access denied. This page is for facility users only.')
 def facility_incident_log_view(request):
-    if not request.user.is_authenticated:
-        messages.error(request, 'Please login to access this page.')
-        return redirect('aid_app:login')
-    
-    # Check if user is facility
-    try:
-        user_profile = request.user.profile
-        if user_profile.role != 'facility' and user_profile.role != 'facility_manager':
-            messages.error(request, 'Access denied. This page is for facility users only.')
-            return redirect('aid_app:dashboard')
-    except:
-        messages.error(request, 'Access denied. This page is for facility users only.')
-        return redirect('aid_app:dashboard')
-    
-    # Calculate Stats
+    # Calculate Stats (from the daily rollup, not the incident table)
     today = timezone.now().date()
     all_incidents = Incident.objects.all()
     
-    total_incidents = all_incidents.count()
-    critical_incidents = all_incidents.filter(severity='critical').count()
-    high_priority_incidents = all_incidents.filter(severity='high').count()
+    # Main Incident List, one page at a time
+    incidents = paginate_request(request, all_incidents.select_related('assigned_responder__user'))
+    if wants_json(request):
+        return JsonResponse(incidents.as_json(incident_json))
+    
+    severity_counts = IncidentDailyStats.objects.values('severity').annotate(count=Sum('total')).order_by()
+    severity_map = {item['severity']: item['count'] for item in severity_counts}
+
+    total_incidents = sum(severity_map.values())
+    critical_incidents = severity_map.get('critical', 0)
+    high_priority_incidents = severity_map.get('high', 0)
     resolved_today = all_incidents.filter(status='resolved', updated_at__date=today).count()
     
     # Chart Data 1: Incidents by Type
-    from django.db.models import Count
-    type_counts = all_incidents.values('incident_type').annotate(count=Count('incident_type')).order_by('-count')
+    type_counts = list(
+        IncidentDailyStats.objects.values('incident_type').annotate(count=Sum('total'))
+        .filter(count__gt=0).order_by('-count')
+    )
     
     # Process for template (calculate percentages)
     incidents_by_type = []
@@ -1597,9 +1335,6 @@ def facility_incident_log_view(request):
         })
         
     # Chart Data 2: Severity Distribution
-    severity_counts = all_incidents.values('severity').annotate(count=Count('severity'))
-    severity_map = {item['severity']: item['count'] for item in severity_counts}
-    
     severity_distribution = {
         'critical': severity_map.get('critical', 0),
         'high': severity_map.get('high', 0),
@@ -1607,12 +1342,10 @@ def facility_incident_log_view(request):
         'low': severity_map.get('low', 0),
     }
 
-    # Main Incident List
-    incidents = all_incidents.order_by('-created_at')
-
     context = {
         'user': request.user,
         'incidents': incidents,
+        'page': incidents,
         'total_incidents': total_incidents,
         'critical_incidents': critical_incidents,
         'high_priority_incidents': high_priority_incidents,
@@ -1628,7 +1361,7 @@ def facility_reports_view(request):
         return redirect('aid_app:login')
     
     # Check if user is facility
-    if not hasattr(request.user, 'profile') or (request.user.profile.role != 'facility' and request.user.profile.role != 'facility_manager'):
+    if request.role not in FACILITY_ROLES:
         messages.error(request, 'Access denied. This page is for facility users only.')
         return redirect('aid_app:dashboard')
 
@@ -1663,60 +1396,42 @@ def facility_reports_view(request):
 
     # Base Queryset
     incidents = Incident.objects.filter(created_at__date__gte=start_date, created_at__date__lte=end_date)
-    prev_incidents = Incident.objects.filter(created_at__date__gte=prev_start_date, created_at__date__lte=prev_end_date)
-
-    # --- CSV Export ---
-    if request.GET.get('export') == 'csv':
-        import csv
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = f'attachment; filename="facility_report_{start_date}_{end_date}.csv"'
-        
-        writer = csv.writer(response)
-        writer.writerow(['Incident ID', 'Type', 'Severity', 'Location', 'Status', 'Reported At', 'Resolved At', 'Responder'])
-        
-        for inc in incidents:
-            writer.writerow([
-                inc.incident_id,
-                inc.get_incident_type_display(),
-                inc.get_severity_display(),
-                inc.location,
-                inc.get_status_display(),
-                inc.created_at.strftime('%Y-%m-%d %H:%M'),
-                inc.resolved_at.strftime('%Y-%m-%d %H:%M') if inc.resolved_at else '-',
-                inc.assigned_responder.user.get_full_name() if inc.assigned_responder else 'Unassigned'
-            ])
-        return response
-
-    # --- Statistics Calculation ---
-    total_incidents = incidents.count()
-    prev_total = prev_incidents.count()
+
+    # --- Export (streamed: CSV or gzipped NDJSON) ---
+    if request.GET.get('export'):
+        response = stream_incident_export(
+            incidents, request.GET.get('export'), f'facility_report_{start_date}_{end_date}', request
+        )
+        if response is not None:
+            return response
+
+    # --- Statistics Calculation (summed from the daily rollup) ---
+    current_stats = IncidentDailyStats.totals(date__gte=start_date, date__lte=end_date)
+    prev_stats = IncidentDailyStats.totals(date__gte=prev_start_date, date__lte=prev_end_date)
+
+    total_incidents = current_stats['total']
+    prev_total = prev_stats['total']
     
     # Critical Incidents
-    critical_incidents = incidents.filter(severity='critical').count()
-    prev_critical = prev_incidents.filter(severity='critical').count()
+    critical_incidents = IncidentDailyStats.totals(
+        date__gte=start_date, date__lte=end_date, severity='critical'
+    )['total']
+    prev_critical = IncidentDailyStats.totals(
+        date__gte=prev_start_date, date__lte=prev_end_date, severity='critical'
+    )['total']
     
     # Response Rate (Resolved / Total)
-    resolved_count = incidents.filter(status='resolved').count()
+    resolved_count = current_stats['resolved_count']
     response_rate = (resolved_count / total_incidents * 100) if total_incidents > 0 else 0
     
-    prev_resolved = prev_incidents.filter(status='resolved').count()
+    prev_resolved = prev_stats['resolved_count']
     prev_rate = (prev_resolved / prev_total * 100) if prev_total > 0 else 0
     
-    # Avg Response Time (only for resolved incidents with response time)
-    response_times = []
-    for inc in incidents:
-        if inc.resolved_at and inc.created_at:
-            mins = (inc.resolved_at - inc.created_at).total_seconds() / 60
-            response_times.append(mins)
-    
-    avg_response_time = sum(response_times) / len(response_times) if response_times else 0
-    
-    prev_times = []
-    for inc in prev_incidents:
-        if inc.resolved_at and inc.created_at:
-            mins = (inc.resolved_at - inc.created_at).total_seconds() / 60
-            prev_times.append(mins)
-    prev_avg_time = sum(prev_times) / len(prev_times) if prev_times else 0
+    # Avg Response Time (only for incidents with a resolution time)
+    avg_response_time = current_stats['avg_response_minutes']
+    prev_avg_time = prev_stats['avg_response_minutes']
+    # Median / P90 need the individual durations, computed in the database
+    response_summary = response_time_summary(incidents)
 
     # formatting changes
     total_change = ((total_incidents - prev_total) / prev_total * 100) if prev_total > 0 else 0
@@ -1727,7 +1442,10 @@ def facility_reports_view(request):
     # --- Charts Data ---
     
     # 1. Distribution by Type
-    type_stats = incidents.values('incident_type').annotate(count=Count('id')).order_by('-count')
+    type_stats = (
+        IncidentDailyStats.objects.filter(date__gte=start_date, date__lte=end_date)
+        .values('incident_type').annotate(count=Sum('total')).order_by('-count')
+    )
     # Initialize with all model choices to ensure 0-counts are shown if desired, or at least consistent color mapping order
     dist_data = {t: 0 for t in ['medical', 'fire', 'accident', 'crime', 'natural', 'other']}
     for stat in type_stats:
@@ -1755,7 +1473,10 @@ def facility_reports_view(request):
 
     # 2. Trends (Vol Over Time) - Last 7 days of the selected range (or filtered view)
     chart_start = end_date - timedelta(days=6)
-    chart_incidents = Incident.objects.filter(created_at__date__gte=chart_start, created_at__date__lte=end_date)
+    chart_rows = (
+        IncidentDailyStats.objects.filter(date__gte=chart_start, date__lte=end_date)
+        .values('date', 'incident_type').annotate(count=Sum('total')).order_by()
+    )
     
     daily_stats = {} 
     d_ptr = chart_start
@@ -1763,11 +1484,11 @@ def facility_reports_view(request):
         daily_stats[d_ptr.strftime('%Y-%m-%d')] = {t: 0 for t in ['medical', 'fire', 'accident', 'crime', 'natural', 'other']}
         d_ptr += timedelta(days=1)
         
-    for inc in chart_incidents:
-        d_key = inc.created_at.strftime('%Y-%m-%d')
-        t_key = inc.incident_type
+    for row in chart_rows:
+        d_key = row['date'].strftime('%Y-%m-%d')
+        t_key = row['incident_type']
         if d_key in daily_stats and t_key in daily_stats[d_key]:
-            daily_stats[d_key][t_key] += 1
+            daily_stats[d_key][t_key] += row['count']
             
     trend_chart_data = []
     # Find global max for scaling
@@ -1816,6 +1537,9 @@ def facility_reports_view(request):
         'rate_change_pos': rate_change >= 0,
         
         'avg_response_time': round(avg_response_time, 1),
+        'median_response_time': round(response_summary['resolution']['median'], 1),
+        'p90_response_time': round(response_summary['resolution']['p90'], 1),
+        'median_on_scene_time': round(response_summary['on_scene']['median'], 1),
         'time_change': round(abs(time_change), 1),
         'time_change_pos': time_change <= 0, # Faster is better (neg change in time is good)
         
@@ -1832,30 +1556,22 @@ def facility_reports_view(request):
     return render(request, 'facility manager/facility_reports.html', context)
 
 @login_required
+@role_required(*FACILITY_ROLES, message='Access denied. This page is for facility users only.')
 def facility_notifications_view(request):
-    # Check if user is facility
-    try:
-        user_profile = request.user.profile
-        if user_profile.role != 'facility' and user_profile.role != 'facility_manager':
-            messages.error(request, 'Access denied. This page is for facility users only.')
-            return redirect('aid_app:dashboard')
-    except:
-        messages.error(request, 'Access denied. This page is for facility users only.')
-        return redirect('aid_app:dashboard')
-    
     # Get user's notifications
     all_notifs = Notification.objects.filter(recipient=request.user).order_by('-created_at')
     
-    # Active = Unread
-    active_notifications = all_notifs.filter(is_read=False)
+    # Active = Unread, a coalesced alert raised again moves back up
+    active_notifications = all_notifs.filter(is_read=False).select_related('related_incident').order_by('-last_occurred_at')
     
     # History = Read (Last 20)
     history_notifications = all_notifs.filter(is_read=True)[:20]
 
-    # Stats
-    critical_alerts = active_notifications.filter(notification_type='critical').count()
-    high_priority = active_notifications.filter(notification_type='high').count()
-    info_alerts = active_notifications.filter(notification_type='info').count()
+    # Stats (from the unread counters, not the notification table)
+    unread = NotificationCounter.unread_counts(request.user)
+    critical_alerts = unread['critical']
+    high_priority = unread['high']
+    info_alerts = unread['info']
     
     # Resolved Today (Incidents)
     today = timezone.now().date()
@@ -1875,33 +1591,19 @@ def facility_notifications_view(request):
 def mark_notification_read(request, notification_id):
     if request.method == 'POST':
         notif = get_object_or_404(Notification, id=notification_id, recipient=request.user)
-        notif.is_read = True
-        notif.save()
+        mark_read(notif)
         return JsonResponse({'status': 'success'})
     return JsonResponse({'status': 'error'}, status=400)
 
 @login_required
 def mark_all_notifications_read(request):
     if request.method == 'POST':
-        Notification.objects.filter(recipient=request.user, is_read=False).update(is_read=True)
+        mark_all_read(request.user)
         return JsonResponse({'status': 'success'})
     return JsonResponse({'status': 'error'}, status=400)
 
+@role_required(*FACILITY_ROLES, message='Access denied. This page is for facility users only.')
 def facility_profile_view(request):
-    if not request.user.is_authenticated:
-        messages.error(request, 'Please login to access this page.')
-        return redirect('aid_app:login')
-    
-    # Check if user is facility
-    try:
-        user_profile = request.user.profile
-        if user_profile.role != 'facility' and user_profile.role != 'facility_manager':
-            messages.error(request, 'Access denied. This page is for facility users only.')
-            return redirect('aid_app:dashboard')
-    except:
-        messages.error(request, 'Access denied. This page is for facility users only.')
-        return redirect('aid_app:dashboard')
-    
     if request.method == 'POST':
         try:
             # 1. Handle Password Change
@@ -1965,19 +1667,10 @@ def delete_facility_account(request):
     return redirect('aid_app:login')
 
 @login_required
+@role_required(*FACILITY_ROLES, message='Access denied. Only facility managers can add guides.', redirect_to='aid_app:facility_dashboard')
 def add_guide_view(request):
     """View to add a new First Aid Guide."""
     from .models import FirstAidGuide
-    
-    # Check if user is facility
-    try:
-        user_profile = request.user.profile
-        if user_profile.role != 'facility' and user_profile.role != 'facility_manager':
-            messages.error(request, 'Access denied. Only facility managers can add guides.')
-            return redirect('aid_app:facility_dashboard')
-    except UserProfile.DoesNotExist:
-        messages.error(request, 'Access denied. Only facility managers can add guides.')
-        return redirect('aid_app:facility_dashboard')
 
     if request.method == 'POST':
         title = request.POST.get('title')
@@ -2003,22 +1696,10 @@ def add_guide_view(request):
             
     return render(request, 'facility manager/add_guide_new.html')
 
+@query_budget(15)
+@role_required('responder', message='Access denied. This dashboard is for responders only.', login_message='Please login to access your dashboard.')
 def responder_dashboard_view(request):
     """Renders the responder dashboard."""
-    if not request.user.is_authenticated:
-        messages.error(request, 'Please login to access your dashboard.')
-        return redirect('aid_app:login')
-    
-    # Check if user is responder using profile role
-    try:
-        user_role = request.user.profile.role
-        if user_role != 'responder':
-            messages.error(request, 'Access denied. This dashboard is for responders only.')
-            return redirect('aid_app:dashboard')
-    except UserProfile.DoesNotExist:
-        messages.error(request, 'Access denied. This dashboard is for responders only.')
-        return redirect('aid_app:dashboard')
-    
     today = timezone.now().date()
     today_start = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
     
@@ -2107,28 +1788,11 @@ def responder_dashboard_view(request):
         status__in=['resolved', 'closed'],
         resolved_at__date=today
     )
-    
-    total_response_seconds = 0
-    response_count = 0
-    
-    for inc in handled_incidents:
-        start_time = inc.created_at
-        end_time = inc.resolved_at # Default fall back
-        
-        # Try to find 'on_scene' time from history
-        on_scene_history = inc.status_history.filter(status='on_scene').order_by('timestamp').first()
-        if on_scene_history:
-            end_time = on_scene_history.timestamp
-            
-        if start_time and end_time:
-             diff = (end_time - start_time).total_seconds()
-             total_response_seconds += diff
-             response_count += 1
+    arrival = duration_summary(handled_incidents, ARRIVAL)
              
     avg_response_str = "0 min"
-    if response_count > 0:
-        avg_minutes = (total_response_seconds / response_count) / 60
-        avg_response_str = f"{round(avg_minutes, 1)} min"
+    if arrival['count'] > 0:
+        avg_response_str = f"{round(arrival['mean'], 1)} min"
 
     # 4. Today's Rating
     from django.db.models import Avg
@@ -2157,21 +1821,10 @@ def responder_dashboard_view(request):
     
     return render(request, 'responder/responder_dashboard.html', context)
 
+@query_budget(8)
+@role_required('responder', message='Access denied. This page is for responders only.')
 def available_incidents_view(request):
     """Renders the available incidents page for responders."""
-    if not request.user.is_authenticated:
-        messages.error(request, 'Please login to access this page.')
-        return redirect('aid_app:login')
-    
-    try:
-        user_role = request.user.profile.role
-        if user_role != 'responder':
-            messages.error(request, 'Access denied. This page is for responders only.')
-            return redirect('aid_app:dashboard')
-    except UserProfile.DoesNotExist:
-        messages.error(request, 'Access denied. This page is for responders only.')
-        return redirect('aid_app:dashboard')
-    
     try:
         responder, created = Responder.objects.get_or_create(
             user=request.user,
@@ -2194,6 +1847,29 @@ def available_incidents_view(request):
     }
     return render(request, 'responder/available_incidents.html', context)
 
+@no_request_metrics
+async def incident_feed_view(request):
+    """Server-Sent Events stream of new, claimed and status-changed incidents."""
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({'success': False, 'error': 'Unauthorized'}, status=401)
+
+    role = await UserProfile.objects.filter(user=user).values_list('role', flat=True).afirst()
+    if role != 'responder' and not user.is_staff:
+        return JsonResponse({'success': False, 'error': 'Access denied'}, status=403)
+
+    # Streaming only works under ASGI; 204 tells EventSource not to reconnect
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+
+    last_event_id = parse_last_event_id(
+        request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    )
+    response = StreamingHttpResponse(incident_feed.stream(last_event_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Don't let nginx buffer the stream
+    return response
+
 def accept_incident_view(request):
     """Handles accepting an incident."""
     if not request.user.is_authenticated:
@@ -2233,27 +1909,24 @@ def accept_incident_view(request):
     incident_pk = incident_id_str.replace('INC-', '') if 'INC-' in incident_id_str else incident_id_str
 
     try:
-        incident = Incident.objects.get(id=int(incident_pk))
-    except (Incident.DoesNotExist, ValueError) as e:
+        incident_pk = int(incident_pk)
+    except ValueError:
         messages.error(request, 'Incident not found.')
         return redirect('aid_app:available_incidents')
 
-
-
-    if incident.assigned_responder:
-        messages.error(request, 'Incident already assigned to another responder.')
+    # Claim with a single conditional UPDATE - only one responder can win
+    if not claim_incident(incident_pk, responder):
+        if Incident.objects.filter(pk=incident_pk).exists():
+            messages.error(request, 'Incident already assigned to another responder.')
+        else:
+            messages.error(request, 'Incident not found.')
         return redirect('aid_app:available_incidents')
-
-    # Assign
-    incident.assigned_responder = responder
-    incident.status = 'en_route' # Initial status when accepted
-    incident.save()
     
     # Update responder status
     responder.status = 'on_duty' # or unavailable? usually 'on_duty' implies working on something
     responder.save()
 
-    messages.success(request, f'Incident {incident.incident_id} accepted. Proceed to location.')
+    messages.success(request, f'Incident INC-{incident_pk:03d} accepted. Proceed to location.')
     return redirect('aid_app:responder_dashboard')
 
 def update_incident_status_view(request):
@@ -2344,20 +2017,10 @@ def update_incident_status_view(request):
     }
     return render(request, 'responder/update_incident_status.html', context)
 
+@query_budget(12)
+@role_required('responder', message='Access denied. This page is for responders only.')
 def responder_history_view(request):
     """Renders the responder history page."""
-    if not request.user.is_authenticated:
-        messages.error(request, 'Please login to access this page.')
-        return redirect('aid_app:login')
-    
-    try:
-        user_role = request.user.profile.role
-        if user_role != 'responder':
-            messages.error(request, 'Access denied. This page is for responders only.')
-            return redirect('aid_app:dashboard')
-    except UserProfile.DoesNotExist:
-        return redirect('aid_app:dashboard')
-    
     try:
         responder, created = Responder.objects.get_or_create(
             user=request.user,
@@ -2381,23 +2044,9 @@ def responder_history_view(request):
     resolved_incidents = incidents.filter(status__in=['resolved', 'closed'], resolved_at__isnull=False)
     avg_response_str = "0m"
     
-    if resolved_incidents.exists():
-        total_minutes = 0
-        count_time = 0
-        for inc in resolved_incidents:
-            if inc.created_at and inc.resolved_at:
-                diff = inc.resolved_at - inc.created_at
-                total_minutes += diff.total_seconds() / 60
-                count_time += 1
-        
-        if count_time > 0:
-            avg_minutes = total_minutes / count_time
-            if avg_minutes >= 60:
-                hours = int(avg_minutes // 60)
-                mins = int(avg_minutes % 60)
-                avg_response_str = f"{hours}h {mins}m"
-            else:
-                avg_response_str = f"{int(avg_minutes)}m"
+    resolution = duration_summary(resolved_incidents, RESOLUTION)
+    if resolution['count'] > 0:
+        avg_response_str = format_minutes(resolution['mean'])
 
     # Calculate Avg Rating (based on approved feedback)
     from django.db.models import Avg
@@ -2420,21 +2069,9 @@ def responder_history_view(request):
     }
     return render(request, 'responder/responder_history.html', context)
 
+@role_required('responder', message='Access denied. This page is for responders only.')
 def availability_status_view(request):
     """Renders the availability status page for responders."""
-    if not request.user.is_authenticated:
-        messages.error(request, 'Please login to access this page.')
-        return redirect('aid_app:login')
-    
-    try:
-        user_role = request.user.profile.role
-        if user_role != 'responder':
-            messages.error(request, 'Access denied. This page is for responders only.')
-            return redirect('aid_app:dashboard')
-    except UserProfile.DoesNotExist:
-        messages.error(request, 'Access denied. This page is for responders only.')
-        return redirect('aid_app:dashboard')
-    
     try:
         responder, created = Responder.objects.get_or_create(
             user=request.user,
@@ -2490,6 +2127,12 @@ def toggle_responder_status(request):
         
         new_status = 'available' if desired_active else 'unavailable'
         responder.status = new_status
+
+        # Browser may send the responder's current position along with the toggle
+        latitude, longitude = parse_coordinates(data.get('latitude'), data.get('longitude'))
+        if latitude is not None:
+            responder.latitude = latitude
+            responder.longitude = longitude
         responder.save()
         
         return JsonResponse({'success': True, 'status': new_status})
@@ -2497,21 +2140,9 @@ def toggle_responder_status(request):
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
+@role_required('responder', message='Access denied. This page is for responders only.')
 def responder_profile_view(request):
     """Renders the responder profile page."""
-    if not request.user.is_authenticated:
-        messages.error(request, 'Please login to access this page.')
-        return redirect('aid_app:login')
-    
-    try:
-        user_role = request.user.profile.role
-        if user_role != 'responder':
-            messages.error(request, 'Access denied. This page is for responders only.')
-            return redirect('aid_app:dashboard')
-    except UserProfile.DoesNotExist:
-        messages.error(request, 'Access denied. This page is for responders only.')
-        return redirect('aid_app:dashboard')
-    
     context = {
         'user': request.user,
     }
@@ -2525,7 +2156,7 @@ def feedback_received_view(request):
     
     try:
         # Check role
-        if request.user.profile.role != 'responder':
+        if request.role != 'responder':
             messages.error(request, 'Access denied. This page is for responders only.')
             return redirect('aid_app:dashboard')
         
@@ -2962,6 +2593,7 @@ def change_password_view(request):
 
 @login_required
 @require_http_methods(["POST"])
+@api_role_required('responder', message='Only responders can trigger alerts.')
 def trigger_medical_alert(request):
     """Responder triggers an urgent medical alert (e.g., blood loss)."""
     try:
@@ -2970,36 +2602,33 @@ def trigger_medical_alert(request):
         alert_type = data.get('alert_type', 'critical')
         notes = data.get('notes', 'Urgent medical attention required.')
 
-        incident = get_object_or_404(Incident, incident_id=incident_id)
-        
-        # Verify responder is assigned
-        if not request.user.profile.role == 'responder':
-             return JsonResponse({'success': False, 'message': 'Only responders can trigger alerts.'}, status=403)
+        # The dashboard sends the display id ("INC-042"); incident_id is a property, not a column
+        pk = str(incident_id or '').removeprefix('INC-')
+        if not pk.isdigit():
+            return JsonResponse({'success': False, 'message': 'Unknown incident.'}, status=404)
+        incident = get_object_or_404(Incident, pk=pk)
 
-        # Create critical notifications for ALL facility managers
-        facility_managers = UserProfile.objects.filter(role='facility_manager')
-        notification_count = 0
-        
-        for manager in facility_managers:
-            title = f"URGENT: Blood Loss Reported - {incident.incident_id}" if alert_type == 'blood_loss' else f"URGENT: Critical Alert - {incident.incident_id}"
-            
-            Notification.objects.create(
-                recipient=manager.user,
-                title=title,
-                message=f"Responder reported critical condition: {notes}. Location: {incident.location}",
-                notification_type='critical',
-                category='incident',
-                related_incident=incident
-            )
-            notification_count += 1
+        # Queue one critical notification for ALL facility managers (delivered by the outbox worker)
+        title = f"URGENT: Blood Loss Reported - {incident.incident_id}" if alert_type == 'blood_loss' else f"URGENT: Critical Alert - {incident.incident_id}"
+        fan_out(
+            'facility',
+            title=title,
+            message=f"Responder reported critical condition: {notes}. Location: {incident.location}",
+            notification_type='critical',
+            category='medical_alert',
+            related_incident=incident,
+            # Repeated presses for the incident update the managers' existing alert
+            coalesce=True,
+        )
             
-        return JsonResponse({'success': True, 'message': f'Alert sent to {notification_count} facility managers.'})
+        return JsonResponse({'success': True, 'message': 'Alert sent to facility managers.'})
 
     except Exception as e:
         return JsonResponse({'success': False, 'message': str(e)}, status=500)
 
 @login_required
 @require_http_methods(["POST"])
+@api_role_required('facility_manager', message='Access denied.')
 def forward_medical_alert(request):
     """Facility Manager forwards alert to Admins."""
     try:
@@ -3007,26 +2636,19 @@ def forward_medical_alert(request):
         incident_id = data.get('incident_id')
         
         incident = get_object_or_404(Incident, id=incident_id)
-        
-        # Verify user is facility manager
-        if not request.user.profile.role == 'facility_manager':
-             return JsonResponse({'success': False, 'message': 'Access denied.'}, status=403)
-
-        # Notify Admins
-        admins = User.objects.filter(is_staff=True)
-        count = 0
-        for admin in admins:
-            Notification.objects.create(
-                recipient=admin,
-                title=f"ESCALATED: Blood Donor Required - {incident.incident_id}",
-                message=f"Facility Manager escalated urgent blood request. Incident at {incident.location}. Please check donor availability.",
-                notification_type='critical',
-                category='system',
-                related_incident=incident
-            )
-            count += 1
+
+        # Notify Admins (delivered by the outbox worker)
+        fan_out(
+            'staff',
+            title=f"ESCALATED: Blood Donor Required - {incident.incident_id}",
+            message=f"Facility Manager escalated urgent blood request. Incident at {incident.location}. Please check donor availability.",
+            notification_type='critical',
+            category='medical_alert',
+            related_incident=incident,
+            coalesce=True,
+        )
             
-        return JsonResponse({'success': True, 'message': f'Escalated to {count} admins.'})
+        return JsonResponse({'success': True, 'message': 'Escalated to admins.'})
 
     except Exception as e:
         return JsonResponse({'success': False, 'message': str(e)}, status=500)
@@ -3106,6 +2728,7 @@ def report_incident_view(request):
         people_involved = request.POST.get('peopleInvolved', '1')
         description = request.POST.get('description')
         immediate_action = request.POST.get('immediateAction', '')
+        latitude, longitude = parse_coordinates(request.POST.get('latitude'), request.POST.get('longitude'))
         
         # Validate required fields
         if not all([incident_type, severity, location, contact_phone, description]):
@@ -3124,6 +2747,8 @@ def report_incident_view(request):
                 incident_type=incident_type,
                 severity=severity,
                 location=location,
+                latitude=latitude,
+                longitude=longitude,
                 description=description,
                 contact_phone=contact_phone,
                 people_involved=int(people_involved) if people_involved else 1,
@@ -3151,22 +2776,29 @@ def first_aid_guides_view(request):
     
     return render(request, 'user/first_aid_guides_complete.html', {'dynamic_guides': dynamic_guides})
 
+@query_budget(6)
 def buy_products_view(request):
     """Renders the buy products page with medical supplies and equipment."""
     if not request.user.is_authenticated:
         return redirect('aid_app:login')
     
-    # Get all active products from both sellers and facility managers
-    products = Product.objects.filter(status='active').order_by('-created_at')
-    
-    # Debug: Print product count to console
-    print(f"DEBUG: Found {products.count()} active products")
-    for product in products:
-        print(f"DEBUG: Product - {product.name} by {product.seller.username} (Status: {product.status})")
+    # One page of active products from both sellers and facility managers, with facet counts
+    filters = {
+        'search': request.GET.get('q', ''),
+        'category': request.GET.get('category', ''),
+        'condition': request.GET.get('condition', ''),
+    }
+    try:
+        catalog = catalog_page(cursor=request.GET.get('cursor'), **filters)
+    except InvalidCursor:
+        catalog = catalog_page(**filters)
+    for choice in catalog['facets']['categories']:
+        choice['icon'] = CATEGORY_ICONS.get(choice['value'], 'category')
     
     context = {
         'user': request.user,
-        'products': products,
+        'products': catalog['products'],
+        'catalog': catalog,
     }
     return render(request, 'user/buy_products_new.html', context)
 
@@ -3222,43 +2854,12 @@ def process_checkout(request):
             if not cart:
                 return JsonResponse({'success': False, 'message': 'Cart is empty'}, status=400)
                 
-            # First pass: Validate all stock
-            for item in cart:
-                try:
-                    product = Product.objects.get(id=item.get('id'))
-                    quantity = int(item.get('quantity', 0))
-                    if product.stock_quantity < quantity:
-                        return JsonResponse({
-                            'success': False, 
-                            'message': f'Insufficient stock for {product.name}. Available: {product.stock_quantity}'
-                        }, status=400)
-                except Product.DoesNotExist:
-                    return JsonResponse({'success': False, 'message': 'One or more products not found'}, status=400)
-            
-            # Second pass: Process orders
-            order_ids = []
-            for item in cart:
-                product = Product.objects.get(id=item.get('id'))
-                quantity = int(item.get('quantity', 0))
-                
-                # Deduct stock
-                product.stock_quantity -= quantity
-                product.save()
-                
-                # Create Order
-                order = Order.objects.create(
-                    customer=request.user,
-                    product=product,
-                    quantity=quantity,
-                    total_price=product.price * quantity,
-                    status='processing'
-                )
-                order_ids.append(order.order_id)
-                
-                # Check for low stock alert (simplified)
-                if product.stock_quantity < 5:
-                    # In a real app, send notification to admin
-                    pass
+            # Reserve stock and create the orders in one transaction
+            try:
+                orders = place_orders(request.user, cart)
+            except CheckoutError as e:
+                return JsonResponse({'success': False, 'message': str(e), 'failures': e.failures}, status=400)
+            order_ids = [order.order_id for order in orders]
             
             return JsonResponse({'success': True, 'order_ids': order_ids})
             
@@ -3282,24 +2883,25 @@ def track_responder_view(request):
 @login_required
 def order_history_view(request):
     """Renders the order history page with all user orders."""
-    # Fetch all orders (active and history)
-    orders = Order.objects.filter(customer=request.user).order_by('-created_at')
+    # Fetch all orders (active and history), one page at a time
+    orders = Order.objects.filter(customer=request.user)
+    page = paginate_request(request, orders.select_related('customer', 'product'))
+    if wants_json(request):
+        return JsonResponse(page.as_json(order_json))
     
     # Calculate stats
-    total_orders = orders.count()
-    in_transit = orders.filter(status='shipped').count()
-    delivered = orders.filter(status='delivered').count()
-    processing = orders.filter(status__in=['pending', 'processing']).count()
+    stats = orders.aggregate(
+        total=Count('id'),
+        in_transit=Count('id', filter=Q(status='shipped')),
+        delivered=Count('id', filter=Q(status='delivered')),
+        processing=Count('id', filter=Q(status__in=['pending', 'processing'])),
+    )
     
     context = {
-        'orders': orders,
+        'orders': page,
+        'page': page,
         'user': request.user,
-        'stats': {
-            'total': total_orders,
-            'in_transit': in_transit,
-            'delivered': delivered,
-            'processing': processing
-        }
+        'stats': stats,
     }
     return render(request, 'user/order_history_new.html', context)
 
@@ -3313,16 +2915,13 @@ def profile_view(request):
         return redirect('aid_app:admin_dashboard')
     
     # Check roles from UserProfile
-    try:
-        user_role = request.user.profile.role
-        if user_role == 'facility' or user_role == 'facility_manager':
-            return redirect('aid_app:facility_profile')
-        elif user_role == 'seller':
-            return redirect('aid_app:seller_profile')
-        elif user_role == 'responder':
-            return redirect('aid_app:responder_profile')
-    except:
-        pass # Default to standard user profile
+    if request.role in FACILITY_ROLES:
+        return redirect('aid_app:facility_profile')
+    elif request.role == 'seller':
+        return redirect('aid_app:seller_profile')
+    elif request.role == 'responder':
+        return redirect('aid_app:responder_profile')
+    # Default to standard user profile
         
     return render(request, 'user/user_profile.html', {'user': request.user})
 
@@ -3435,22 +3034,25 @@ def incident_history_view(request):
         messages.error(request, 'Please login to view incident history.')
         return redirect('aid_app:login')
     
-    # Get incidents only for the logged-in user
+    # Get incidents only for the logged-in user, one page at a time
     user_incidents = Incident.objects.filter(user=request.user)
+    page = paginate_request(request, user_incidents.select_related('assigned_responder__user'))
+    if wants_json(request):
+        return JsonResponse(page.as_json(incident_json))
     
     # Calculate statistics
-    total_incidents = user_incidents.count()
-    resolved_incidents = user_incidents.filter(status='resolved').count()
-    in_progress_incidents = user_incidents.filter(status='in_progress').count()
-    critical_incidents = user_incidents.filter(severity='critical', status__in=['open', 'in_progress']).count()
+    stats = user_incidents.aggregate(
+        total_incidents=Count('id'),
+        resolved_incidents=Count('id', filter=Q(status='resolved')),
+        in_progress_incidents=Count('id', filter=Q(status='in_progress')),
+        critical_incidents=Count('id', filter=Q(severity='critical', status__in=['open', 'in_progress'])),
+    )
     
     context = {
         'user': request.user,
-        'incidents': user_incidents,
-        'total_incidents': total_incidents,
-        'resolved_incidents': resolved_incidents,
-        'in_progress_incidents': in_progress_incidents,
-        'critical_incidents': critical_incidents,
+        'incidents': page,
+        'page': page,
+        **stats,
     }
     return render(request, 'user/incident_history.html', context)
 
@@ -3549,6 +3151,7 @@ def reply_feedback_view(request, feedback_id):
             
     return redirect('aid_app:feedback_analysis')
 
+@query_budget(15)
 def admin_dashboard_view(request):
     """Renders the admin dashboard for admin users."""
     if not request.user.is_authenticated:
@@ -3561,18 +3164,9 @@ def admin_dashboard_view(request):
         return redirect('aid_app:dashboard')
     
     # Calculate real performance metrics
-    # Average response time for resolved incidents (in minutes)
-    resolved_incidents = Incident.objects.filter(status='resolved')
-    total_response_time = 0
-    response_count = 0
-    
-    for incident in resolved_incidents:
-        if incident.resolved_at and incident.created_at:
-            response_minutes = (incident.resolved_at - incident.created_at).total_seconds() / 60
-            total_response_time += response_minutes
-            response_count += 1
-    
-    avg_response_time = round(total_response_time / response_count, 1) if response_count > 0 else 0.0
+    # Average response time for resolved incidents (in minutes), from the daily rollup
+    incident_stats = IncidentDailyStats.totals()
+    avg_response_time = round(incident_stats['avg_response_minutes'], 1)
     
     # User satisfaction (average rating from feedback)
     feedback_ratings = Feedback.objects.filter(rating__isnull=False)
@@ -3581,7 +3175,7 @@ def admin_dashboard_view(request):
     avg_satisfaction = round(total_rating / feedback_count, 1) if feedback_count > 0 else 0.0
     
     # System uptime / Health (Calculate as % of responders currently available/on-duty)
-    total_incidents = Incident.objects.count()
+    total_incidents = incident_stats['total']
     total_responders = Responder.objects.count()
     active_responders_count = Responder.objects.filter(status__in=['available', 'on_duty']).count()
     
@@ -3601,7 +3195,7 @@ def admin_dashboard_view(request):
     
     context = {
         'total_users': User.objects.count(),
-        'active_alerts': Incident.objects.filter(status__in=['open', 'in_progress']).count(),
+        'active_alerts': incident_stats['open_count'] + incident_stats['in_progress_count'],
         'total_incidents': total_incidents,
         'response_time': avg_response_time, 
         'active_responders': Responder.objects.filter(status='on_duty').count(),
@@ -3872,21 +3466,28 @@ def view_all_incidents_view(request):
         messages.error(request, 'You do not have permission to access this page.')
         return redirect('aid_app:dashboard')
     
+    page = paginate_request(request, Incident.objects.select_related('assigned_responder__user', 'user'))
+    if wants_json(request):
+        return JsonResponse(page.as_json(incident_json))
+    
+    # Counts from the daily rollup, not the incident table
+    all_time = IncidentDailyStats.totals()
     context = {
-        'active_incidents': Incident.objects.filter(status__in=['open', 'in_progress']).count(),
-        'total_today': Incident.objects.filter(created_at__date=datetime.now().date()).count(),
-        'critical_incidents': Incident.objects.filter(severity='critical').count(),
-        'incidents': Incident.objects.select_related('assigned_responder', 'user').all().order_by('-created_at'),
-        'responders': Responder.objects.filter(status__in=['available', 'on_duty']),
+        'active_incidents': all_time['open_count'] + all_time['in_progress_count'],
+        'total_today': IncidentDailyStats.totals(date=timezone.localdate())['total'],
+        'critical_incidents': IncidentDailyStats.totals(severity='critical')['total'],
+        'incidents': page,
+        'page': page,
+        'responders': Responder.objects.filter(status__in=['available', 'on_duty']).select_related('user'),
         'user': request.user,
     }
     return render(request, 'admin/view_all_incidents.html', context)
 
 @login_required
 def assign_incident_view(request, incident_id):
-    """Assigns a responder to an incident via AJAX."""
+    """Assigns a responder to an incident via AJAX (admins, and facility managers dispatching)."""
     import json # Ensure import
-    if not request.user.is_staff and not request.user.is_superuser:
+    if not request.user.is_staff and not request.user.is_superuser and request.role not in FACILITY_ROLES:
         return JsonResponse({'success': False, 'message': 'Permission denied'}, status=403)
         
     if request.method != 'POST':
@@ -3897,6 +3498,13 @@ def assign_incident_view(request, incident_id):
         responder_id = data.get('responder_id')
         
         incident = get_object_or_404(Incident, id=incident_id)
+
+        # Auto dispatch: pick the nearest available responder
+        if data.get('auto') and not responder_id:
+            nearest = nearest_responders(incident, k=1)
+            if not nearest:
+                return JsonResponse({'success': False, 'message': 'No available responders nearby.'}, status=404)
+            responder_id = nearest[0].id
         
         if responder_id:
             responder = get_object_or_404(Responder, id=responder_id)
@@ -3904,7 +3512,7 @@ def assign_incident_view(request, incident_id):
             
             # Auto-update status if it was open
             if incident.status == 'open':
-                incident.status = 'in_progress'
+                incident.status = 'en_route'
                 
             incident.save()
             return JsonResponse({'success': True, 'message': f'Assigned to {responder.user.get_full_name()}'})
@@ -3927,18 +3535,36 @@ def incident_reports_view(request):
         messages.error(request, 'You do not have permission to access this page.')
         return redirect('aid_app:dashboard')
     
-    today = datetime.now()
-    # Get statistics for user-reported incidents
+    page = paginate_request(request, Incident.objects.select_related('assigned_responder__user', 'user'))
+    if wants_json(request):
+        return JsonResponse(page.as_json(incident_json))
+    
+    today = timezone.localdate()
+    # Get statistics for user-reported incidents (from the daily rollup)
+    all_time = IncidentDailyStats.totals()
     context = {
-        'total_reports': Incident.objects.count(),  # Total user-reported incidents
-        'reports_this_month': Incident.objects.filter(created_at__month=today.month, created_at__year=today.year).count(),
-        'pending_reviews': Incident.objects.filter(status='open').count(),
+        'total_reports': all_time['total'],  # Total user-reported incidents
+        'reports_this_month': IncidentDailyStats.totals(date__year=today.year, date__month=today.month)['total'],
+        'pending_reviews': all_time['open_count'],
         'downloads_today': 0,  # Placeholder, as we don't track downloads yet
-        'reports': Incident.objects.select_related('assigned_responder', 'user').all().order_by('-created_at'),
+        'reports': page,
+        'page': page,
         'user': request.user,
     }
     return render(request, 'admin/incident_reports.html', context)
 
+@login_required
+@require_http_methods(["GET", "POST"])
+def request_metrics_view(request):
+    """API endpoint with the per-view query and latency histograms of this process. POST resets them."""
+    if not request.user.is_staff and not request.user.is_superuser:
+        return JsonResponse({'success': False, 'message': 'Permission denied.'}, status=403)
+
+    if request.method == 'POST':
+        request_metrics.reset()
+        return JsonResponse({'success': True, 'message': 'Request metrics reset.'})
+    return JsonResponse(request_metrics.snapshot())
+
 @login_required
 @require_http_methods(["POST"])
 def update_responder_view(request, responder_id):
@@ -3956,6 +3582,8 @@ def update_responder_view(request, responder_id):
             responder.phone = data['phone']
         if 'location' in data:
             responder.current_location = data['location']
+        if 'latitude' in data and 'longitude' in data:
+            responder.latitude, responder.longitude = parse_coordinates(data['latitude'], data['longitude'])
         if 'status' in data:
             responder.status = data['status']
             
@@ -4109,6 +3737,8 @@ def update_responder_view(request, responder_id):
             responder.phone = data['phone']
         if 'location' in data:
             responder.current_location = data['location']
+        if 'latitude' in data and 'longitude' in data:
+            responder.latitude, responder.longitude = parse_coordinates(data['latitude'], data['longitude'])
         if 'status' in data:
             responder.status = data['status']
             
@@ -4150,14 +3780,18 @@ def marketplace_monitor_view(request):
         messages.error(request, 'You do not have permission to access this page.')
         return redirect('aid_app:dashboard')
     
-    total_revenue = Order.objects.aggregate(Sum('total_price'))['total_price__sum'] or 0
+    page = paginate_request(request, Product.objects.select_related('seller'))
+    if wants_json(request):
+        return JsonResponse(page.as_json(product_json))
+    
+    order_stats = Order.objects.aggregate(total_orders=Count('id'), total_revenue=Sum('total_price', default=0))
     
     context = {
-        'total_orders': Order.objects.count(),
-        'total_revenue': total_revenue,
+        **order_stats,
         'active_listings': Product.objects.filter(status='active').count(),
         'active_sellers': UserProfile.objects.filter(role='seller').count(),
-        'products': Product.objects.all().select_related('seller'),
+        'products': page,
+        'page': page,
         'user': request.user,
     }
     return render(request, 'admin/marketplace_monitor.html', context)
@@ -4175,14 +3809,17 @@ def system_reports_view(request):
     today = datetime.now()
     month_start = today.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
     
-    # Calculate stats
-    total_incidents = Incident.objects.count()
-    incidents_this_month = Incident.objects.filter(created_at__gte=month_start).count()
+    # Calculate stats (incident counts come from the daily rollup)
+    incident_stats = IncidentDailyStats.totals()
+    total_incidents = incident_stats['total']
+    incidents_this_month = IncidentDailyStats.totals(date__gte=month_start.date())['total']
     
     # Calculate actual incident change percentage
     last_month_start = (month_start - timedelta(days=32)).replace(day=1)
     last_month_end = month_start - timedelta(days=1)
-    incidents_last_month = Incident.objects.filter(created_at__gte=last_month_start, created_at__lte=last_month_end).count()
+    incidents_last_month = IncidentDailyStats.totals(
+        date__gte=last_month_start.date(), date__lte=last_month_end.date()
+    )['total']
     
     if incidents_last_month > 0:
         incident_change = ((incidents_this_month - incidents_last_month) / incidents_last_month) * 100
@@ -4204,22 +3841,37 @@ def system_reports_view(request):
     incident_data = []
     user_data = []
     order_data = [] # New: Track orders if Order model exists/is imported
+
+    # One grouped query per series for the last 7 days instead of a COUNT per day
+    week_start = (today - timedelta(days=6)).replace(hour=0, minute=0, second=0, microsecond=0)
+    incidents_by_day = dict(
+        IncidentDailyStats.objects.filter(date__gte=week_start.date())
+        .values('date').annotate(count=Sum('total')).order_by().values_list('date', 'count')
+    )
+    users_by_day = {
+        row['day'].date(): row['count']
+        for row in User.objects.filter(date_joined__gte=week_start)
+        .annotate(day=TruncDay('date_joined')).values('day').annotate(count=Count('id')).order_by()
+    }
+    orders_by_day = {
+        row['day'].date(): row['count']
+        for row in Order.objects.filter(created_at__gte=week_start)
+        .annotate(day=TruncDay('created_at')).values('day').annotate(count=Count('id')).order_by()
+    }
     
     for i in range(6, -1, -1):
         date = today - timedelta(days=i)
-        day_start = date.replace(hour=0, minute=0, second=0, microsecond=0)
-        day_end = date.replace(hour=23, minute=59, second=59, microsecond=999999)
         
         display_dates.append(date.strftime('%b %d')) # e.g. "Jan 01"
         
         # Count for this day
-        incident_data.append(Incident.objects.filter(created_at__range=(day_start, day_end)).count())
-        user_data.append(User.objects.filter(date_joined__range=(day_start, day_end)).count())
-        order_data.append(Order.objects.filter(created_at__range=(day_start, day_end)).count())
+        incident_data.append(incidents_by_day.get(date.date(), 0))
+        user_data.append(users_by_day.get(date.date(), 0))
+        order_data.append(orders_by_day.get(date.date(), 0))
 
     # Incident Status Distribution
-    open_incidents = Incident.objects.filter(status='open').count()
-    resolved_incidents = Incident.objects.filter(status='resolved').count()
+    open_incidents = incident_stats['open_count']
+    resolved_incidents = incident_stats['resolved_count']
     
     # Get recent reports
     reports = SystemReport.objects.all().order_by('-generated_at')[:10]
@@ -4282,18 +3934,22 @@ def feedback_analysis_view(request):
         messages.error(request, 'You do not have permission to access this page.')
         return redirect('aid_app:dashboard')
     
-    # Calculate feedback stats
-    total_feedback = Feedback.objects.count()
-    positive = Feedback.objects.filter(rating__gte=4).count()
-    neutral = Feedback.objects.filter(rating=3).count()
-    negative = Feedback.objects.filter(rating__lte=2).count()
+    page = paginate_request(request, Feedback.objects.select_related('user'))
+    if wants_json(request):
+        return JsonResponse(page.as_json(feedback_json))
+    
+    # Calculate feedback stats (one conditional aggregate)
+    stats = Feedback.objects.aggregate(
+        total_feedback=Count('id'),
+        positive_feedback=Count('id', filter=Q(rating__gte=4)),
+        neutral_feedback=Count('id', filter=Q(rating=3)),
+        negative_feedback=Count('id', filter=Q(rating__lte=2)),
+    )
     
     context = {
-        'total_feedback': total_feedback,
-        'positive_feedback': positive,
-        'neutral_feedback': neutral,
-        'negative_feedback': negative,
-        'feedbacks': Feedback.objects.all().select_related('user').order_by('-created_at'),
+        **stats,
+        'feedbacks': page,
+        'page': page,
         'user': request.user,
     }
     return render(request, 'admin/feedback_analysis.html', context)
@@ -0,0 +1,47 @@
+"""
+In-process background workers.
+
+A queue that is normally drained by its own management command (the
+notification outbox, product image renditions) can also be drained by a
+daemon thread of the web process, woken right after the transaction that
+queued the work commits. That keeps a development server working without
+separate worker processes; in production the commands do the work and the
+thread just finds the queue empty.
+"""
+import logging
+import threading
+
+from django.db import close_old_connections, connection
+
+logger = logging.getLogger(__name__)
+
+
+class InProcessWorker:
+    """Single daemon thread per process that calls `drain` whenever it is woken."""
+
+    def __init__(self, name, drain):
+        self.name = name
+        self.drain = drain
+        self._wake = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def wake(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            try:
+                close_old_connections()
+                self.drain()
+            except Exception:
+                # The work stays queued for the next wake-up or the worker command
+                logger.exception('%s worker failed to drain its queue', self.name)
+            finally:
+                connection.close()